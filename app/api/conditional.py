@@ -0,0 +1,10 @@
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of ETag with If-None-Match header value."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque_tag = etag.removeprefix('W/')
+    return any(
+        tag.strip().removeprefix('W/') == opaque_tag for tag in if_none_match.split(',')
+    )
@@ -1,54 +1,179 @@
-import asyncio
-import io
-from typing import TypeAlias
-from uuid import UUID, uuid4
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple
+from uuid import uuid4
 
-from fastapi import File, UploadFile
-from PIL import Image as PILImage, UnidentifiedImageError
+from fastapi import Depends, Header, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
 
-from .schema import CreateImage
-from app.exception import InvalidImagesError
-from app.util import save_image_to_media
+from .multipart import MultipartReader
+from .schema import CreateImage, ImageFit, ImageResize
+from app.config import settings
+from app.exception import ImagesTooLargeError, InvalidImagesError
+from app.storage import storage
+from app.util import (
+    get_media_temp_path,
+    IMAGE_SIGNATURE_SIZE,
+    inspect_image,
+    is_format_supported,
+    save_upload,
+    sniff_image_format,
+)
+from app.worker_pool import image_pool
 
 
-ValidImage: TypeAlias = tuple[UUID, io.BytesIO, str | None, str | None]
+# Boundaries and headers of parts are not counted in IMAGE_MAX_REQUEST_SIZE.
+MULTIPART_OVERHEAD = 64 * 1024
 
 
-async def get_uploaded_images(files: list[UploadFile] = File()) -> list[CreateImage]:
-    valid_images: list[ValidImage] = []
+class UploadedImages(NamedTuple):
+    images: list[CreateImage]
+    # Validated temporary file of every distinct blob of the request.
+    blob_files: dict[str, Path]
+
+
+def get_upload_reader(request: Request) -> MultipartReader:
+    """Return reader of upload body, rejecting it if declared size is too large."""
+    content_length = request.headers.get('content-length', '')
+    if (
+        content_length.isdigit()
+        and int(content_length) > settings.IMAGE_MAX_REQUEST_SIZE + MULTIPART_OVERHEAD
+    ):
+        raise ImagesTooLargeError([], settings.IMAGE_MAX_REQUEST_SIZE)
+    return MultipartReader(request.headers.get('content-type', ''), request.stream())
+
+
+async def get_uploaded_images(
+    reader: MultipartReader = Depends(get_upload_reader),
+) -> AsyncIterator[UploadedImages]:
+    """Store images of ``files`` fields in temporary files of media directory.
+
+    Every file is streamed from the request body to a temporary file,
+    hashed on the way, then validated and inspected from disk in the
+    image pool. File which does not start
+    with signature of an allowed format or exceeds size limits is
+    rejected at once, without reading the rest of the body. Images get
+    storage locations derived from their content, so identical uploads
+    share one file; ``crud.create_images`` puts files there. Temporary
+    files left are removed once request is handled.
+    """
+    images: list[CreateImage] = []
+    blob_files: dict[str, Path] = {}
     invalid_images: list[tuple[int, str | None]] = []
-    for i, file in enumerate(files):
-        binary_image = io.BytesIO()
-        while content := await file.read(1024):
-            binary_image.write(content)
-        binary_image.seek(0)
-        try:
-            img = PILImage.open(binary_image)
-            img.verify()
-        except UnidentifiedImageError:
-            invalid_images.append((i, file.filename))
-        else:
-            valid_images.append(
-                (
-                    uuid4(),
-                    binary_image,
-                    img.format,
-                    file.filename,
+    temp_paths: list[Path] = []
+    request_budget = settings.IMAGE_MAX_REQUEST_SIZE
+    try:
+        i = 0
+        while (file := await reader.next_file('files')) is not None:
+            head = await file.peek(IMAGE_SIGNATURE_SIZE)
+            if sniff_image_format(head, settings.IMAGE_UPLOAD_FORMATS) is None:
+                raise InvalidImagesError(invalid_images + [(i, file.filename)])
+            temp_path = get_media_temp_path()
+            temp_paths.append(temp_path)
+            limit = min(settings.IMAGE_MAX_FILE_SIZE, request_budget)
+            saved = await save_upload(file, temp_path, limit)
+            if saved is None:
+                raise ImagesTooLargeError(
+                    [(i, file.filename)],
+                    settings.IMAGE_MAX_FILE_SIZE
+                    if limit == settings.IMAGE_MAX_FILE_SIZE
+                    else settings.IMAGE_MAX_REQUEST_SIZE,
+                )
+            size, digest = saved
+            request_budget -= size
+            metadata = await image_pool.run(
+                inspect_image,
+                temp_path,
+                settings.IMAGE_MAX_PIXELS,
+                settings.IMAGE_PLACEHOLDER_SIZE,
+            )
+            if metadata is None:
+                invalid_images.append((i, file.filename))
+            else:
+                images.append(
+                    CreateImage(
+                        id=uuid4(),
+                        path=storage.get_location(f'{digest}.{metadata.format}'),
+                        original_filename=file.filename,
+                        blob_hash=digest,
+                        width=metadata.width,
+                        height=metadata.height,
+                        byte_size=size,
+                        format=metadata.format,
+                        placeholder=metadata.placeholder,
+                    )
                 )
+                blob_files.setdefault(digest, temp_path)
+            i += 1
+        if not i:
+            raise RequestValidationError(
+                [ErrorWrapper(MissingError(), loc=('body', 'files'))]
             )
-    if invalid_images:
-        raise InvalidImagesError(invalid_images)
-    paths = await asyncio.gather(
-        *[
-            save_image_to_media(id, bin_img, frmt)
-            for id, bin_img, frmt, _ in valid_images
-        ]
-    )
-    return [
-        CreateImage(
-            id=id,
-            path=path.as_posix(),
-            original_filename=filename,
+        if invalid_images:
+            raise InvalidImagesError(invalid_images)
+        yield UploadedImages(images, blob_files)
+    finally:
+        for temp_path in temp_paths:
+            temp_path.unlink(missing_ok=True)
+
+
+def get_image_resize(
+    width: int | None = Query(None, description='One of allowed derivative sizes'),
+    height: int | None = Query(None, description='One of allowed derivative sizes'),
+    fit: ImageFit = ImageFit.contain,
+) -> ImageResize | None:
+    """Return resize parameters, ``None`` to get the original image.
+
+    Only sizes of ``IMAGE_DERIVATIVE_SIZES`` are allowed, so derivative
+    cache cannot be filled with arbitrary sizes.
+    """
+    errors = [
+        ErrorWrapper(
+            ValueError(f'allowed sizes are {settings.IMAGE_DERIVATIVE_SIZES}'),
+            loc=('query', name),
         )
-        for path, (id, _, _, filename) in zip(paths, valid_images)
+        for name, size in (('width', width), ('height', height))
+        if size is not None and size not in settings.IMAGE_DERIVATIVE_SIZES
     ]
+    if errors:
+        raise RequestValidationError(errors)
+    if width is None and height is None:
+        return None
+    return ImageResize(width=width, height=height, fit=fit)
+
+
+def _parse_accept(accept: str) -> dict[str, float]:
+    """Map media types of Accept header to their quality values."""
+    qualities = {}
+    for item in accept.split(','):
+        media_type, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        qualities[media_type.lower()] = quality
+    return qualities
+
+
+def get_variant_format(
+    accept: str | None = Header(None, include_in_schema=False),
+) -> str | None:
+    """Return preferred variant format accepted by client.
+
+    Format must be listed explicitly, as browsers do for formats they
+    support, wildcards are not enough. ``None`` keeps source format.
+    """
+    if accept is None:
+        return None
+    qualities = _parse_accept(accept)
+    for img_format in settings.IMAGE_VARIANT_FORMATS:
+        if qualities.get(f'image/{img_format}', 0) > 0 and is_format_supported(
+            img_format
+        ):
+            return img_format
+    return None
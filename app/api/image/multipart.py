@@ -0,0 +1,156 @@
+"""Streaming reader of multipart/form-data request bodies.
+
+Starlette form parsing spools every file of the body to temporary files
+before the endpoint runs. Here files are read part by part as the body
+arrives, so an upload can be rejected after its first bytes, leaving the
+rest of the body unread.
+"""
+from collections import deque
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from multipart.multipart import (  # type: ignore
+    MultipartParseError,
+    MultipartParser,
+    parse_options_header,
+)
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode()
+    except UnicodeDecodeError:
+        return value.decode('latin-1')
+
+
+class FilePart:
+    """File of multipart body, readable while reader stays at its part."""
+
+    def __init__(
+        self,
+        reader: 'MultipartReader',
+        name: str,
+        filename: str,
+        content_type: str | None,
+    ) -> None:
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self._reader = reader
+        self._buffer = b''
+
+    async def peek(self, size: int) -> bytes:
+        """Return up to size first unread bytes, leaving them unread."""
+        while len(self._buffer) < size:
+            chunk = await self._reader._read_part_data()
+            if chunk is None:
+                break
+            self._buffer += chunk
+        return self._buffer[:size]
+
+    async def read(self, size: int) -> bytes:
+        """Return up to size bytes as they arrive, ``b''`` at the end of file."""
+        if not self._buffer:
+            self._buffer = await self._reader._read_part_data() or b''
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+class MultipartReader:
+    def __init__(self, content_type: str, stream: AsyncIterator[bytes]) -> None:
+        media_type, params = parse_options_header(content_type)
+        if media_type != b'multipart/form-data' or not params.get(b'boundary'):
+            raise HTTPException(
+                status.HTTP_400_BAD_REQUEST, 'Expected multipart/form-data body'
+            )
+        self._stream = stream
+        self._events: deque[tuple[str, bytes]] = deque()
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field = self._header_value = b''
+        self._in_part = False
+        self._finished = False
+        self._parser = MultipartParser(
+            params[b'boundary'],
+            callbacks={
+                'on_part_begin': self._on_part_begin,
+                'on_header_field': self._on_header_field,
+                'on_header_value': self._on_header_value,
+                'on_header_end': self._on_header_end,
+                'on_headers_finished': lambda: self._events.append(('part', b'')),
+                'on_part_data': lambda data, start, end: self._events.append(
+                    ('data', data[start:end])
+                ),
+                'on_part_end': lambda: self._events.append(('part_end', b'')),
+                'on_end': lambda: self._events.append(('end', b'')),
+            },
+        )
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b''
+
+    async def _next_event(self) -> tuple[str, bytes]:
+        while not self._events:
+            chunk = await anext(self._stream, b'')
+            if not chunk and self._finished:
+                return 'end', b''
+            if not chunk:
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST, 'Incomplete multipart body'
+                )
+            try:
+                self._parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST, 'Malformed multipart body'
+                )
+        event = self._events.popleft()
+        if event[0] == 'end':
+            self._finished = True
+        return event
+
+    async def _read_part_data(self) -> bytes | None:
+        while self._in_part:
+            event, data = await self._next_event()
+            if event == 'data':
+                return data
+            self._in_part = False
+        return None
+
+    async def next_file(self, name: str) -> FilePart | None:
+        """Return next file of field name, ``None`` after the last one.
+
+        Unread data of the previous file and other fields are skipped.
+        """
+        while await self._read_part_data() is not None:
+            pass
+        while True:
+            event, _ = await self._next_event()
+            if event == 'end':
+                return None
+            if event != 'part':
+                continue
+            self._in_part = True
+            _, options = parse_options_header(
+                self._headers.get(b'content-disposition', b'')
+            )
+            if options.get(b'name') != name.encode() or b'filename' not in options:
+                while await self._read_part_data() is not None:
+                    pass
+                continue
+            content_type = self._headers.get(b'content-type')
+            return FilePart(
+                self,
+                name,
+                _decode(options[b'filename']),
+                _decode(content_type) if content_type else None,
+            )
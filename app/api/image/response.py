@@ -0,0 +1,224 @@
+"""Image file responses with caching headers and byte ranges.
+
+Starlette ``FileResponse`` of the used version always sends the whole
+file by reading it into memory chunk by chunk. Responses here support
+conditional and single range requests, and hand the file to the server
+when it implements ASGI zero-copy send extension, which uses sendfile.
+Objects of remote storage are streamed with the same headers.
+"""
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+
+from typing import Callable
+
+import aiofiles.os
+import anyio
+from fastapi import Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.api.conditional import etag_matches
+from app.config import settings
+from app.storage import get_file_info, ObjectInfo, storage
+
+
+# Image of given id or derivative of given parameters never changes.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Source image sent while its variant in negotiated format is generated.
+PENDING_VARIANT_CACHE_CONTROL = 'public, max-age=60'
+ZERO_COPY_SEND = 'http.response.zerocopysend'
+
+
+class FileRangeResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        start: int,
+        stop: int,
+        status_code: int,
+        headers: dict[str, str],
+    ) -> None:
+        self.path = path
+        self.start = start
+        self.stop = stop
+        self.status_code = status_code
+        self.background = None
+        self.init_headers(headers | {'content-length': str(stop - start)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send(
+            {
+                'type': 'http.response.start',
+                'status': self.status_code,
+                'headers': self.raw_headers,
+            }
+        )
+        if self.start == self.stop:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        async with await anyio.open_file(self.path, mode='rb') as file:
+            if ZERO_COPY_SEND in scope.get('extensions', {}):
+                await send(
+                    {
+                        'type': ZERO_COPY_SEND,
+                        'file': file.wrapped,
+                        'offset': self.start,
+                        'count': self.stop - self.start,
+                    }
+                )
+                return
+            await file.seek(self.start)
+            remaining = self.stop - self.start
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                await send(
+                    {
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': bool(remaining and chunk),
+                    }
+                )
+                if not chunk:
+                    break
+
+
+def _parse_range(value: str, size: int) -> tuple[int, int] | None:
+    """Return ``(start, stop)`` of single byte range, ``None`` to ignore it.
+
+    Raise ``ValueError`` if range is well-formed but not satisfiable.
+    Multiple ranges are ignored, as HTTP allows, and whole file is sent.
+    """
+    unit, _, ranges = value.partition('=')
+    first, separator, last = ranges.strip().partition('-')
+    if unit.strip().lower() != 'bytes' or not separator:
+        return None
+    if not (first.isdigit() or first == '') or not (last.isdigit() or last == ''):
+        return None
+    if first == '':
+        if last == '' or int(last) == 0:
+            raise ValueError('empty suffix range')
+        return max(size - int(last), 0), size
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if start >= size or stop <= start:
+        raise ValueError('range is out of file')
+    return start, stop
+
+
+def _is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp() if since.tzinfo else False
+
+
+def _get_response(
+    info: ObjectInfo,
+    content_type: str | None,
+    request: Request,
+    cache_control: str,
+    get_body_response: Callable[[int, int, int, dict[str, str]], Response],
+) -> Response:
+    headers = {
+        'cache-control': cache_control,
+        'vary': 'Accept',
+        'etag': info.etag,
+        'last-modified': formatdate(info.modified, usegmt=True),
+    }
+    if _is_not_modified(request, info.etag, info.modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    headers |= {
+        'accept-ranges': 'bytes',
+        'content-type': content_type or 'application/octet-stream',
+    }
+    start, stop, status_code = 0, info.size, status.HTTP_200_OK
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header is not None and (if_range is None or if_range == info.etag):
+        try:
+            byte_range = _parse_range(range_header, info.size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers=headers | {'content-range': f'bytes */{info.size}'},
+            )
+        if byte_range is not None:
+            start, stop = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers['content-range'] = f'bytes {start}-{stop - 1}/{info.size}'
+    return get_body_response(start, stop, status_code, headers)
+
+
+async def get_file_response(
+    path: str | os.PathLike[str],
+    request: Request,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    info: ObjectInfo | None = None,
+) -> Response:
+    """Return response with local file at path for GET request.
+
+    Format of image depends on Accept header of request, so responses
+    vary on it. Raise ``FileNotFoundError`` if there is no such file.
+    """
+    if info is None:
+        info = get_file_info(await aiofiles.os.stat(path))
+    return _get_response(
+        info,
+        guess_type(path)[0],
+        request,
+        cache_control,
+        lambda start, stop, status_code, headers: FileRangeResponse(
+            path, start, stop, status_code, headers
+        ),
+    )
+
+
+async def get_stored_file_response(
+    location: str,
+    request: Request,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    info: ObjectInfo | None = None,
+) -> Response:
+    """Return response with file of storage at location for GET request.
+
+    Local files are sent as by ``get_file_response``. Clients are
+    redirected to objects of remote storage when it provides their URLs,
+    otherwise objects are streamed through.
+    """
+    path = storage.get_local_path(location)
+    if path is not None:
+        return await get_file_response(path, request, cache_control, info)
+    url = await storage.get_url(location)
+    if url is not None:
+        return RedirectResponse(
+            url,
+            headers={
+                # Redirect must not outlive URL.
+                'cache-control': f'private, max-age={settings.S3_PRESIGNED_URL_TTL // 2}',
+                'vary': 'Accept',
+            },
+        )
+    if info is None:
+        info = await storage.stat(location)
+    return _get_response(
+        info,
+        guess_type(location)[0],
+        request,
+        cache_control,
+        lambda start, stop, status_code, headers: StreamingResponse(
+            storage.open(location, start, stop),
+            status_code=status_code,
+            headers=headers | {'content-length': str(stop - start)},
+        ),
+    )
@@ -1,35 +1,187 @@
+import asyncio
+from pathlib import Path
 from uuid import UUID
 
-from fastapi import Depends, status
+import aiofiles.os
+from fastapi import Depends, Request, Response, status
 from fastapi.responses import FileResponse
 from fastapi.routing import APIRouter
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .dependency import get_uploaded_images
-from .schema import CreateImage, StoredImage
+from .dependency import (
+    get_image_resize,
+    get_uploaded_images,
+    get_variant_format,
+    UploadedImages,
+)
+from .response import (
+    get_file_response,
+    get_stored_file_response,
+    PENDING_VARIANT_CACHE_CONTROL,
+)
+from .schema import ImageResize, StoredImage
+from app.api.auth.dependency import get_authenticated_user
+from app.cache import image_path_cache
+from app.config import settings
 from app.database.tools import get_session
 from app.crud import image as crud
+from app.derivative_cache import derivative_cache
+from app.storage import get_file_info, storage
+from app.util import resize_image
+from app.worker_pool import image_pool
 
 
 router = APIRouter(prefix='/images', tags=['images'])
+# Other images, e.g. animated GIF, are always served in their format.
+VARIANT_SOURCE_FORMATS = {'jpeg', 'jpg', 'png'}
 
 
 @router.post(
     '/upload',
     response_model=list[StoredImage],
     status_code=status.HTTP_201_CREATED,
+    # Body is read by get_uploaded_images, not by FastAPI.
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {
+                'multipart/form-data': {
+                    'schema': {
+                        'type': 'object',
+                        'required': ['files'],
+                        'properties': {
+                            'files': {
+                                'type': 'array',
+                                'items': {'type': 'string', 'format': 'binary'},
+                            }
+                        },
+                    }
+                }
+            },
+        }
+    },
 )
 async def upload_images(
-    images: list[CreateImage] = Depends(
+    uploaded: UploadedImages = Depends(
         get_uploaded_images,
         use_cache=False,
     ),
     session: AsyncSession = Depends(get_session),
 ):
-    await crud.create_images([img.dict() for img in images], session)
-    return images
+    await crud.create_images(
+        [img.dict() for img in uploaded.images],
+        session,
+        uploaded.blob_files,
+    )
+    return uploaded.images
+
+
+def _get_derivative_name(
+    path: str,
+    resize: ImageResize | None,
+    img_format: str | None,
+) -> str:
+    source = Path(path)
+    name = source.stem
+    if resize is not None:
+        name += f'-{resize.width or 0}x{resize.height or 0}-{resize.fit.value}'
+    return name + (f'.{img_format}' if img_format else source.suffix)
+
+
+async def _get_image_response(
+    path: str,
+    resize: ImageResize | None,
+    img_format: str | None,
+    request: Request,
+) -> Response:
+    if Path(path).suffix.lstrip('.').lower() not in VARIANT_SOURCE_FORMATS:
+        img_format = None
+    if resize is None and img_format is None:
+        return await get_stored_file_response(path, request)
+    params = (
+        (resize.width, resize.height, resize.fit.value)
+        if resize is not None
+        else (None, None, 'contain')
+    )
+
+    async def generate(target: Path):
+        async with storage.fetch(path) as source:
+            await image_pool.run(
+                resize_image,
+                source,
+                target,
+                *params,
+                img_format,
+                settings.IMAGE_VARIANT_QUALITY,
+            )
+
+    name = _get_derivative_name(path, resize, img_format)
+    if resize is not None:
+        return await get_file_response(
+            await derivative_cache.get(name, generate),
+            request,
+        )
+    variant = await derivative_cache.get_or_schedule(name, generate)
+    if variant is None:
+        return await get_stored_file_response(
+            path, request, PENDING_VARIANT_CACHE_CONTROL
+        )
+    # Noisy images may get larger in variant format.
+    source_info, variant_stat = await asyncio.gather(
+        storage.stat(path), aiofiles.os.stat(variant)
+    )
+    if variant_stat.st_size < source_info.size:
+        return await get_file_response(
+            variant, request, info=get_file_info(variant_stat)
+        )
+    return await get_stored_file_response(path, request, info=source_info)
 
 
-@router.get('/{id}', response_class=FileResponse)
-async def get_image(id: UUID, session: AsyncSession = Depends(get_session)):
-    return await crud.get_image_path(id, session)
+@router.get(
+    '/{id}',
+    response_class=FileResponse,
+    responses={
+        status.HTTP_206_PARTIAL_CONTENT: {'description': 'Requested byte range'},
+        status.HTTP_304_NOT_MODIFIED: {'description': 'Cached image is valid'},
+        status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE: {
+            'description': 'Range is out of image file'
+        },
+    },
+)
+async def get_image(
+    id: UUID,
+    request: Request,
+    resize: ImageResize | None = Depends(get_image_resize),
+    img_format: str | None = Depends(get_variant_format),
+    session: AsyncSession = Depends(get_session),
+):
+    """Return image, in a smaller format if client accepts one.
+
+    Variant of image in original size is generated in background, source
+    image is returned with short caching time until it is ready.
+    """
+    path = image_path_cache.get(id)
+    if path is not None:
+        try:
+            return await _get_image_response(path, resize, img_format, request)
+        except FileNotFoundError:
+            # Image was deleted or moved through another worker.
+            image_path_cache.pop(id)
+    path = await crud.get_image_path(id, session)
+    image_path_cache.set(
+        id,
+        path,
+        # Deleting worker clears only its own entry.
+        settings.IMAGE_PATH_REDIRECT_CACHE_TTL if storage.serves_urls else None,
+    )
+    return await _get_image_response(path, resize, img_format, request)
+
+
+@router.delete(
+    '/{id}',
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(get_authenticated_user)],
+    responses={status.HTTP_409_CONFLICT: {'description': 'Image is used by recipes'}},
+)
+async def delete_image(id: UUID, session: AsyncSession = Depends(get_session)):
+    await crud.delete_image(id, session)
@@ -1,17 +1,42 @@
+from enum import Enum
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
-class CreateImage(BaseModel):
+class ImageMetadata(BaseModel):
+    """Properties of image file, ``None`` for images not inspected yet."""
+
+    width: int | None = None
+    height: int | None = None
+    byte_size: int | None = None
+    format: str | None = None
+    placeholder: str | None = Field(
+        default=None, description='Data URI of tiny blurred preview'
+    )
+
+
+class CreateImage(ImageMetadata):
     id: UUID
     path: str
     original_filename: str | None
+    blob_hash: str | None = None
 
 
-class StoredImage(BaseModel):
+class StoredImage(ImageMetadata):
     id: UUID
     original_filename: str | None
 
     class Config:
         orm_mode = True
+
+
+class ImageFit(str, Enum):
+    contain = 'contain'
+    cover = 'cover'
+
+
+class ImageResize(BaseModel):
+    width: int | None
+    height: int | None
+    fit: ImageFit
@@ -0,0 +1,20 @@
+from typing import Any
+
+from fastapi import Depends
+from fastapi.routing import APIRouter
+
+from app import metrics
+from app.auth import current_superuser
+
+
+# Metrics expose internals of caches, storage and worker pools.
+router = APIRouter(
+    prefix='/metrics',
+    tags=['metrics'],
+    dependencies=[Depends(current_superuser)],
+)
+
+
+@router.get('', response_model=dict[str, dict[str, Any]])
+async def get_metrics():
+    return metrics.collect()
@@ -0,0 +1,167 @@
+"""Bulk recipe import from NDJSON stream.
+
+Only one line, one batch of valid records and a capped list of errors
+are kept in memory, whatever the size of the upload is.
+"""
+from typing import Any, AsyncIterator, Mapping, Sequence
+
+from asyncpg.exceptions import PostgresError  # type: ignore
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .schema import FullRecipeData
+from app.config import settings
+from app.crud import image as image_crud
+from app.crud import recipe as crud
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes],
+    max_line_size: int,
+) -> AsyncIterator[bytes | None]:
+    """Split byte stream into lines, yield ``None`` for too long ones."""
+    buffer = bytearray()
+    too_long = False
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b'\n', start)) != -1:
+            if not too_long:
+                buffer += chunk[start:end]
+            yield None if too_long or len(buffer) > max_line_size else bytes(buffer)
+            buffer.clear()
+            too_long = False
+            start = end + 1
+        if not too_long:
+            buffer += chunk[start:]
+            if len(buffer) > max_line_size:
+                buffer.clear()
+                too_long = True
+    if too_long or buffer:
+        yield None if too_long else bytes(buffer)
+
+
+class RecipeImport:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self.imported = 0
+        self.errors: list[dict[str, Any]] = []
+        self.errors_truncated = False
+        self._batch: list[tuple[int, dict[str, Any]]] = []
+
+    def add_error(self, line: int, detail: Sequence[Mapping[str, Any]]):
+        if len(self.errors) < settings.RECIPE_IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line, 'detail': detail})
+        else:
+            self.errors_truncated = True
+
+    async def add(self, line: int, content: bytes | None):
+        if content is None:
+            self.add_error(
+                line,
+                [
+                    {
+                        'loc': ['body'],
+                        'msg': 'line is longer than '
+                        f'{settings.RECIPE_IMPORT_MAX_LINE_SIZE} bytes',
+                        'type': 'value_error.line_size',
+                    }
+                ],
+            )
+            return
+        if not content.strip():
+            return
+        try:
+            recipe = FullRecipeData.parse_raw(content)
+        except ValidationError as exc:
+            self.add_error(line, exc.errors())
+            return
+        self._batch.append((line, recipe.dict()))
+        if len(self._batch) >= settings.RECIPE_IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def _pop_unknown_images(self):
+        image_ids = {
+            image_id
+            for _, recipe in self._batch
+            for image_id in (
+                recipe['image_id'],
+                *(step['image_id'] for step in recipe['steps']),
+            )
+        }
+        existing = await image_crud.get_existing_image_ids(image_ids, self.session)
+        batch = []
+        for line, recipe in self._batch:
+            unknown = [
+                loc
+                for loc, image_id in (
+                    (['image_id'], recipe['image_id']),
+                    *(
+                        (['steps', i, 'image_id'], step['image_id'])
+                        for i, step in enumerate(recipe['steps'])
+                    ),
+                )
+                if image_id not in existing
+            ]
+            if unknown:
+                self.add_error(
+                    line,
+                    [
+                        {'loc': loc, 'msg': 'image not found', 'type': 'value_error'}
+                        for loc in unknown
+                    ],
+                )
+            else:
+                batch.append((line, recipe))
+        self._batch = batch
+
+    async def _write(self, batch: list[tuple[int, dict[str, Any]]]):
+        try:
+            await crud.import_recipes([recipe for _, recipe in batch], self.session)
+        except (DBAPIError, PostgresError) as exc:
+            await self.session.rollback()
+            if len(batch) > 1:
+                # One bad record fails the whole COPY, so records are
+                # written one by one to import the rest of the batch.
+                for record in batch:
+                    await self._write([record])
+                return
+            reason = exc.orig if isinstance(exc, DBAPIError) else exc
+            self.add_error(
+                batch[0][0],
+                [
+                    {
+                        'loc': ['body'],
+                        'msg': f'rejected by database: {reason}',
+                        'type': 'database_error',
+                    }
+                ],
+            )
+        else:
+            self.imported += len(batch)
+
+    async def flush(self):
+        await self._pop_unknown_images()
+        if self._batch:
+            await self._write(self._batch)
+        self._batch = []
+
+    def report(self) -> dict[str, Any]:
+        return {
+            'imported': self.imported,
+            'errors': self.errors,
+            'errors_truncated': self.errors_truncated,
+        }
+
+
+async def import_ndjson(
+    chunks: AsyncIterator[bytes],
+    session: AsyncSession,
+) -> dict[str, Any]:
+    recipe_import = RecipeImport(session)
+    line = 0
+    async for content in iter_lines(chunks, settings.RECIPE_IMPORT_MAX_LINE_SIZE):
+        line += 1
+        await recipe_import.add(line, content)
+    await recipe_import.flush()
+    return recipe_import.report()
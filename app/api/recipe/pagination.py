@@ -0,0 +1,57 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+from typing import Any, Sequence
+
+from sqlalchemy import Row
+
+from app.exception import InvalidCursorError
+
+
+def encode_cursor(order: str | None, key: Any, id: int) -> str:
+    if isinstance(key, timedelta):
+        key = key // timedelta(microseconds=1)
+    raw = json.dumps([order, key, id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, order: str | None) -> tuple[Any, int] | None:
+    """Return (sort key, id) pair stored in cursor, ``None`` for empty one."""
+    if not cursor:
+        return None
+    try:
+        cursor_order, key, id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursorError('Malformed cursor.')
+    if cursor_order != order or not isinstance(id, int):
+        raise InvalidCursorError('Cursor does not match requested order.')
+    if order is not None and 'duration' in order:
+        if not isinstance(key, int):
+            raise InvalidCursorError('Malformed cursor.')
+        key = timedelta(microseconds=key)
+    elif order is not None and not isinstance(key, int | float):
+        raise InvalidCursorError('Malformed cursor.')
+    return key, id
+
+
+def get_row_key(row: Row, order: str | None) -> Any:
+    if order is None:
+        return None
+    if 'duration' in order:
+        return row.duration
+    return row.rating
+
+
+def split_cursor_page(
+    rows: Sequence[Row],
+    size: int,
+    order: str | None,
+) -> tuple[Sequence[Row], str | None]:
+    """Split ``size + 1`` fetched rows, extra one only marks next page."""
+    items = rows[:size]
+    next_cursor = None
+    if len(rows) > size:
+        last = items[-1]
+        next_cursor = encode_cursor(order, get_row_key(last, order), last.id)
+    return items, next_cursor
@@ -1,25 +1,43 @@
 from datetime import timedelta
+from typing import Any, Hashable
 
-from fastapi import Depends, status, Query
+from fastapi import Depends, Header, Query, Request, Response, status
 from fastapi.routing import APIRouter
-from fastapi_pagination import Page
+from fastapi_pagination import Page, Params
 from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 
+from . import serializer
+from .importer import import_ndjson
+from .pagination import decode_cursor, split_cursor_page
 from .schema import (
     FullRecipeData,
+    PartialRecipeData,
     RateData,
+    RecipeBatchItem,
     RecipeEntityResponse,
+    RecipeImportReport,
+    RecipeListCursorPage,
     RecipeListOrder,
     RecipeListResponse,
 )
 from app.api.auth.dependency import get_authenticated_user
 from app.api.auth.schema import AuthUser
+from app.api.conditional import etag_matches
+from app.cache import recipe_data_version, recipe_entity_cache, recipe_list_cache
+from app.config import settings
 from app.crud import recipe as crud
 from app.database.tools import get_engine, get_session
+from app.rating_buffer import rating_buffer
 
 
+CURSOR_DESCRIPTION = (
+    'Switches list to cursor pagination: pass empty value for the first '
+    'page and `next_cursor` of previous response for the next ones. '
+    '`page` is ignored and total count is not calculated in this mode.'
+)
+
 router = APIRouter()
 public_router = APIRouter(prefix='/recipe', tags=['recipe'])
 auth_only_router = APIRouter(
@@ -29,7 +47,39 @@ auth_only_router = APIRouter(
 )
 
 
-@public_router.get('', response_model=Page[RecipeListResponse])
+def _get_list_cache_key(
+    duration__lte: timedelta | None,
+    duration__gte: timedelta | None,
+    rating__lte: float | None,
+    rating__gte: float | None,
+    ingredients: set[str] | None,
+    order: str | None,
+    cursor_mode: bool,
+    after: tuple[Any, int] | None,
+    params: Params,
+) -> Hashable:
+    def microseconds(duration: timedelta | None) -> int | None:
+        return None if duration is None else duration // timedelta(microseconds=1)
+
+    return (
+        recipe_data_version.value,
+        microseconds(duration__lte),
+        microseconds(duration__gte),
+        rating__lte,
+        rating__gte,
+        None if ingredients is None else tuple(sorted(ingredients)),
+        order,
+        cursor_mode,
+        after,
+        None if cursor_mode else params.page,
+        params.size,
+    )
+
+
+@public_router.get(
+    '',
+    response_model=Page[RecipeListResponse] | RecipeListCursorPage,
+)
 async def get_recipe_list(
     duration__lte: timedelta | None = Query(default=None),
     duration__gte: timedelta | None = Query(default=None),
@@ -37,19 +87,48 @@ async def get_recipe_list(
     rating__gte: float | None = Query(default=None),
     ingredients: set[str] | None = Query(default=None),
     order: RecipeListOrder | None = Query(default=None),
+    cursor: str | None = Query(default=None, description=CURSOR_DESCRIPTION),
+    params: Params = Depends(),
     session: AsyncSession = Depends(get_session),
 ):
-    return await paginate(
-        session,
-        crud.get_recipe_list_query(
-            duration__lte,
-            duration__gte,
-            rating__lte,
-            rating__gte,
-            ingredients,
-            order,
-        ),
+    filters = (
+        duration__lte,
+        duration__gte,
+        rating__lte,
+        rating__gte,
+        ingredients,
+        order,
     )
+    after = None if cursor is None else decode_cursor(cursor, order)
+    cache_key = _get_list_cache_key(*filters, cursor is not None, after, params)
+    content = recipe_list_cache.get(cache_key)
+    if content is None:
+        if cursor is None:
+            page = await paginate(
+                session,
+                crud.get_recipe_list_query(*filters),
+                params,
+            )
+            names = await crud.get_recipe_list_ingredients(
+                [row.id for row in page.items],
+                session,
+            )
+            content = serializer.dump_recipe_list_page(page, names)
+        else:
+            query = crud.get_recipe_list_query(*filters, after=after)
+            rows = (await session.execute(query.limit(params.size + 1))).all()
+            items, next_cursor = split_cursor_page(rows, params.size, order)
+            names = await crud.get_recipe_list_ingredients(
+                [row.id for row in items],
+                session,
+            )
+            content = serializer.dump_recipe_list_cursor_page(
+                items,
+                names,
+                next_cursor,
+            )
+        recipe_list_cache.set(cache_key, content)
+    return Response(content, media_type='application/json')
 
 
 @auth_only_router.post(
@@ -61,15 +140,86 @@ async def create_recipe(
     data: FullRecipeData,
     session: AsyncSession = Depends(get_session),
 ):
-    return await crud.create_recipe(data.dict(), session)
+    recipe = await crud.create_recipe(data.dict(), session)
+    return Response(
+        serializer.dump_recipe_document(recipe.document),
+        status_code=status.HTTP_201_CREATED,
+        media_type='application/json',
+        headers={'ETag': f'"{recipe.id}-{recipe.version}"'},
+    )
+
+
+@auth_only_router.post(
+    '/import',
+    response_model=RecipeImportReport,
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/x-ndjson': {
+                    'schema': {'$ref': '#/components/schemas/FullRecipeData'}
+                }
+            },
+        }
+    },
+)
+async def import_recipes(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
+    """Import recipes from NDJSON body, one `FullRecipeData` per line.
+
+    Valid records are written in batches, invalid ones are reported by
+    line number and do not stop the import.
+    """
+    return await import_ndjson(request.stream(), session)
 
 
-@public_router.get('/{id}', response_model=RecipeEntityResponse)
+@public_router.get('/batch', response_model=list[RecipeBatchItem])
+async def get_recipe_batch(
+    ids: list[int] = Query(min_items=1, max_items=settings.RECIPE_BATCH_MAX_SIZE),
+    session: AsyncSession = Depends(get_session),
+):
+    ids = list(dict.fromkeys(ids))
+    recipes = await crud.get_recipes(ids, session)
+    return Response(
+        serializer.dump_recipe_batch(ids, recipes),
+        media_type='application/json',
+    )
+
+
+@public_router.get(
+    '/{id}',
+    response_model=RecipeEntityResponse,
+    responses={status.HTTP_304_NOT_MODIFIED: {'description': 'Not Modified'}},
+)
 async def get_recipe(
     id: int,
+    if_none_match: str | None = Header(default=None),
     session: AsyncSession = Depends(get_session),
 ):
-    return await crud.get_recipe(id, session)
+    cached = recipe_entity_cache.get(id)
+    if cached is None:
+        data_version = recipe_data_version.value
+        version, document = await crud.get_recipe_document(id, session)
+        cached = (version, document.encode())
+        # Entity loaded concurrently with a write may be already outdated.
+        if recipe_data_version.value == data_version:
+            recipe_entity_cache.set(id, cached)
+    version, content = cached
+    headers = {'ETag': f'"{id}-{version}"'}
+    if etag_matches(if_none_match, headers['ETag']):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content, media_type='application/json', headers=headers)
+
+
+def _get_edited_recipe_response(id: int, edited: tuple[int, str]) -> Response:
+    version, document = edited
+    return Response(
+        document,
+        media_type='application/json',
+        headers={'ETag': f'"{id}-{version}"'},
+    )
 
 
 @auth_only_router.put('/{id}', response_model=RecipeEntityResponse)
@@ -78,7 +228,22 @@ async def edit_recipe(
     data: FullRecipeData,
     session: AsyncSession = Depends(get_session),
 ):
-    return await crud.edit_recipe(id, data.dict(), session)
+    return _get_edited_recipe_response(
+        id,
+        await crud.edit_recipe(id, data.dict(), session),
+    )
+
+
+@auth_only_router.patch('/{id}', response_model=RecipeEntityResponse)
+async def patch_recipe(
+    id: int,
+    data: PartialRecipeData,
+    session: AsyncSession = Depends(get_session),
+):
+    return _get_edited_recipe_response(
+        id,
+        await crud.edit_recipe(id, data.dict(exclude_none=True), session),
+    )
 
 
 @auth_only_router.delete('/{id}', status_code=status.HTTP_204_NO_CONTENT)
@@ -86,13 +251,25 @@ async def delete_recipe(id: int, engine: AsyncEngine = Depends(get_engine)):
     await crud.delete_recipe(id, engine)
 
 
-@auth_only_router.post('/{id}/rate', status_code=status.HTTP_204_NO_CONTENT)
+@auth_only_router.post(
+    '/{id}/rate',
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        status.HTTP_202_ACCEPTED: {
+            'description': 'Rate is buffered and will be written later, '
+            'rates of missing recipes are dropped'
+        }
+    },
+)
 async def rate_recipe(
     id: int,
     data: RateData,
     user: AuthUser = Depends(get_authenticated_user),
     session: AsyncSession = Depends(get_session),
 ):
+    if settings.RATING_WRITE_BEHIND:
+        await rating_buffer.add(user.id, id, data.rate)
+        return Response(status_code=status.HTTP_202_ACCEPTED)
     await crud.rate_recipe(id, user.id, data.rate, session)
 
 
@@ -2,39 +2,9 @@ from datetime import timedelta
 from typing import Any, Literal, TypeAlias
 from uuid import UUID
 
-from pydantic import BaseModel, Field, validator
-from pydantic.utils import GetterDict
-
-
-class RecipeIngridientGetter(GetterDict):
-    def get(self, key: Any, default: Any = None) -> Any:
-        if key == 'ingredients':
-            return [
-                association.ingredient.name for association in self._obj.ingredients
-            ]
-        return super().get(key, default)
-
-
-class RecipeListAnnotationGetter(GetterDict):
-    _MODEL = 0
-    _DURATION = 1
-    _RATING = 2
-
-    def get(self, key: Any, default: Any = None) -> Any:
-        if key == 'ingredients':
-            return [
-                association.ingredient.name
-                for association in self._obj[self._MODEL].ingredients
-            ]
-        if key == 'duration':
-            return self._obj[self._DURATION]
-        if key == 'rating':
-            return self._obj[self._RATING]
-        row = self._obj
-        self._obj = row[self._MODEL]
-        model_field = super().get(key, default)
-        self._obj = row
-        return model_field
+from pydantic import BaseModel, ConstrainedStr, Field, validator
+
+from app.api.image.schema import ImageMetadata
 
 
 class RecipeListResponse(BaseModel):
@@ -45,9 +15,10 @@ class RecipeListResponse(BaseModel):
     duration: timedelta
     rating: float
 
-    class Config:
-        orm_mode = True
-        getter_dict = RecipeListAnnotationGetter
+
+class RecipeListCursorPage(BaseModel):
+    items: list[RecipeListResponse]
+    next_cursor: str | None
 
 
 class RecipeStep(BaseModel):
@@ -55,9 +26,7 @@ class RecipeStep(BaseModel):
     description: str
     duration: timedelta
     image_id: UUID
-
-    class Config:
-        orm_mode = True
+    image: ImageMetadata
 
 
 class RecipeEntityResponse(BaseModel):
@@ -65,17 +34,24 @@ class RecipeEntityResponse(BaseModel):
     name: str
     description: str
     image_id: UUID
+    image: ImageMetadata
     ingredients: list[str]
     steps: list[RecipeStep]
 
-    class Config:
-        orm_mode = True
-        getter_dict = RecipeIngridientGetter
+
+class RecipeBatchItem(BaseModel):
+    id: int
+    recipe: RecipeEntityResponse | None
+    detail: str | None
+
+
+class IngredientName(ConstrainedStr):
+    max_length = 127
 
 
 class UploadRecipeStep(BaseModel):
     order: int
-    description: str
+    description: str = Field(max_length=255)
     duration: timedelta
     image_id: UUID
 
@@ -91,29 +67,62 @@ class UploadRecipeStep(BaseModel):
         return duration
 
 
+def validate_first_step(steps: list[UploadRecipeStep] | None):
+    if steps is not None and min(steps, key=lambda s: s.order).order != 1:
+        raise ValueError("Steps order must starts from 1.")
+    return steps
+
+
+def validate_steps_sequence(steps: list[UploadRecipeStep] | None):
+    if steps is None:
+        return steps
+    steps_order = sorted(step.order for step in steps)
+    if steps_order != list(range(min(steps_order), max(steps_order) + 1)):
+        raise ValueError(
+            "Steps order must form arithmetic progression "
+            "with common difference equals 1. "
+            "(example: [1, 2, 3, ..., 8, 9])"
+        )
+    return steps
+
+
 class FullRecipeData(BaseModel):
-    name: str = Field(min_length=1)
-    description: str
+    name: str = Field(min_length=1, max_length=127)
+    description: str = Field(max_length=255)
     image_id: UUID
-    ingredients: set[str]
+    ingredients: set[IngredientName]
     steps: list[UploadRecipeStep]
 
-    @validator('steps')
-    def validate_first_step(cls, steps: list[UploadRecipeStep], values):
-        if min(steps, key=lambda s: s.order).order != 1:
-            raise ValueError("Steps order must starts from 1.")
-        return steps
+    _validate_first_step = validator('steps', allow_reuse=True)(validate_first_step)
+    _validate_steps_sequence = validator('steps', allow_reuse=True)(
+        validate_steps_sequence
+    )
 
-    @validator('steps')
-    def validate_steps_sequence(cls, steps: list[UploadRecipeStep], values):
-        steps_order = sorted(step.order for step in steps)
-        if steps_order != list(range(min(steps_order), max(steps_order) + 1)):
-            raise ValueError(
-                "Steps order must form arithmetic progression "
-                "with common difference equals 1. "
-                "(example: [1, 2, 3, ..., 8, 9])"
-            )
-        return steps
+
+class PartialRecipeData(BaseModel):
+    """Recipe fields to change, given collections replace stored ones."""
+
+    name: str | None = Field(default=None, min_length=1, max_length=127)
+    description: str | None = Field(default=None, max_length=255)
+    image_id: UUID | None
+    ingredients: set[IngredientName] | None
+    steps: list[UploadRecipeStep] | None
+
+    _validate_first_step = validator('steps', allow_reuse=True)(validate_first_step)
+    _validate_steps_sequence = validator('steps', allow_reuse=True)(
+        validate_steps_sequence
+    )
+
+
+class RecipeImportError(BaseModel):
+    line: int
+    detail: list[dict[str, Any]]
+
+
+class RecipeImportReport(BaseModel):
+    imported: int
+    errors: list[RecipeImportError]
+    errors_truncated: bool
 
 
 class RateData(BaseModel):
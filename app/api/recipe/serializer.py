@@ -0,0 +1,112 @@
+"""JSON encoding of recipe responses.
+
+Routes return bytes built here and keep models from ``schema`` as
+``response_model`` only to describe payloads in OpenAPI, so responses
+skip pydantic validation and ``jsonable_encoder``. Payload layout must
+follow those models (``tests/test_recipe_serializer.py`` checks it).
+"""
+from typing import Any, Iterable, Sequence
+from uuid import UUID
+
+import orjson
+from fastapi_pagination import Page
+from sqlalchemy import Row
+
+from app.model.image import Image
+from app.model.recipe import Recipe
+
+
+def _default(obj: Any) -> Any:
+    # asyncpg returns UUID subclass, which orjson does not recognize.
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError
+
+
+def _dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def _list_item(row: Row, ingredients: list[str]) -> dict[str, Any]:
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': row.description,
+        'ingredients': ingredients,
+        'duration': row.duration.total_seconds(),
+        'rating': row.rating,
+    }
+
+
+def _list_items(
+    rows: Iterable[Row],
+    ingredients: dict[int, list[str]],
+) -> list[dict[str, Any]]:
+    return [_list_item(row, ingredients[row.id]) for row in rows]
+
+
+def dump_recipe_list_page(
+    page: Page,
+    ingredients: dict[int, list[str]],
+) -> bytes:
+    """Encode page of ``get_recipe_list_query`` rows as ``Page``."""
+    return _dumps(
+        {'items': _list_items(page.items, ingredients)} | page.dict(exclude={'items'})
+    )
+
+
+def dump_recipe_list_cursor_page(
+    rows: Sequence[Row],
+    ingredients: dict[int, list[str]],
+    next_cursor: str | None,
+) -> bytes:
+    return _dumps({'items': _list_items(rows, ingredients), 'next_cursor': next_cursor})
+
+
+def _image_to_dict(image: Image) -> dict[str, Any]:
+    return {
+        'width': image.width,
+        'height': image.height,
+        'byte_size': image.byte_size,
+        'format': image.format,
+        'placeholder': image.placeholder,
+    }
+
+
+def recipe_to_dict(recipe: Recipe) -> dict[str, Any]:
+    """Convert recipe with loaded relationships to ``RecipeEntityResponse``."""
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'description': recipe.description,
+        'image_id': recipe.image_id,
+        'image': _image_to_dict(recipe.image),
+        'ingredients': sorted(
+            association.ingredient.name for association in recipe.ingredients
+        ),
+        'steps': [
+            {
+                'order': step.order,
+                'description': step.description,
+                'duration': step.duration.total_seconds(),
+                'image_id': step.image_id,
+                'image': _image_to_dict(step.image),
+            }
+            for step in sorted(recipe.steps, key=lambda step: step.order)
+        ],
+    }
+
+
+def dump_recipe_document(document: dict[str, Any] | None) -> bytes:
+    return _dumps(document)
+
+
+def dump_recipe_batch(ids: Iterable[int], recipes: dict[int, Recipe]) -> bytes:
+    return _dumps(
+        [
+            {'id': id, 'recipe': recipe_to_dict(recipes[id]), 'detail': None}
+            if id in recipes
+            else {'id': id, 'recipe': None, 'detail': 'Not Found'}
+            for id in ids
+        ]
+    )
@@ -2,6 +2,7 @@ from fastapi.routing import APIRouter
 
 from .auth.route import router as auth_router
 from .image.route import router as image_router
+from .metrics.route import router as metrics_router
 from .recipe.route import router as recipe_router
 
 
@@ -9,4 +10,5 @@ router = APIRouter(prefix='/api/v1')
 
 router.include_router(auth_router)
 router.include_router(image_router)
+router.include_router(metrics_router)
 router.include_router(recipe_router)
@@ -0,0 +1,97 @@
+"""Process-local caches.
+
+Every cached value lives in memory of the worker which computed it,
+writes made through CRUD functions of the same worker invalidate it.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.config import settings
+from app import metrics
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            expires_at, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.evictions += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Cache value for ``ttl`` seconds, cache-wide TTL by default."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = float('inf') if ttl is None else time.monotonic() + ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class DataVersion:
+    """Counter bumped after every committed write of the tracked data.
+
+    Cache keys include current value, so entries computed before a write
+    are never matched afterwards.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def bump(self):
+        self.value += 1
+
+
+recipe_data_version = DataVersion()
+recipe_list_cache = LRUCache(
+    settings.RECIPE_LIST_CACHE_SIZE,
+    settings.RECIPE_LIST_CACHE_TTL,
+)
+metrics.register('recipe_list_cache', recipe_list_cache.stats)
+recipe_entity_cache = LRUCache(
+    settings.RECIPE_ENTITY_CACHE_SIZE,
+    settings.RECIPE_ENTITY_CACHE_TTL,
+)
+metrics.register('recipe_entity_cache', recipe_entity_cache.stats)
+# Ingredients are never renamed or deleted, so entries stay valid even
+# when other workers add ingredients.
+ingredient_id_cache = LRUCache(settings.INGREDIENT_ID_CACHE_SIZE)
+metrics.register('ingredient_id_cache', ingredient_id_cache.stats)
+# Path is changed only by deleting image or by ``manage.py dedupe-media``,
+# stale entries of other workers are detected by missing file. Clients
+# redirected to storage URLs are not, so then entries expire quickly.
+image_path_cache = LRUCache(settings.IMAGE_PATH_CACHE_SIZE)
+metrics.register('image_path_cache', image_path_cache.stats)
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseSettings
 
@@ -9,6 +10,23 @@ project_path = Path(__file__).parent.parent
 class Settings(BaseSettings):
     PROJECT_PATH: Path = project_path
     MEDIA_PATH: Path = PROJECT_PATH / 'media'
+    # 0 keeps all files in MEDIA_PATH, move existing files with
+    # ``manage.py migrate-media-layout`` after changing it.
+    MEDIA_SHARD_LEVELS: int = 0
+    MEDIA_SHARD_WIDTH: int = 2
+    # Where images are kept, files of MEDIA_PATH or objects of S3 bucket.
+    STORAGE_BACKEND: Literal['local', 's3'] = 'local'
+    S3_ENDPOINT_URL: str = 'https://s3.amazonaws.com'
+    S3_BUCKET: str = ''
+    S3_REGION: str = 'us-east-1'
+    S3_ACCESS_KEY_ID: str = ''
+    S3_SECRET_ACCESS_KEY: str = ''
+    S3_PREFIX: str = ''
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONNECTIONS: int = 32
+    # Redirect image downloads to presigned URLs valid for that many
+    # seconds, 0 streams them through the application.
+    S3_PRESIGNED_URL_TTL: int = 0
 
     DEBUG: bool = True
 
@@ -18,6 +36,38 @@ class Settings(BaseSettings):
 
     AUTH_SECRET: str
 
+    IMAGE_UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    IMAGE_MAX_FILE_SIZE: int = 20 * 1024 * 1024
+    IMAGE_MAX_REQUEST_SIZE: int = 100 * 1024 * 1024
+    # Uploads are recognized by signatures of app.util.IMAGE_SIGNATURES.
+    IMAGE_UPLOAD_FORMATS: list[str] = ['jpeg', 'png', 'gif', 'webp']
+    IMAGE_MAX_PIXELS: int = 50_000_000
+    IMAGE_PLACEHOLDER_SIZE: int = 16
+    IMAGE_POOL_KIND: Literal['thread', 'process'] = 'thread'
+    IMAGE_POOL_WORKERS: int = 2
+    IMAGE_POOL_QUEUE_SIZE: int = 16
+    IMAGE_PATH_CACHE_SIZE: int = 100000
+    IMAGE_PATH_REDIRECT_CACHE_TTL: float = 5
+    IMAGE_DERIVATIVE_PATH: Path = PROJECT_PATH / 'media' / 'derivatives'
+    IMAGE_DERIVATIVE_SIZES: list[int] = [64, 128, 256, 512, 1024, 2048]
+    IMAGE_DERIVATIVE_CACHE_SIZE: int = 1024 * 1024 * 1024
+    # In order of preference, formats Pillow cannot save are skipped.
+    IMAGE_VARIANT_FORMATS: list[str] = ['avif', 'webp']
+    IMAGE_VARIANT_QUALITY: int = 80
+
+    RECIPE_LIST_CACHE_SIZE: int = 1024
+    RECIPE_LIST_CACHE_TTL: float = 60
+    RECIPE_ENTITY_CACHE_SIZE: int = 4096
+    RECIPE_ENTITY_CACHE_TTL: float = 300
+    RECIPE_BATCH_MAX_SIZE: int = 100
+    INGREDIENT_ID_CACHE_SIZE: int = 10000
+    RECIPE_IMPORT_BATCH_SIZE: int = 1000
+    RECIPE_IMPORT_MAX_LINE_SIZE: int = 1024 * 1024
+    RECIPE_IMPORT_MAX_ERRORS: int = 100
+    RATING_WRITE_BEHIND: bool = False
+    RATING_BUFFER_MAX_SIZE: int = 10000
+    RATING_BUFFER_FLUSH_INTERVAL: float = 1
+
     class Config:
         env_file = project_path / '.env'
 
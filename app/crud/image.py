@@ -1,21 +1,339 @@
-from typing import Any
+import asyncio
+from collections import Counter
+from pathlib import Path
+from typing import Any, cast, Iterable, Mapping
 from uuid import UUID
 
-from sqlalchemy import select
+import aiofiles.os
+from sqlalchemy import bindparam, delete, select, Table, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.model.image import Image
+from app.cache import image_path_cache
+from app.config import settings
+from app.exception import ImageInUseError
+from app.model.image import Image, ImageBlob
+from app.storage import storage
+from app.util import get_blob_path, get_media_path, hash_file, inspect_image
 
 
 async def get_image_path(id: UUID, session: AsyncSession) -> str:
     return (await session.execute(select(Image).filter_by(id=id))).scalars().one().path
 
 
+async def _reference_blobs(
+    ref_counts: Mapping[str, int],
+    paths: Mapping[str, str],
+    session: AsyncSession,
+) -> dict[str, str]:
+    """Create blobs or add references to existing ones, locking their rows.
+
+    Return paths of blobs, existing blobs keep theirs, which may be of
+    the previous media layout.
+    """
+    query = insert(ImageBlob).values(
+        [
+            {'hash': hash, 'path': paths[hash], 'ref_count': ref_count}
+            for hash, ref_count in sorted(ref_counts.items())
+        ]
+    )
+    result = await session.execute(
+        query.on_conflict_do_update(
+            index_elements=[ImageBlob.hash],
+            set_={'ref_count': ImageBlob.ref_count + query.excluded.ref_count},
+        ).returning(ImageBlob.hash, ImageBlob.path)
+    )
+    return dict(result.tuples().all())
+
+
+async def _link_files(links: Iterable[tuple[str | Path, str]]):
+    """Hard link files to new paths which are missing, without copying data."""
+    for old_path, path in links:
+        if not await aiofiles.os.path.exists(path):
+            await aiofiles.os.makedirs(Path(path).parent, exist_ok=True)
+            await aiofiles.os.link(old_path, path)
+
+
 async def create_images(
     images_data: list[dict[str, Any]],
     session: AsyncSession,
+    blob_files: Mapping[str, Path] | None = None,
 ) -> list[Image]:
+    """Create images, referencing blobs of those which have ``blob_hash``.
+
+    ``blob_files`` maps blob hashes to files with their content, which
+    are put to storage at blob locations if those are missing. That is
+    done while blob rows are locked, so deleting the last reference
+    concurrently cannot remove the object after it is found in storage.
+    """
     images = [Image(**data) for data in images_data]
+    ref_counts = Counter(image.blob_hash for image in images if image.blob_hash)
+    if ref_counts:
+        paths = await _reference_blobs(
+            ref_counts,
+            {image.blob_hash: image.path for image in images if image.blob_hash},
+            session,
+        )
+        for image in images:
+            if image.blob_hash:
+                image.path = paths[image.blob_hash]
+        for hash, file in (blob_files or {}).items():
+            if not await storage.exists(paths[hash]):
+                await storage.put_file(paths[hash], file)
     session.add_all(images)
     await session.commit()
     return images
+
+
+async def delete_image(id: UUID, session: AsyncSession):
+    """Delete image and, with its last reference, its file.
+
+    File is removed from storage before commit while blob row is locked, so an upload
+    of the same content waits for it and stores the file again.
+    """
+    image = (
+        await session.execute(select(Image).filter_by(id=id).with_for_update())
+    ).scalar_one()
+    try:
+        await session.execute(delete(Image).filter_by(id=id))
+    except IntegrityError:
+        await session.rollback()
+        raise ImageInUseError('Image is used by recipes.')
+    orphan_path: str | None = image.path
+    if image.blob_hash is not None:
+        ref_count = (
+            await session.execute(
+                update(ImageBlob)
+                .filter_by(hash=image.blob_hash)
+                .values(ref_count=ImageBlob.ref_count - 1)
+                .returning(ImageBlob.ref_count)
+            )
+        ).scalar_one()
+        if ref_count > 0:
+            orphan_path = None
+        else:
+            await session.execute(delete(ImageBlob).filter_by(hash=image.blob_hash))
+    if orphan_path is not None:
+        await storage.delete(orphan_path)
+    await session.commit()
+    image_path_cache.pop(id)
+
+
+async def dedupe_images(
+    session: AsyncSession, batch_size: int = 100
+) -> tuple[int, int]:
+    """Move images stored before deduplication to blobs in place.
+
+    Files are hard linked to blob paths, so no data is copied, and old
+    files are removed only after images referencing blobs are committed.
+    Interrupted run leaves at most extra links to blob files and is
+    continued by the next one, which picks images without blob again.
+    Return numbers of moved images and of images with missing files.
+    """
+    moved = missing = 0
+    last_id: UUID | None = None
+    while True:
+        query = (
+            select(Image)
+            .filter(Image.blob_hash.is_(None))
+            .order_by(Image.id)
+            .limit(batch_size)
+            .with_for_update()
+        )
+        if last_id is not None:
+            query = query.filter(Image.id > last_id)
+        images = (await session.execute(query)).scalars().all()
+        if not images:
+            return moved, missing
+        last_id = images[-1].id
+        old_paths: dict[UUID, Path] = {}
+        hashes: dict[UUID, str] = {}
+        for image in images:
+            old_path = Path(image.path)
+            try:
+                hashes[image.id] = await asyncio.to_thread(hash_file, old_path)
+            except FileNotFoundError:
+                missing += 1
+                continue
+            old_paths[image.id] = old_path
+        if not hashes:
+            await session.commit()
+            continue
+        paths = await _reference_blobs(
+            Counter(hashes.values()),
+            {
+                hashes[id]: get_blob_path(
+                    hashes[id], path.suffix.lstrip('.')
+                ).as_posix()
+                for id, path in old_paths.items()
+            },
+            session,
+        )
+        await _link_files(
+            (old_path, paths[hashes[id]]) for id, old_path in old_paths.items()
+        )
+        for image in images:
+            if image.id in hashes:
+                image.blob_hash = hashes[image.id]
+                image.path = paths[image.blob_hash]
+        await session.commit()
+        for id, old_path in old_paths.items():
+            image_path_cache.pop(id)
+            if old_path.as_posix() != paths[hashes[id]]:
+                old_path.unlink(missing_ok=True)
+        moved += len(old_paths)
+
+
+async def _migrate_blobs(session: AsyncSession, batch_size: int) -> tuple[int, int]:
+    moved = missing = 0
+    last_hash: str | None = None
+    images = cast(Table, Image.__table__)
+    while True:
+        query = (
+            select(ImageBlob)
+            .order_by(ImageBlob.hash)
+            .limit(batch_size)
+            .with_for_update()
+        )
+        if last_hash is not None:
+            query = query.filter(ImageBlob.hash > last_hash)
+        blobs = (await session.execute(query)).scalars().all()
+        if not blobs:
+            return moved, missing
+        last_hash = blobs[-1].hash
+        moves: dict[str, tuple[str, str]] = {}
+        for blob in blobs:
+            path = get_media_path(Path(blob.path).name).as_posix()
+            if path == blob.path:
+                continue
+            if await aiofiles.os.path.exists(blob.path):
+                moves[blob.hash] = (blob.path, path)
+            else:
+                missing += 1
+        if moves:
+            await _link_files(moves.values())
+            for blob in blobs:
+                if blob.hash in moves:
+                    blob.path = moves[blob.hash][1]
+            await session.execute(
+                update(images)
+                .where(images.c.blob_hash == bindparam('b_hash'))
+                .values(path=bindparam('b_path')),
+                [{'b_hash': hash, 'b_path': path} for hash, (_, path) in moves.items()],
+            )
+        await session.commit()
+        for old_path, _ in moves.values():
+            Path(old_path).unlink(missing_ok=True)
+        moved += len(moves)
+
+
+async def _migrate_unique_images(
+    session: AsyncSession,
+    batch_size: int,
+) -> tuple[int, int]:
+    moved = missing = 0
+    last_id: UUID | None = None
+    while True:
+        query = (
+            select(Image)
+            .filter(Image.blob_hash.is_(None))
+            .order_by(Image.id)
+            .limit(batch_size)
+            .with_for_update()
+        )
+        if last_id is not None:
+            query = query.filter(Image.id > last_id)
+        images = (await session.execute(query)).scalars().all()
+        if not images:
+            return moved, missing
+        last_id = images[-1].id
+        moves: dict[UUID, tuple[str, str]] = {}
+        for image in images:
+            path = get_media_path(Path(image.path).name).as_posix()
+            if path == image.path:
+                continue
+            if await aiofiles.os.path.exists(image.path):
+                moves[image.id] = (image.path, path)
+            else:
+                missing += 1
+        await _link_files(moves.values())
+        for image in images:
+            if image.id in moves:
+                image.path = moves[image.id][1]
+        await session.commit()
+        for old_path, _ in moves.values():
+            Path(old_path).unlink(missing_ok=True)
+        moved += len(moves)
+
+
+async def migrate_media_layout(
+    session: AsyncSession,
+    batch_size: int = 1000,
+) -> tuple[int, int]:
+    """Move media files to paths of current ``MEDIA_SHARD_LEVELS`` layout.
+
+    As in ``dedupe_images``, files are hard linked to new paths and old
+    files are removed after rows with new paths are committed, so images
+    stay available while the application runs and an interrupted run is
+    continued by the next one. Images resolve to their stored paths,
+    whatever layout those are of. Return numbers of moved files and of
+    missing ones.
+    """
+    moved, missing = await _migrate_blobs(session, batch_size)
+    moved_unique, missing_unique = await _migrate_unique_images(session, batch_size)
+    image_path_cache.clear()
+    return moved + moved_unique, missing + missing_unique
+
+
+async def fill_image_metadata(
+    session: AsyncSession,
+    batch_size: int = 100,
+) -> tuple[int, int]:
+    """Inspect images uploaded before their metadata was stored.
+
+    Return numbers of filled images and of images which are missing or
+    are not valid, those keep empty metadata.
+    """
+    filled = failed = 0
+    last_id: UUID | None = None
+    while True:
+        query = (
+            select(Image)
+            .filter(Image.width.is_(None))
+            .order_by(Image.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.filter(Image.id > last_id)
+        images = (await session.execute(query)).scalars().all()
+        if not images:
+            return filled, failed
+        last_id = images[-1].id
+        for image in images:
+            try:
+                async with storage.fetch(image.path) as path:
+                    byte_size = (await aiofiles.os.stat(path)).st_size
+                    metadata = await asyncio.to_thread(
+                        inspect_image,
+                        path,
+                        settings.IMAGE_MAX_PIXELS,
+                        settings.IMAGE_PLACEHOLDER_SIZE,
+                    )
+            except FileNotFoundError:
+                metadata = None
+            if metadata is None:
+                failed += 1
+                continue
+            image.width = metadata.width
+            image.height = metadata.height
+            image.byte_size = byte_size
+            image.format = metadata.format
+            image.placeholder = metadata.placeholder
+            filled += 1
+        await session.commit()
+
+
+async def get_existing_image_ids(ids: set[UUID], session: AsyncSession) -> set[UUID]:
+    result = await session.execute(select(Image.id).filter(Image.id.in_(ids)))
+    return set(result.scalars())
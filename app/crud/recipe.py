@@ -1,21 +1,50 @@
+from array import array
 from datetime import timedelta
-from typing import Any, cast
+from typing import Any, cast, Iterable, Sequence
 from uuid import UUID
 
-from asyncpg.exceptions import ForeignKeyViolationError  # type: ignore
-from sqlalchemy import case, delete, func, Result, select, Select
-from sqlalchemy.exc import IntegrityError, NoResultFound
+from sqlalchemy import (
+    any_,
+    bindparam,
+    case,
+    CompoundSelect,
+    CursorResult,
+    delete,
+    func,
+    Float,
+    Integer,
+    literal,
+    Row,
+    select,
+    Select,
+    String,
+    Table,
+    Text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, ARRAY, insert, JSONB
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
-from sqlalchemy.orm import contains_eager, joinedload
-from sqlalchemy.sql import SQLColumnExpression
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import ColumnElement, SQLColumnExpression
 
+from app.cache import (
+    ingredient_id_cache,
+    recipe_data_version,
+    recipe_entity_cache,
+)
 from app.database.tools import FilterConditionChain
+from app.ingredient_index import ingredient_index
+from app.model.image import Image
 from app.model.recipe import (
     Ingredient,
     Recipe,
     RecipeIngredientAssociation,
     Step,
     RecipeRate,
+    RecipeStats,
 )
 
 
@@ -36,6 +65,20 @@ def _get_query_with_recipe_ids_containing_all_given_ingredients(
     )
 
 
+def _get_ingredients_condition(
+    id_column: SQLColumnExpression,
+    ingredient_names: set[str],
+) -> ColumnElement[bool]:
+    recipe_ids = ingredient_index.lookup(ingredient_names)
+    if recipe_ids is None:
+        return id_column.in_(
+            _get_query_with_recipe_ids_containing_all_given_ingredients(
+                ingredient_names
+            )
+        )
+    return id_column == any_(literal(recipe_ids, ARRAY(Integer)))
+
+
 def _get_filters(
     duration_column: SQLColumnExpression,
     rating_column: SQLColumnExpression,
@@ -54,11 +97,7 @@ def _get_filters(
         & (
             None
             if ingredient_names is None
-            else id_column.in_(
-                _get_query_with_recipe_ids_containing_all_given_ingredients(
-                    ingredient_names
-                )
-            )
+            else _get_ingredients_condition(id_column, ingredient_names)
         )
         & (None if rating__lte is None else rating_column <= rating__lte)
         & (None if rating__gte is None else rating_column >= rating__gte)
@@ -66,23 +105,50 @@ def _get_filters(
     return filters
 
 
-def apply_order(
-    query: Select,
+def _get_order_key(
     duration_column: SQLColumnExpression,
     rating_column: SQLColumnExpression,
     order: str | None,
-) -> Select:
+) -> tuple[SQLColumnExpression | None, bool]:
     if order is None:
-        return query
+        return None, False
+    descending = order[0] == '-'
     if 'duration' in order:
-        c = duration_column if order[0] != '-' else duration_column.desc()
-        return query.order_by(c)
+        return duration_column, descending
     if 'rating' in order:
-        c = rating_column if order[0] != '-' else rating_column.desc()
-        return query.order_by(c)
+        return rating_column, descending
     raise ValueError('Unexpected order parameter.')
 
 
+def apply_order(
+    query: Select,
+    duration_column: SQLColumnExpression,
+    rating_column: SQLColumnExpression,
+    order: str | None,
+    id_column: SQLColumnExpression | None = None,
+) -> Select:
+    key_column, descending = _get_order_key(duration_column, rating_column, order)
+    columns = [c for c in (key_column, id_column) if c is not None]
+    return query.order_by(*(c.desc() if descending else c for c in columns))
+
+
+def apply_keyset(
+    query: Select,
+    duration_column: SQLColumnExpression,
+    rating_column: SQLColumnExpression,
+    id_column: SQLColumnExpression,
+    order: str | None,
+    after: tuple[Any, int],
+) -> Select:
+    """Filter rows placed after (sort key, id) pair in given order."""
+    key_column, descending = _get_order_key(duration_column, rating_column, order)
+    key, id = after
+    if key_column is None:
+        return query.filter(id_column < id if descending else id_column > id)
+    row = tuple_(key_column, id_column)
+    return query.filter(row < (key, id) if descending else row > (key, id))
+
+
 def get_recipe_list_query(
     duration__lte: timedelta | None = None,
     duration__gte: timedelta | None = None,
@@ -90,7 +156,69 @@ def get_recipe_list_query(
     rating__gte: float | None = None,
     ingredient_names: set[str] | None = None,
     order: str | None = None,
-) -> Select[tuple[Recipe, timedelta, float]]:
+    after: tuple[Any, int] | None = None,
+) -> Select[tuple[int, str, str, timedelta, float]]:
+    """Build query selecting one row per recipe without ingredients.
+
+    Ingredients are loaded for the selected page by
+    ``get_recipe_list_ingredients`` so LIMIT/OFFSET and COUNT
+    operate on recipes rather than recipe-ingredient rows.
+    """
+    filters = _get_filters(
+        RecipeStats.total_duration,
+        RecipeStats.rating,
+        RecipeStats.recipe_id,
+        duration__lte,
+        duration__gte,
+        rating__lte,
+        rating__gte,
+        ingredient_names,
+    )
+    query = filters.resolve(
+        select(
+            Recipe.id,
+            Recipe.name,
+            Recipe.description,
+            RecipeStats.total_duration.label('duration'),
+            RecipeStats.rating,
+        ).join(RecipeStats)
+    )
+    if after is not None:
+        query = apply_keyset(
+            query,
+            RecipeStats.total_duration,
+            RecipeStats.rating,
+            RecipeStats.recipe_id,
+            order,
+            after,
+        )
+    return apply_order(
+        query,
+        RecipeStats.total_duration,
+        RecipeStats.rating,
+        order,
+        RecipeStats.recipe_id,
+    )
+
+
+async def get_recipe_list_ingredients(
+    recipe_ids: Sequence[int],
+    session: AsyncSession,
+) -> dict[int, list[str]]:
+    ingredients: dict[int, list[str]] = {id: [] for id in recipe_ids}
+    if not recipe_ids:
+        return ingredients
+    result = await session.execute(
+        select(RecipeIngredientAssociation.recipe_id, Ingredient.name)
+        .join(RecipeIngredientAssociation.ingredient)
+        .filter(RecipeIngredientAssociation.recipe_id.in_(recipe_ids))
+    )
+    for recipe_id, name in result:
+        ingredients[recipe_id].append(name)
+    return ingredients
+
+
+def _get_actual_recipe_stats_query() -> Select[tuple[int, timedelta, int, int]]:
     step_sq = (
         select(
             Step.recipe_id,
@@ -102,160 +230,694 @@ def get_recipe_list_query(
     rate_sq = (
         select(
             RecipeRate.recipe_id,
-            func.avg(RecipeRate.rate).label('rating'),
-        )
-        .group_by(
-            RecipeRate.recipe_id,
+            func.sum(RecipeRate.rate).label('rating_sum'),
+            func.count().label('rating_count'),
         )
+        .group_by(RecipeRate.recipe_id)
         .subquery()
     )
-    total_duration_column = func.coalesce(
-        step_sq.c.total_duration,
-        timedelta(seconds=0),
+    return (
+        select(
+            Recipe.id.label('recipe_id'),
+            func.coalesce(
+                step_sq.c.total_duration,
+                timedelta(seconds=0),
+            ).label('total_duration'),
+            func.coalesce(rate_sq.c.rating_sum, 0).label('rating_sum'),
+            func.coalesce(rate_sq.c.rating_count, 0).label('rating_count'),
+        )
+        .outerjoin(step_sq, step_sq.c.recipe_id == Recipe.id)
+        .outerjoin(rate_sq, rate_sq.c.recipe_id == Recipe.id)
     )
-    rating_column = func.coalesce(rate_sq.c.rating, 0)
-    filters = _get_filters(
-        total_duration_column,
-        rating_column,
-        Recipe.id,
-        duration__lte,
-        duration__gte,
-        rating__lte,
-        rating__gte,
-        ingredient_names,
+
+
+async def get_inconsistent_recipe_stats(
+    session: AsyncSession,
+) -> Sequence[Row]:
+    """Compare stored stats with ones calculated from steps and rates.
+
+    Returned rows contain actual values and ``stored_*`` ones, stored values
+    are ``None`` when recipe has no stats row at all.
+    """
+    actual = _get_actual_recipe_stats_query().subquery()
+    result = await session.execute(
+        select(
+            actual,
+            RecipeStats.total_duration.label('stored_total_duration'),
+            RecipeStats.rating_sum.label('stored_rating_sum'),
+            RecipeStats.rating_count.label('stored_rating_count'),
+        )
+        .outerjoin(RecipeStats, RecipeStats.recipe_id == actual.c.recipe_id)
+        .filter(
+            RecipeStats.recipe_id.is_(None)
+            | (RecipeStats.total_duration != actual.c.total_duration)
+            | (RecipeStats.rating_sum != actual.c.rating_sum)
+            | (RecipeStats.rating_count != actual.c.rating_count)
+        )
+        .order_by(actual.c.recipe_id)
     )
-    return apply_order(
-        filters.resolve(
-            select(
-                Recipe,
-                total_duration_column,
-                rating_column,
+    return result.all()
+
+
+async def refresh_recipe_stats(
+    session: AsyncSession,
+    recipe_ids: list[int] | None = None,
+):
+    """Recalculate stats from steps and rates and store them."""
+    actual = _get_actual_recipe_stats_query()
+    if recipe_ids is not None:
+        actual = actual.filter(Recipe.id.in_(recipe_ids))
+    stmt = insert(RecipeStats).from_select(
+        ['recipe_id', 'total_duration', 'rating_sum', 'rating_count'],
+        actual,
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[RecipeStats.recipe_id],
+            set_={
+                'total_duration': stmt.excluded.total_duration,
+                'rating_sum': stmt.excluded.rating_sum,
+                'rating_count': stmt.excluded.rating_count,
+            },
+        )
+    )
+    await session.commit()
+
+
+def _get_recipe_query() -> Select[tuple[Recipe]]:
+    """Select recipes with ingredients and steps loaded by separate queries.
+
+    Joining both collections in one statement would return
+    ingredients x steps rows per recipe.
+    """
+    return select(Recipe).options(
+        selectinload(Recipe.ingredients).joinedload(
+            RecipeIngredientAssociation.ingredient
+        ),
+        selectinload(Recipe.steps).joinedload(Step.image),
+        joinedload(Recipe.image),
+    )
+
+
+def _get_image_document(image: type[Image]) -> ColumnElement[Any]:
+    return func.jsonb_build_object(
+        'width',
+        image.width,
+        'height',
+        image.height,
+        'byte_size',
+        image.byte_size,
+        'format',
+        image.format,
+        'placeholder',
+        image.placeholder,
+    )
+
+
+def _get_recipe_document_column() -> ColumnElement[Any]:
+    """Build detail document of ``Recipe`` row it is correlated with.
+
+    Durations are stored as seconds, the same way pydantic serializes
+    ``timedelta`` in JSON.
+    """
+    ingredients = (
+        select(
+            func.coalesce(
+                func.jsonb_agg(aggregate_order_by(Ingredient.name, Ingredient.name)),
+                literal([], JSONB),
             )
-            .join(step_sq)
-            .outerjoin(rate_sq)
-            .join(Recipe.ingredients)
-            .join(RecipeIngredientAssociation.ingredient)
-            .options(
-                contains_eager(Recipe.ingredients)
-                .contains_eager(RecipeIngredientAssociation.ingredient)
-                .load_only(Ingredient.name)
+        )
+        .join(RecipeIngredientAssociation.ingredient)
+        .filter(RecipeIngredientAssociation.recipe_id == Recipe.id)
+        .scalar_subquery()
+    )
+    step_image = aliased(Image)
+    step = func.jsonb_build_object(
+        'order',
+        Step.order,
+        'description',
+        Step.description,
+        'duration',
+        func.extract('epoch', Step.duration).cast(Float),
+        'image_id',
+        Step.image_id,
+        'image',
+        _get_image_document(step_image),
+    )
+    steps = (
+        select(
+            func.coalesce(
+                func.jsonb_agg(aggregate_order_by(step, Step.order)),
+                literal([], JSONB),
             )
-        ),
-        total_duration_column,
-        rating_column,
-        order,
+        )
+        .join(step_image, step_image.id == Step.image_id)
+        .filter(Step.recipe_id == Recipe.id)
+        .scalar_subquery()
+    )
+    recipe_image = aliased(Image)
+    image = (
+        select(_get_image_document(recipe_image))
+        .filter(recipe_image.id == Recipe.image_id)
+        .scalar_subquery()
+    )
+    return func.jsonb_build_object(
+        'id',
+        Recipe.id,
+        'name',
+        Recipe.name,
+        'description',
+        Recipe.description,
+        'image_id',
+        Recipe.image_id,
+        'image',
+        image,
+        'ingredients',
+        ingredients,
+        'steps',
+        steps,
+        type_=JSONB,
     )
 
 
-async def _get_recipe_result(
-    id: int,
+async def get_recipe_document(id: int, session: AsyncSession) -> Row[tuple[int, str]]:
+    """Return version and detail document of recipe as JSON text.
+
+    Document is built from tables for recipes written without one.
+    """
+    result = await session.execute(
+        select(
+            Recipe.version,
+            func.coalesce(Recipe.document, _get_recipe_document_column()).cast(Text),
+        ).filter_by(id=id)
+    )
+    return result.one()
+
+
+def _get_drifted_recipe_documents_condition() -> ColumnElement[bool]:
+    return Recipe.document.is_distinct_from(_get_recipe_document_column())
+
+
+async def get_drifted_recipe_document_ids(session: AsyncSession) -> Sequence[int]:
+    result = await session.execute(
+        select(Recipe.id)
+        .filter(_get_drifted_recipe_documents_condition())
+        .order_by(Recipe.id)
+    )
+    return result.scalars().all()
+
+
+async def rebuild_recipe_documents(
     session: AsyncSession,
-) -> Result[tuple[Recipe]]:
-    return (
-        await session.execute(
-            select(Recipe)
-            .options(
-                joinedload(Recipe.ingredients).joinedload(
-                    RecipeIngredientAssociation.ingredient
+    batch_size: int = 1000,
+) -> int:
+    """Rewrite drifted documents in batches of ids, return their count.
+
+    Version of rewritten recipes is incremented, so clients holding
+    old ETags get new content.
+    """
+    rebuilt, last_id = 0, 0
+    while True:
+        ids = (
+            (
+                await session.execute(
+                    select(Recipe.id)
+                    .filter(Recipe.id > last_id)
+                    .order_by(Recipe.id)
+                    .limit(batch_size)
                 )
             )
-            .options(joinedload(Recipe.steps))
-            .filter_by(id=id)
+            .scalars()
+            .all()
         )
-    ).unique()
+        if not ids:
+            return rebuilt
+        result = cast(
+            CursorResult,
+            await session.execute(
+                update(Recipe)
+                .filter(Recipe.id.between(ids[0], ids[-1]))
+                .filter(_get_drifted_recipe_documents_condition())
+                .values(
+                    document=_get_recipe_document_column(), version=Recipe.version + 1
+                )
+                .execution_options(synchronize_session=False)
+            ),
+        )
+        await session.commit()
+        rebuilt += result.rowcount
+        last_id = ids[-1]
 
 
-async def get_recipe(
-    id: int,
+async def get_recipes(
+    ids: Sequence[int],
+    session: AsyncSession,
+) -> dict[int, Recipe]:
+    """Load recipes with one query per relationship for the whole batch."""
+    result = await session.execute(_get_recipe_query().filter(Recipe.id.in_(ids)))
+    return {recipe.id: recipe for recipe in result.scalars()}
+
+
+def _get_ingredient_upsert_query(
+    names: list[str],
+) -> CompoundSelect:
+    """Insert missing ingredients and select ids of all given ones.
+
+    Rows committed by concurrent transactions after the statement
+    started are skipped by ON CONFLICT but are not visible to its
+    SELECT part either, so callers have to query them separately.
+    """
+    names_array = literal(names, ARRAY(String))
+    inserted = (
+        insert(Ingredient)
+        .from_select(['name'], select(func.unnest(names_array)))
+        .on_conflict_do_nothing(index_elements=[Ingredient.name])
+        .returning(Ingredient.id, Ingredient.name)
+        .cte('inserted')
+    )
+    return select(inserted.c.id, inserted.c.name).union_all(
+        select(Ingredient.id, Ingredient.name).filter(
+            Ingredient.name == any_(names_array)
+        )
+    )
+
+
+async def get_ingredient_ids(
+    names: set[str],
+    session: AsyncSession,
+) -> dict[str, int]:
+    """Return ids of ingredients with given names creating missing ones.
+
+    Known names are taken from ``ingredient_id_cache``, ids are put
+    there by ``remember_ingredient_ids`` once transaction is committed.
+    """
+    ids: dict[str, int] = {}
+    missing = []
+    for name in names:
+        id = ingredient_id_cache.get(name)
+        if id is None:
+            missing.append(name)
+        else:
+            ids[name] = id
+    if missing:
+        # Sorted names make concurrent inserts lock rows in the same order.
+        result = await session.execute(_get_ingredient_upsert_query(sorted(missing)))
+        ids.update({name: id for id, name in result})
+    if len(ids) < len(names):
+        result = await session.execute(
+            select(Ingredient.id, Ingredient.name).filter(
+                Ingredient.name.in_(names - ids.keys())
+            )
+        )
+        ids.update({name: id for id, name in result})
+    return ids
+
+
+def remember_ingredient_ids(ids: dict[str, int]):
+    for name, id in ids.items():
+        ingredient_id_cache.set(name, id)
+
+
+async def create_recipe(
+    data: dict[str, Any],
     session: AsyncSession,
 ) -> Recipe:
-    result = await _get_recipe_result(id, session)
-    return result.scalar_one()
+    ingredient_names = data.pop('ingredients')
+    ingredient_ids = await get_ingredient_ids(ingredient_names, session)
+    steps = [Step(**data) for data in data.pop('steps')]
+    recipe = Recipe(
+        **data,
+        steps=steps,
+        ingredients=[
+            RecipeIngredientAssociation(ingredient_id=id)
+            for id in ingredient_ids.values()
+        ],
+    )
+    session.add(recipe)
+    await session.flush()
+    total_duration = sum((step.duration for step in steps), timedelta())
+    await session.execute(
+        insert(RecipeStats).values(recipe_id=recipe.id, total_duration=total_duration)
+    )
+    result = await session.execute(
+        update(Recipe)
+        .filter_by(id=recipe.id)
+        .values(document=_get_recipe_document_column())
+        .returning(Recipe.document)
+        .execution_options(synchronize_session=False)
+    )
+    set_committed_value(recipe, 'document', result.scalar_one())
+    await session.commit()
+    remember_ingredient_ids(ingredient_ids)
+    ingredient_index.add(recipe.id, ingredient_names)
+    recipe_data_version.bump()
+    return recipe
 
 
-async def _get_existing_and_new_ingredients_from_names(
-    ingredient_names: set[str],
+async def _copy_records(
+    table: str,
+    columns: list[str],
+    records: list[tuple[Any, ...]],
     session: AsyncSession,
-) -> tuple[list[Ingredient], list[Ingredient]]:
-    existing_ingredients = cast(
-        list[Ingredient],
+):
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(  # type: ignore
+        table,
+        columns=columns,
+        records=records,
+    )
+
+
+async def import_recipes(
+    recipes: list[dict[str, Any]],
+    session: AsyncSession,
+) -> list[int]:
+    """Write batch of validated recipes with COPY in one transaction.
+
+    Recipe ids are reserved from the sequence up front, so rows of
+    every table are copied without reading generated keys back.
+    """
+    ingredient_ids = await get_ingredient_ids(
+        set().union(*(recipe['ingredients'] for recipe in recipes)),
+        session,
+    )
+    ids = (
         (
             await session.execute(
-                select(Ingredient).filter(Ingredient.name.in_(ingredient_names))
+                select(func.nextval('recipe_id_seq')).select_from(
+                    func.generate_series(1, len(recipes))
+                )
             )
         )
         .scalars()
-        .all(),
+        .all()
+    )
+    await _copy_records(
+        'recipe',
+        ['id', 'name', 'description', 'image_id'],
+        [
+            (id, recipe['name'], recipe['description'], recipe['image_id'])
+            for id, recipe in zip(ids, recipes)
+        ],
+        session,
+    )
+    await _copy_records(
+        'step',
+        ['recipe_id', 'order', 'description', 'duration', 'image_id'],
+        [
+            (id, step['order'], step['description'], step['duration'], step['image_id'])
+            for id, recipe in zip(ids, recipes)
+            for step in recipe['steps']
+        ],
+        session,
+    )
+    await _copy_records(
+        'recipe_ingredient_association',
+        ['recipe_id', 'ingredient_id'],
+        [
+            (id, ingredient_ids[name])
+            for id, recipe in zip(ids, recipes)
+            for name in recipe['ingredients']
+        ],
+        session,
+    )
+    await _copy_records(
+        'recipe_stats',
+        ['recipe_id', 'total_duration'],
+        [
+            (id, sum((step['duration'] for step in recipe['steps']), timedelta()))
+            for id, recipe in zip(ids, recipes)
+        ],
+        session,
+    )
+    await session.execute(
+        update(Recipe)
+        .filter(Recipe.id.in_(ids))
+        .values(document=_get_recipe_document_column())
+        .execution_options(synchronize_session=False)
     )
-    new_ingredients = [
-        Ingredient(name=name)
-        for name in ingredient_names - {i.name for i in existing_ingredients}
+    await session.commit()
+    remember_ingredient_ids(ingredient_ids)
+    for id, recipe in zip(ids, recipes):
+        ingredient_index.add(id, recipe['ingredients'])
+    recipe_data_version.bump()
+    return list(ids)
+
+
+def _diff_steps(
+    old: dict[int, dict[str, Any]],
+    new: dict[int, dict[str, Any]],
+) -> tuple[list[int], list[dict[str, Any]], list[dict[str, Any]]]:
+    """Return orders of deleted steps, inserted steps and changed steps."""
+    deleted = [order for order in old if order not in new]
+    inserted = [step for order, step in new.items() if order not in old]
+    changed = [
+        step for order, step in new.items() if order in old and step != old[order]
     ]
-    return existing_ingredients, new_ingredients
+    return deleted, inserted, changed
 
 
-async def _update_entire_recipe(
-    recipe: Recipe,
-    steps: list[Step],
-    ingredient_names: set[str],
+async def _edit_recipe_steps(
+    id: int,
+    steps: list[dict[str, Any]],
     session: AsyncSession,
 ):
-    existing, new = await _get_existing_and_new_ingredients_from_names(
-        ingredient_names,
-        session,
+    result = await session.execute(
+        select(Step.order, Step.description, Step.duration, Step.image_id).filter_by(
+            recipe_id=id
+        )
+    )
+    deleted, inserted, changed = _diff_steps(
+        {row.order: row._asdict() for row in result},
+        {step['order']: step for step in steps},
+    )
+    if deleted:
+        await session.execute(
+            delete(Step)
+            .filter(Step.recipe_id == id, Step.order.in_(deleted))
+            .execution_options(synchronize_session=False)
+        )
+    if inserted:
+        await session.execute(
+            insert(Step),
+            [step | {'recipe_id': id} for step in inserted],
+        )
+    if changed:
+        await session.execute(
+            update(Step),
+            [step | {'recipe_id': id} for step in changed],
+        )
+    total_duration = sum((step['duration'] for step in steps), timedelta())
+    await session.execute(
+        update(RecipeStats)
+        .filter_by(recipe_id=id)
+        .values(total_duration=total_duration)
+        .execution_options(synchronize_session=False)
     )
-    all_ingredients = existing + new
-    recipe.steps = steps
-    recipe.ingredients = [
-        RecipeIngredientAssociation(ingredient=ingredient)
-        for ingredient in all_ingredients
-    ]
-    session.add(recipe)
-    session.add_all(new)
-    await session.commit()
-    return recipe
 
 
-async def create_recipe(
-    data: dict[str, Any],
+async def _edit_recipe_ingredients(
+    id: int,
+    ingredient_names: set[str],
     session: AsyncSession,
-) -> Recipe:
-    ingredient_names = data.pop('ingredients')
-    steps = [Step(**data) for data in data.pop('steps')]
-    recipe = Recipe(**data)
-    return await _update_entire_recipe(
-        recipe,
-        steps,
-        ingredient_names,
-        session,
+) -> tuple[set[str], dict[str, int]]:
+    """Replace ingredients of recipe.
+
+    Return previous ingredient names and ids of added ingredients.
+    """
+    result = await session.execute(
+        select(Ingredient.name, Ingredient.id)
+        .join(RecipeIngredientAssociation)
+        .filter(RecipeIngredientAssociation.recipe_id == id)
     )
+    old = {name: ingredient_id for name, ingredient_id in result}
+    removed = [old[name] for name in old.keys() - ingredient_names]
+    if removed:
+        await session.execute(
+            delete(RecipeIngredientAssociation)
+            .filter(
+                RecipeIngredientAssociation.recipe_id == id,
+                RecipeIngredientAssociation.ingredient_id.in_(removed),
+            )
+            .execution_options(synchronize_session=False)
+        )
+    added = await get_ingredient_ids(ingredient_names - old.keys(), session)
+    if added:
+        await session.execute(
+            insert(RecipeIngredientAssociation),
+            [
+                {'recipe_id': id, 'ingredient_id': ingredient_id}
+                for ingredient_id in added.values()
+            ],
+        )
+    return set(old), added
 
 
 async def edit_recipe(
     id: int,
     data: dict[str, Any],
     session: AsyncSession,
-) -> Recipe:
-    result = await _get_recipe_result(id, session)
-    recipe = result.scalar_one()
-    steps = [Step(**data) for data in data.pop('steps')]
-    ingredient_names = data.pop('ingredients')
-    return await _update_entire_recipe(
-        recipe,
-        steps,
-        ingredient_names,
-        session,
+) -> tuple[int, str]:
+    """Apply given fields to recipe and return its new version and document.
+
+    Missing keys are left as is. Given ``steps`` (matched by order) and
+    ``ingredients`` are compared with stored ones, so only changed rows
+    are inserted, updated or deleted.
+    """
+    # Lock recipe row, so concurrent edits do not diff against stale state.
+    result = await session.execute(select(Recipe.id).filter_by(id=id).with_for_update())
+    result.scalar_one()
+    steps = data.pop('steps', None)
+    ingredient_names = data.pop('ingredients', None)
+    if steps is not None:
+        await _edit_recipe_steps(id, steps, session)
+    old_ingredient_names = None
+    added_ingredient_ids: dict[str, int] = {}
+    if ingredient_names is not None:
+        old_ingredient_names, added_ingredient_ids = await _edit_recipe_ingredients(
+            id,
+            ingredient_names,
+            session,
+        )
+    if data:
+        await session.execute(
+            update(Recipe)
+            .filter_by(id=id)
+            .values(**data)
+            .execution_options(synchronize_session=False)
+        )
+    result = await session.execute(
+        update(Recipe)
+        .filter_by(id=id)
+        .values(document=_get_recipe_document_column(), version=Recipe.version + 1)
+        .returning(Recipe.version, Recipe.document.cast(Text))
+        .execution_options(synchronize_session=False)
     )
+    version, document = result.one()
+    await session.commit()
+    remember_ingredient_ids(added_ingredient_ids)
+    if old_ingredient_names is not None:
+        ingredient_index.update(id, old_ingredient_names, ingredient_names)
+    recipe_entity_cache.pop(id)
+    recipe_data_version.bump()
+    return version, document
 
 
 async def delete_recipe(
     id: int,
     engine: AsyncEngine,
 ):
-    async with engine.connect() as conn:
+    async with engine.begin() as conn:
+        ingredient_names = (
+            (
+                await conn.execute(
+                    select(Ingredient.name)
+                    .join(RecipeIngredientAssociation)
+                    .filter(RecipeIngredientAssociation.recipe_id == id)
+                )
+            )
+            .scalars()
+            .all()
+        )
         result = await conn.execute(delete(Recipe).filter_by(id=id))
     if result.rowcount == 0:
         raise NoResultFound("Recipe with given id not found.")
+    ingredient_index.remove(id, ingredient_names)
+    recipe_entity_cache.pop(id)
+    recipe_data_version.bump()
+
+
+async def build_ingredient_index(session: AsyncSession):
+    result = await session.stream(
+        select(
+            Ingredient.name,
+            func.array_agg(
+                aggregate_order_by(
+                    RecipeIngredientAssociation.recipe_id,
+                    RecipeIngredientAssociation.recipe_id,
+                )
+            ),
+        )
+        .join(RecipeIngredientAssociation.ingredient)
+        .group_by(Ingredient.name)
+    )
+    ingredient_index.build(
+        [(name, array('I', recipe_ids)) async for name, recipe_ids in result]
+    )
+
+
+async def rate_recipes(
+    rates: Iterable[tuple[UUID, int, int]],
+    session: AsyncSession,
+) -> set[int]:
+    """Upsert (user id, recipe id, rate) triples, last rate of pair wins.
+
+    Stats rows of rated recipes are locked first, so concurrent writers
+    of the same recipe apply their deltas one after another. Return ids
+    of existing recipes, rates of other recipes are dropped.
+    """
+    latest = {(user_id, recipe_id): rate for user_id, recipe_id, rate in rates}
+    recipe_ids = (
+        (
+            await session.execute(
+                select(RecipeStats.recipe_id)
+                .filter(
+                    RecipeStats.recipe_id.in_({recipe_id for _, recipe_id in latest})
+                )
+                .order_by(RecipeStats.recipe_id)
+                .with_for_update()
+            )
+        )
+        .scalars()
+        .all()
+    )
+    latest = {key: rate for key, rate in latest.items() if key[1] in recipe_ids}
+    if not latest:
+        await session.commit()
+        return set()
+    old = {
+        (user_id, recipe_id): rate
+        for user_id, recipe_id, rate in await session.execute(
+            select(RecipeRate.user_id, RecipeRate.recipe_id, RecipeRate.rate).filter(
+                tuple_(RecipeRate.user_id, RecipeRate.recipe_id).in_(latest)
+            )
+        )
+    }
+    stmt = insert(RecipeRate).values(
+        [
+            {'user_id': user_id, 'recipe_id': recipe_id, 'rate': rate}
+            for (user_id, recipe_id), rate in latest.items()
+        ]
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[RecipeRate.user_id, RecipeRate.recipe_id],
+            set_={'rate': stmt.excluded.rate},
+        )
+    )
+    deltas: dict[int, list[int]] = {}
+    for key, rate in latest.items():
+        delta = deltas.setdefault(key[1], [0, 0])
+        delta[0] += rate - old.get(key, 0)
+        delta[1] += key not in old
+    stats = cast(Table, RecipeStats.__table__)
+    await session.execute(
+        update(stats)
+        .where(stats.c.recipe_id == bindparam('b_recipe_id'))
+        .values(
+            rating_sum=stats.c.rating_sum + bindparam('b_sum'),
+            rating_count=stats.c.rating_count + bindparam('b_count'),
+        ),
+        [
+            {'b_recipe_id': recipe_id, 'b_sum': sum_delta, 'b_count': count_delta}
+            for recipe_id, (sum_delta, count_delta) in deltas.items()
+            if sum_delta or count_delta
+        ],
+    )
+    await session.commit()
+    recipe_data_version.bump()
+    return set(recipe_ids)
 
 
 async def rate_recipe(
@@ -264,13 +926,5 @@ async def rate_recipe(
     rate: int,
     session: AsyncSession,
 ):
-    try:
-        session.add(RecipeRate(recipe_id=recipe_id, user_id=user_id, rate=rate))
-        await session.commit()
-    except IntegrityError as exc:
-        try:
-            if isinstance(exc.__cause__.__cause__, ForeignKeyViolationError):  # type: ignore
-                raise NoResultFound("Recipe with given id not found.")
-            raise exc
-        except AttributeError:
-            raise exc
+    if not await rate_recipes([(user_id, recipe_id, rate)], session):
+        raise NoResultFound("Recipe with given id not found.")
@@ -0,0 +1,155 @@
+"""Disk cache of resized and converted images.
+
+Derivatives are files of ``IMAGE_DERIVATIVE_PATH`` named by callers
+after the source file, resize parameters and format. Cache keeps their sizes in
+LRU order, indexing files left by previous runs by modification time,
+and removes least recently used files once their total size exceeds
+the limit. Indexed files removed by other processes sharing the
+directory, or by hand, are generated again. Missing derivative is
+generated once per process, however many requests wait for it, or in
+background if nobody waits.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+import aiofiles.os
+
+from app import metrics
+from app.config import settings
+
+
+class DerivativeCache:
+    def __init__(self, path: Path, max_size: int) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+        self._files: OrderedDict[str, int] | None = None
+        self._index_lock = asyncio.Lock()
+        self._pending: dict[str, asyncio.Task[Path]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failures = 0
+
+    def _scan(self) -> OrderedDict[str, int]:
+        self.path.mkdir(parents=True, exist_ok=True)
+        entries = sorted(
+            (entry.stat().st_mtime, entry.name, entry.stat().st_size)
+            for entry in os.scandir(self.path)
+            if entry.is_file() and not entry.name.startswith('.')
+        )
+        return OrderedDict((name, size) for _, name, size in entries)
+
+    async def _index(self) -> OrderedDict[str, int]:
+        if self._files is None:
+            # Directory may hold many files, it is scanned once off the loop.
+            async with self._index_lock:
+                if self._files is None:
+                    files = await asyncio.to_thread(self._scan)
+                    self.size = sum(files.values())
+                    self._files = files
+        return self._files
+
+    async def _add(self, name: str, size: int):
+        files = await self._index()
+        self.size += size - files.get(name, 0)
+        files[name] = size
+        files.move_to_end(name)
+        while self.size > self.max_size and len(files) > 1:
+            evicted, evicted_size = files.popitem(last=False)
+            (self.path / evicted).unlink(missing_ok=True)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    async def _generate(
+        self,
+        name: str,
+        generate: Callable[[Path], Awaitable[None]],
+    ) -> Path:
+        path = self.path / name
+        temp_path = self.path / f'.{uuid4().hex}.tmp'
+        try:
+            await generate(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+        await self._add(name, (await aiofiles.os.stat(path)).st_size)
+        return path
+
+    async def _lookup(self, name: str) -> Path | None:
+        files = await self._index()
+        path = self.path / name
+        if name in files and not await aiofiles.os.path.exists(path):
+            # Removed by another process sharing the directory or by hand.
+            self.size -= files.pop(name)
+        if name not in files:
+            self.misses += 1
+            return None
+        files.move_to_end(name)
+        self.hits += 1
+        return path
+
+    def _start(
+        self,
+        name: str,
+        generate: Callable[[Path], Awaitable[None]],
+    ) -> asyncio.Task[Path]:
+        task = self._pending.get(name)
+        if task is None:
+            task = asyncio.create_task(self._generate(name, generate))
+            self._pending[name] = task
+            task.add_done_callback(lambda task: self._finish(name, task))
+        return task
+
+    def _finish(self, name: str, task: asyncio.Task[Path]):
+        del self._pending[name]
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+
+    async def get(
+        self,
+        name: str,
+        generate: Callable[[Path], Awaitable[None]],
+    ) -> Path:
+        """Return path of derivative, calling ``generate`` to write it if missing.
+
+        Concurrent calls for the same missing derivative share one
+        generation, which is not cancelled with the requests.
+        """
+        path = await self._lookup(name)
+        if path is None:
+            path = await asyncio.shield(self._start(name, generate))
+        return path
+
+    async def get_or_schedule(
+        self,
+        name: str,
+        generate: Callable[[Path], Awaitable[None]],
+    ) -> Path | None:
+        """Return path of cached derivative or start generating it in background."""
+        path = await self._lookup(name)
+        if path is None:
+            self._start(name, generate)
+        return path
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'files': len(self._files or ()),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'failures': self.failures,
+        }
+
+
+derivative_cache = DerivativeCache(
+    settings.IMAGE_DERIVATIVE_PATH,
+    settings.IMAGE_DERIVATIVE_CACHE_SIZE,
+)
+metrics.register('image_derivative_cache', derivative_cache.stats)
@@ -5,3 +5,26 @@ class InvalidImagesError(Exception):
             f'\t{pos}: {name if name else "unnamed"}\n' for pos, name in info
         ]
         super().__init__(f"Invalid images (\n{''.join(string_errors)})")
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+class ImagesTooLargeError(Exception):
+    def __init__(self, info: list[tuple[int, str | None]], limit: int) -> None:
+        self.info = info
+        self.limit = limit
+        super().__init__(f'Images exceed {limit} bytes limit')
+
+
+class WorkerPoolBusyError(Exception):
+    pass
+
+
+class ImageInUseError(Exception):
+    pass
+
+
+class StorageError(Exception):
+    pass
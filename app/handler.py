@@ -2,7 +2,13 @@ from fastapi import Request, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import NoResultFound
 
-from .exception import InvalidImagesError
+from .exception import (
+    ImageInUseError,
+    ImagesTooLargeError,
+    InvalidCursorError,
+    InvalidImagesError,
+    WorkerPoolBusyError,
+)
 
 
 async def instance_not_found(request: Request, exc: NoResultFound):
@@ -26,3 +32,64 @@ async def image_upload_exception_handler(request: Request, exc: InvalidImagesErr
             ]
         },
     )
+
+
+async def images_too_large_exception_handler(
+    request: Request,
+    exc: ImagesTooLargeError,
+):
+    detail = [
+        {
+            'loc': ['body', pos],
+            'msg': f"<{filename if filename else 'unnamed'}>"
+            f" exceeds {exc.limit} bytes limit",
+            'type': 'value_error.image_size',
+        }
+        for pos, filename in exc.info
+    ]
+    if not exc.info:
+        # Rejected by Content-Length before any file was read.
+        detail.append(
+            {
+                'loc': ['body'],
+                'msg': f'Request exceeds {exc.limit} bytes limit',
+                'type': 'value_error.request_size',
+            }
+        )
+    return JSONResponse(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        content={'detail': detail},
+    )
+
+
+async def image_in_use_exception_handler(request: Request, exc: ImageInUseError):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={'detail': str(exc)},
+    )
+
+
+async def invalid_cursor_exception_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={
+            'detail': [
+                {
+                    'loc': ['query', 'cursor'],
+                    'msg': str(exc),
+                    'type': 'value_error.cursor',
+                }
+            ]
+        },
+    )
+
+
+async def worker_pool_busy_exception_handler(
+    request: Request,
+    exc: WorkerPoolBusyError,
+):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'detail': str(exc)},
+        headers={'Retry-After': '1'},
+    )
@@ -0,0 +1,81 @@
+"""In-process inverted index: ingredient name -> sorted recipe ids.
+
+Posting lists are ``array('I')`` sorted in ascending order, so every
+recipe costs 4 bytes per ingredient it contains. The index lives in
+the memory of a single process and is patched by CRUD functions of
+that process only, so it is valid while application runs as one
+worker (as in docker-compose). Until ``build`` is called ``lookup``
+returns ``None`` and callers fall back to SQL filtering.
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+
+def _contains(postings: array, recipe_id: int) -> bool:
+    i = bisect_left(postings, recipe_id)
+    return i < len(postings) and postings[i] == recipe_id
+
+
+class IngredientIndex:
+    def __init__(self) -> None:
+        self._postings: dict[str, array] = {}
+        self.ready = False
+
+    def build(self, postings: Iterable[tuple[str, array]]):
+        """Replace index content with (name, ascending recipe ids) pairs."""
+        self._postings = {name: ids for name, ids in postings if ids}
+        self.ready = True
+
+    def add(self, recipe_id: int, names: Iterable[str]):
+        for name in names:
+            postings = self._postings.setdefault(name, array('I'))
+            i = bisect_left(postings, recipe_id)
+            if i == len(postings) or postings[i] != recipe_id:
+                postings.insert(i, recipe_id)
+
+    def remove(self, recipe_id: int, names: Iterable[str]):
+        for name in names:
+            postings = self._postings.get(name)
+            if postings is None:
+                continue
+            i = bisect_left(postings, recipe_id)
+            if i < len(postings) and postings[i] == recipe_id:
+                del postings[i]
+            if not postings:
+                del self._postings[name]
+
+    def update(self, recipe_id: int, old_names: set[str], new_names: set[str]):
+        self.remove(recipe_id, old_names - new_names)
+        self.add(recipe_id, new_names - old_names)
+
+    def lookup(self, names: set[str]) -> list[int] | None:
+        """Return sorted ids of recipes containing all given ingredients."""
+        if not self.ready:
+            return None
+        lists = []
+        for name in names:
+            postings = self._postings.get(name)
+            if postings is None:
+                return []
+            lists.append(postings)
+        if not lists:
+            return []
+        lists.sort(key=len)
+        result = lists[0].tolist()
+        for postings in lists[1:]:
+            result = [id for id in result if _contains(postings, id)]
+            if not result:
+                break
+        return result
+
+    def memory_usage(self) -> int:
+        """Approximate size of posting lists with dictionary and keys in bytes."""
+        return sys.getsizeof(self._postings) + sum(
+            sys.getsizeof(name) + sys.getsizeof(postings)
+            for name, postings in self._postings.items()
+        )
+
+
+ingredient_index = IngredientIndex()
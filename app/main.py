@@ -4,8 +4,26 @@ from sqlalchemy.exc import NoResultFound
 
 from .api import router as api_router
 from .config import settings
-from .exception import InvalidImagesError
-from .handler import image_upload_exception_handler, instance_not_found
+from .crud import recipe as recipe_crud
+from .database.tools import async_session
+from .exception import (
+    ImageInUseError,
+    ImagesTooLargeError,
+    InvalidCursorError,
+    InvalidImagesError,
+    WorkerPoolBusyError,
+)
+from .handler import (
+    image_in_use_exception_handler,
+    image_upload_exception_handler,
+    images_too_large_exception_handler,
+    instance_not_found,
+    invalid_cursor_exception_handler,
+    worker_pool_busy_exception_handler,
+)
+from .rating_buffer import rating_buffer
+from .storage import storage
+from .worker_pool import image_pool
 
 
 app = FastAPI(debug=settings.DEBUG)
@@ -14,8 +32,51 @@ app.add_exception_handler(
     InvalidImagesError,
     image_upload_exception_handler,
 )
+app.add_exception_handler(
+    ImagesTooLargeError,
+    images_too_large_exception_handler,
+)
+app.add_exception_handler(
+    ImageInUseError,
+    image_in_use_exception_handler,
+)
 app.add_exception_handler(
     NoResultFound,
     instance_not_found,
 )
+app.add_exception_handler(
+    InvalidCursorError,
+    invalid_cursor_exception_handler,
+)
+app.add_exception_handler(
+    WorkerPoolBusyError,
+    worker_pool_busy_exception_handler,
+)
 add_pagination(app)
+
+
+@app.on_event('startup')
+async def build_ingredient_index():
+    async with async_session() as session:
+        await recipe_crud.build_ingredient_index(session)
+
+
+@app.on_event('startup')
+async def start_rating_buffer():
+    if settings.RATING_WRITE_BEHIND:
+        rating_buffer.start()
+
+
+@app.on_event('shutdown')
+async def flush_rating_buffer():
+    await rating_buffer.stop()
+
+
+@app.on_event('shutdown')
+def shutdown_image_pool():
+    image_pool.shutdown()
+
+
+@app.on_event('shutdown')
+async def close_storage():
+    await storage.close()
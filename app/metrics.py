@@ -0,0 +1,12 @@
+from typing import Any, Callable
+
+
+_providers: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register(name: str, provider: Callable[[], dict[str, Any]]):
+    _providers[name] = provider
+
+
+def collect() -> dict[str, dict[str, Any]]:
+    return {name: provider() for name, provider in _providers.items()}
@@ -1,13 +1,38 @@
 from uuid import UUID
 
+from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database.base import Base
 
 
+class ImageBlob(Base):
+    """Stored file shared by images with identical content."""
+
+    __tablename__ = 'image_blob'
+
+    hash: Mapped[str] = mapped_column(primary_key=True)
+    path: Mapped[str] = mapped_column(nullable=False)
+    ref_count: Mapped[int] = mapped_column(nullable=False)
+
+
 class Image(Base):
     __tablename__ = 'image'
 
     id: Mapped[UUID] = mapped_column(primary_key=True, index=True)
     path: Mapped[str] = mapped_column(nullable=False)
     original_filename: Mapped[str] = mapped_column(nullable=True)
+    # Read at upload, missing for images uploaded before until
+    # ``manage.py fill-image-metadata`` is run.
+    width: Mapped[int | None]
+    height: Mapped[int | None]
+    byte_size: Mapped[int | None]
+    format: Mapped[str | None]
+    # Tiny JPEG as data URI, shown while image loads.
+    placeholder: Mapped[str | None]
+    # Images stored before deduplication own their file and have no blob
+    # until ``manage.py dedupe-media`` is run.
+    blob_hash: Mapped[str | None] = mapped_column(
+        ForeignKey('image_blob.hash', ondelete='RESTRICT'),
+        index=True,
+    )
@@ -1,9 +1,12 @@
 from datetime import timedelta
+from typing import Any
 
-from sqlalchemy import Index, ForeignKey, String
+from sqlalchemy import Computed, Index, ForeignKey, String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database.base import Base
+from app.model.image import Image
 
 
 class RecipeRate(Base):
@@ -41,6 +44,14 @@ class Recipe(Base):
         ForeignKey('image.id', ondelete='RESTRICT'),
         nullable=False,
     )
+    image: Mapped[Image] = relationship()
+    version: Mapped[int] = mapped_column(
+        nullable=False,
+        default=1,
+        server_default='1',
+    )
+    # Denormalized detail response, rebuilt on every write of the recipe.
+    document: Mapped[dict[str, Any] | None] = mapped_column(JSONB)
     ingredients: Mapped[list['RecipeIngredientAssociation']] = relationship(
         cascade='all, delete-orphan',
     )
@@ -105,3 +116,27 @@ class Step(Base):
         ForeignKey('image.id', ondelete='RESTRICT'),
         nullable=False,
     )
+    image: Mapped[Image] = relationship()
+
+
+class RecipeStats(Base):
+    __tablename__ = 'recipe_stats'
+    __table_args__ = (
+        Index('ix_recipe_stats_total_duration_keyset', 'total_duration', 'recipe_id'),
+        Index('ix_recipe_stats_rating_keyset', 'rating', 'recipe_id'),
+    )
+
+    recipe_id: Mapped[int] = mapped_column(
+        ForeignKey('recipe.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    total_duration: Mapped[timedelta] = mapped_column(nullable=False)
+    rating_sum: Mapped[int] = mapped_column(nullable=False, server_default='0')
+    rating_count: Mapped[int] = mapped_column(nullable=False, server_default='0')
+    rating: Mapped[float] = mapped_column(
+        Computed(
+            'CASE WHEN rating_count = 0 THEN 0 '
+            'ELSE CAST(rating_sum AS DOUBLE PRECISION) / rating_count END',
+            persisted=True,
+        ),
+    )
@@ -0,0 +1,107 @@
+"""Write-behind buffer for recipe ratings.
+
+Rates are kept in memory of the process, coalesced per (user, recipe)
+so only the last one is written, and flushed by ``rate_recipes`` when
+buffer reaches its size limit, every flush interval and on shutdown.
+Rates accepted by a process which is killed before flush, as well as
+rates of a failed flush, are lost, so the buffer is used only with
+``RATING_WRITE_BEHIND`` setting. When rates come faster than they are
+written and buffer grows to twice its size limit, ``add`` waits for the
+running flush.
+"""
+import asyncio
+import logging
+from uuid import UUID
+
+from app import metrics
+from app.config import settings
+from app.crud import recipe as recipe_crud
+from app.database.tools import async_session
+
+
+logger = logging.getLogger(__name__)
+
+
+class RatingBuffer:
+    def __init__(self, max_size: int, flush_interval: float) -> None:
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending: dict[tuple[UUID, int], int] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self.flushed = 0
+        self.failures = 0
+
+    def _start_flush(self) -> asyncio.Task:
+        task = asyncio.create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+        return task
+
+    async def add(self, user_id: UUID, recipe_id: int, rate: int):
+        self._pending[(user_id, recipe_id)] = rate
+        while len(self._pending) >= self.max_size:
+            if not self._flushes:
+                self._start_flush()
+            if len(self._pending) < 2 * self.max_size:
+                break
+            # Unlike gather, wait does not cancel the flush with the caller.
+            await asyncio.wait(self._flushes)
+
+    async def flush(self):
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                async with async_session() as session:
+                    await recipe_crud.rate_recipes(
+                        [
+                            (user, recipe, rate)
+                            for (user, recipe), rate in pending.items()
+                        ],
+                        session,
+                    )
+            except asyncio.CancelledError:
+                # Rates are upserted, so a batch written before cancellation
+                # is safe to write again. Newer rates of the same keys win.
+                self._pending = pending | self._pending
+                raise
+            except Exception:
+                # Batch is dropped: retrying it would block all later rates
+                # if one of them can never be written (e.g. of deleted user).
+                self.failures += 1
+                logger.exception('Failed to flush %d rates', len(pending))
+            else:
+                self.flushed += len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded, so stop cancels only the sleep, not a running flush.
+            await asyncio.shield(self._start_flush())
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.gather(*self._flushes)
+        await self.flush()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'flushed': self.flushed,
+            'failures': self.failures,
+        }
+
+
+rating_buffer = RatingBuffer(
+    settings.RATING_BUFFER_MAX_SIZE,
+    settings.RATING_BUFFER_FLUSH_INTERVAL,
+)
+metrics.register('rating_buffer', rating_buffer.stats)
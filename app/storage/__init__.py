@@ -0,0 +1,25 @@
+from .base import ObjectInfo, Storage
+from .local import LocalStorage, get_file_info
+from .s3 import S3Storage
+from app import metrics
+from app.config import settings
+
+
+def create_storage() -> Storage:
+    if settings.STORAGE_BACKEND == 's3':
+        return S3Storage(
+            settings.S3_ENDPOINT_URL,
+            settings.S3_BUCKET,
+            settings.S3_REGION,
+            settings.S3_ACCESS_KEY_ID,
+            settings.S3_SECRET_ACCESS_KEY,
+            prefix=settings.S3_PREFIX,
+            part_size=settings.S3_PART_SIZE,
+            max_connections=settings.S3_MAX_CONNECTIONS,
+            url_ttl=settings.S3_PRESIGNED_URL_TTL,
+        )
+    return LocalStorage()
+
+
+storage = create_storage()
+metrics.register('storage', storage.stats)
@@ -0,0 +1,111 @@
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncContextManager, AsyncIterator
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    size: int
+    modified: float
+    # Quoted, as sent in ETag header.
+    etag: str
+
+
+class OperationStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0,
+            'max_ms': self.max * 1000,
+        }
+
+
+class Storage(ABC):
+    """Store of image files addressed by locations kept in ``Image.path``.
+
+    Missing objects raise ``FileNotFoundError``. Every operation is
+    timed, ``stats`` reports latency per operation.
+    """
+
+    name: str
+
+    def __init__(self) -> None:
+        self._operations: dict[str, OperationStats] = {}
+
+    @asynccontextmanager
+    async def _timed(self, operation: str) -> AsyncIterator[None]:
+        stats = self._operations.setdefault(operation, OperationStats())
+        start = time.perf_counter()
+        try:
+            yield
+        except FileNotFoundError:
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.record(time.perf_counter() - start)
+
+    @abstractmethod
+    def get_location(self, name: str) -> str:
+        """Return location for new file of given name."""
+
+    def get_local_path(self, location: str) -> Path | None:
+        """Return path of object if it is a file of local file system."""
+        return None
+
+    @abstractmethod
+    async def exists(self, location: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def stat(self, location: str) -> ObjectInfo:
+        ...
+
+    @abstractmethod
+    async def put_file(self, location: str, path: Path):
+        """Store local file at location, file may be moved there."""
+
+    @abstractmethod
+    async def delete(self, location: str):
+        """Delete object, missing one is ignored."""
+
+    @abstractmethod
+    def open(self, location: str, start: int, stop: int) -> AsyncIterator[bytes]:
+        """Stream ``[start, stop)`` bytes of object."""
+
+    @abstractmethod
+    def fetch(self, location: str) -> AsyncContextManager[Path]:
+        """Provide local file with content of object, e.g. for Pillow."""
+
+    @property
+    def serves_urls(self) -> bool:
+        """Whether ``get_url`` returns URLs, which are not checked to exist."""
+        return False
+
+    async def get_url(self, location: str) -> str | None:
+        """Return URL clients can download object from directly."""
+        return None
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        return {'backend': self.name} | {
+            operation: stats.stats() for operation, stats in self._operations.items()
+        }
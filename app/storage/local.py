@@ -0,0 +1,71 @@
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+
+import aiofiles
+import aiofiles.os
+
+from .base import ObjectInfo, Storage
+from app.config import settings
+from app.util import get_media_path
+
+
+def get_file_info(stat_result: os.stat_result) -> ObjectInfo:
+    return ObjectInfo(
+        size=stat_result.st_size,
+        modified=stat_result.st_mtime,
+        etag=f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"',
+    )
+
+
+class LocalStorage(Storage):
+    """Files of ``MEDIA_PATH``, locations are their paths."""
+
+    name = 'local'
+
+    def get_location(self, name: str) -> str:
+        return get_media_path(name).as_posix()
+
+    def get_local_path(self, location: str) -> Path:
+        return Path(location)
+
+    async def exists(self, location: str) -> bool:
+        async with self._timed('exists'):
+            return await aiofiles.os.path.exists(location)
+
+    async def stat(self, location: str) -> ObjectInfo:
+        async with self._timed('stat'):
+            return get_file_info(await aiofiles.os.stat(location))
+
+    async def put_file(self, location: str, path: Path):
+        async with self._timed('put'):
+            await aiofiles.os.makedirs(Path(location).parent, exist_ok=True)
+            await aiofiles.os.replace(path, location)
+
+    async def delete(self, location: str):
+        async with self._timed('delete'):
+            try:
+                await aiofiles.os.remove(location)
+            except FileNotFoundError:
+                pass
+
+    async def open(self, location: str, start: int, stop: int) -> AsyncIterator[bytes]:
+        async with self._timed('open'):
+            file = await aiofiles.open(location, 'rb')
+        try:
+            await file.seek(start)
+            remaining = stop - start
+            while remaining and (
+                chunk := await file.read(
+                    min(settings.IMAGE_UPLOAD_CHUNK_SIZE, remaining)
+                )
+            ):
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await file.close()
+
+    @asynccontextmanager
+    async def fetch(self, location: str) -> AsyncIterator[Path]:
+        yield Path(location)
@@ -0,0 +1,334 @@
+"""S3-compatible object storage over a pool of HTTP connections.
+
+Requests are signed with AWS Signature Version 4 and use path-style
+URLs, which AWS S3, MinIO, Ceph and other compatible servers accept.
+"""
+import hashlib
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from mimetypes import guess_type
+from pathlib import Path
+from typing import AsyncIterator
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import aiofiles
+import aiofiles.os
+import httpx
+
+from .base import ObjectInfo, Storage
+from app.config import settings
+from app.exception import StorageError
+from app.util import get_media_path, get_media_temp_path
+
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+
+
+def _quote(value: str, safe: str = '-_.~') -> str:
+    return quote(value, safe=safe)
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+class S3Storage(Storage):
+    """Objects of S3 bucket, locations are their keys.
+
+    Files larger than ``part_size`` are uploaded by parts of that size
+    read from disk one by one, downloads are streamed. Path of endpoint
+    URL, e.g. of server behind a proxy, is prepended to object paths.
+    """
+
+    name = 's3'
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        region: str,
+        access_key_id: str,
+        secret_access_key: str,
+        prefix: str = '',
+        part_size: int = 8 * 1024 * 1024,
+        max_connections: int = 32,
+        url_ttl: int = 0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        super().__init__()
+        endpoint = urlsplit(endpoint_url)
+        self.endpoint_url = f'{endpoint.scheme}://{endpoint.netloc}'
+        self._base_path = endpoint.path.rstrip('/')
+        self.bucket = bucket
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.prefix = prefix
+        self.part_size = part_size
+        self.url_ttl = url_ttl
+        self._host = endpoint.netloc
+        self._client = httpx.AsyncClient(
+            base_url=self.endpoint_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(30),
+            transport=transport,
+        )
+
+    def _path(self, key: str) -> str:
+        return _quote(f'{self._base_path}/{self.bucket}/{key}', safe='/-_.~')
+
+    def _scope(self, amz_date: str) -> str:
+        return f'{amz_date[:8]}/{self.region}/s3/aws4_request'
+
+    def _signature(
+        self,
+        amz_date: str,
+        method: str,
+        path: str,
+        query: str,
+        headers: dict[str, str],
+        payload_hash: str,
+    ) -> str:
+        canonical_request = '\n'.join(
+            (
+                method,
+                path,
+                query,
+                ''.join(
+                    f'{name}:{headers[name].strip()}\n' for name in sorted(headers)
+                ),
+                ';'.join(sorted(headers)),
+                payload_hash,
+            )
+        )
+        string_to_sign = '\n'.join(
+            (
+                ALGORITHM,
+                amz_date,
+                self._scope(amz_date),
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            )
+        )
+        key = ('AWS4' + self.secret_access_key).encode()
+        for part in (amz_date[:8], self.region, 's3', 'aws4_request'):
+            key = _hmac(key, part)
+        return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        content: bytes = b'',
+        stream: bool = False,
+    ) -> httpx.Response:
+        amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        payload_hash = hashlib.sha256(content).hexdigest()
+        headers = {name.lower(): value for name, value in (headers or {}).items()} | {
+            'host': self._host,
+            'x-amz-date': amz_date,
+            'x-amz-content-sha256': payload_hash,
+        }
+        path = self._path(key)
+        canonical_query = '&'.join(
+            f'{_quote(name)}={_quote(value)}'
+            for name, value in sorted((query or {}).items())
+        )
+        signature = self._signature(
+            amz_date, method, path, canonical_query, headers, payload_hash
+        )
+        headers['authorization'] = (
+            f'{ALGORITHM} Credential={self.access_key_id}/{self._scope(amz_date)}, '
+            f'SignedHeaders={";".join(sorted(headers))}, Signature={signature}'
+        )
+        request = self._client.build_request(
+            method,
+            f'{path}?{canonical_query}' if canonical_query else path,
+            headers=headers,
+            content=content or None,
+        )
+        return await self._client.send(request, stream=stream)
+
+    @staticmethod
+    async def _check(response: httpx.Response):
+        if response.is_success:
+            return
+        await response.aread()
+        raise StorageError(
+            f'S3 {response.request.method} {response.request.url.path} failed '
+            f'with {response.status_code}: {response.text[:200]}'
+        )
+
+    def get_location(self, name: str) -> str:
+        path = get_media_path(name).relative_to(settings.MEDIA_PATH)
+        return self.prefix + path.as_posix()
+
+    async def exists(self, location: str) -> bool:
+        async with self._timed('exists'):
+            response = await self._request('HEAD', location)
+            if response.status_code == 404:
+                return False
+            await self._check(response)
+            return True
+
+    async def stat(self, location: str) -> ObjectInfo:
+        async with self._timed('stat'):
+            response = await self._request('HEAD', location)
+            if response.status_code == 404:
+                raise FileNotFoundError(location)
+            await self._check(response)
+            return ObjectInfo(
+                size=int(response.headers['content-length']),
+                modified=parsedate_to_datetime(
+                    response.headers['last-modified']
+                ).timestamp(),
+                etag=response.headers['etag'],
+            )
+
+    async def _put_parts(self, location: str, path: Path, content_type: str):
+        response = await self._request(
+            'POST',
+            location,
+            query={'uploads': ''},
+            headers={'content-type': content_type},
+        )
+        await self._check(response)
+        upload_id = ElementTree.fromstring(response.content).findtext('{*}UploadId')
+        if upload_id is None:
+            raise StorageError(f'S3 did not start upload of {location}')
+        parts: list[str] = []
+        try:
+            async with aiofiles.open(path, 'rb') as file:
+                while chunk := await file.read(self.part_size):
+                    query = {'partNumber': str(len(parts) + 1), 'uploadId': upload_id}
+                    response = await self._request(
+                        'PUT', location, query=query, content=chunk
+                    )
+                    await self._check(response)
+                    parts.append(response.headers['etag'])
+            body = ''.join(
+                f'<Part><PartNumber>{number}</PartNumber>'
+                f'<ETag>{escape(etag)}</ETag></Part>'
+                for number, etag in enumerate(parts, 1)
+            )
+            response = await self._request(
+                'POST',
+                location,
+                query={'uploadId': upload_id},
+                content=(
+                    f'<CompleteMultipartUpload>{body}</CompleteMultipartUpload>'
+                ).encode(),
+            )
+            await self._check(response)
+            # Completion may fail after 200 status was sent.
+            if ElementTree.fromstring(response.content).tag.endswith('Error'):
+                raise StorageError(f'S3 failed to complete upload of {location}')
+        except BaseException:
+            try:
+                response = await self._request(
+                    'DELETE', location, query={'uploadId': upload_id}
+                )
+                await self._check(response)
+            except BaseException:
+                # Failed abort must not hide why the upload failed, S3
+                # lifecycle rules remove parts of abandoned uploads.
+                logger.exception('Failed to abort upload of %s', location)
+            raise
+
+    async def put_file(self, location: str, path: Path):
+        content_type = guess_type(location)[0] or 'application/octet-stream'
+        async with self._timed('put'):
+            if (await aiofiles.os.stat(path)).st_size > self.part_size:
+                await self._put_parts(location, path, content_type)
+                return
+            async with aiofiles.open(path, 'rb') as file:
+                content = await file.read()
+            response = await self._request(
+                'PUT',
+                location,
+                headers={'content-type': content_type},
+                content=content,
+            )
+            await self._check(response)
+
+    async def delete(self, location: str):
+        async with self._timed('delete'):
+            response = await self._request('DELETE', location)
+            if response.status_code != 404:
+                await self._check(response)
+
+    async def open(self, location: str, start: int, stop: int) -> AsyncIterator[bytes]:
+        if start == stop:
+            return
+        async with self._timed('open'):
+            response = await self._request(
+                'GET',
+                location,
+                headers={'range': f'bytes={start}-{stop - 1}'},
+                stream=True,
+            )
+            if response.status_code == 404:
+                await response.aclose()
+                raise FileNotFoundError(location)
+            await self._check(response)
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    @asynccontextmanager
+    async def fetch(self, location: str) -> AsyncIterator[Path]:
+        path = get_media_temp_path()
+        try:
+            info = await self.stat(location)
+            async with aiofiles.open(path, 'wb') as file:
+                async for chunk in self.open(location, 0, info.size):
+                    await file.write(chunk)
+            yield path
+        finally:
+            path.unlink(missing_ok=True)
+
+    @property
+    def serves_urls(self) -> bool:
+        return bool(self.url_ttl)
+
+    async def get_url(self, location: str) -> str | None:
+        """Return presigned URL valid for ``url_ttl`` seconds, if it is set."""
+        if not self.url_ttl:
+            return None
+        amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = self._path(location)
+        query = '&'.join(
+            f'{_quote(name)}={_quote(value)}'
+            for name, value in sorted(
+                {
+                    'X-Amz-Algorithm': ALGORITHM,
+                    'X-Amz-Credential': (
+                        f'{self.access_key_id}/{self._scope(amz_date)}'
+                    ),
+                    'X-Amz-Date': amz_date,
+                    'X-Amz-Expires': str(self.url_ttl),
+                    'X-Amz-SignedHeaders': 'host',
+                }.items()
+            )
+        )
+        signature = self._signature(
+            amz_date, 'GET', path, query, {'host': self._host}, UNSIGNED_PAYLOAD
+        )
+        return f'{self.endpoint_url}{path}?{query}&X-Amz-Signature={signature}'
+
+    async def close(self):
+        await self._client.aclose()
@@ -1,36 +1,202 @@
+import base64
+import hashlib
 import io
 from pathlib import Path
-from random import choice, randint
-from uuid import UUID
+from random import Random
+from typing import Any, NamedTuple, Protocol
+from uuid import uuid4
 
 import aiofiles
-from PIL import Image
+from PIL import ExifTags, Image, ImageOps
 
 from app.config import settings
 
 
-async def save_image_to_media(
-    image_id: UUID,
-    inmemory_image: io.BytesIO,
-    img_format: str | None = None,
-) -> Path:
-    print(settings)
-    frmt = img_format if img_format is not None else 'JPEG'
-    path = settings.MEDIA_PATH / f'{image_id.hex}.{frmt}'
+def get_media_temp_path() -> Path:
+    """Return path for file which is renamed to its final name once valid.
+
+    Temporary files live in media directory, so renaming is atomic.
+    """
+    return settings.MEDIA_PATH / f'.upload-{uuid4().hex}.tmp'
+
+
+# Leading bytes of image formats, as pairs of offset and expected bytes.
+IMAGE_SIGNATURES: dict[str, list[tuple[tuple[int, bytes], ...]]] = {
+    'jpeg': [((0, b'\xff\xd8\xff'),)],
+    'png': [((0, b'\x89PNG\r\n\x1a\n'),)],
+    'gif': [((0, b'GIF87a'),), ((0, b'GIF89a'),)],
+    'webp': [((0, b'RIFF'), (8, b'WEBP'))],
+    'bmp': [((0, b'BM'),)],
+    'tiff': [((0, b'II*\x00'),), ((0, b'MM\x00*'),)],
+}
+IMAGE_SIGNATURE_SIZE = 12
+
+
+class Readable(Protocol):
+    async def read(self, size: int) -> bytes:
+        ...
+
+
+def get_media_path(name: str) -> Path:
+    """Return path of media file in the current layout.
+
+    Files are put in ``MEDIA_SHARD_LEVELS`` nested directories named
+    after successive ``MEDIA_SHARD_WIDTH`` characters of their names,
+    which are hex digests or UUIDs, so no directory grows too large.
+    """
+    width = settings.MEDIA_SHARD_WIDTH
+    shards = (
+        name[i * width : (i + 1) * width] for i in range(settings.MEDIA_SHARD_LEVELS)
+    )
+    return settings.MEDIA_PATH.joinpath(*shards, name)
+
+
+def get_blob_path(digest: str, img_format: str) -> Path:
+    """Return content-addressed path of image with given SHA-256 digest."""
+    return get_media_path(f'{digest}.{img_format}')
+
+
+async def save_upload(
+    file: Readable,
+    path: Path,
+    max_size: int,
+) -> tuple[int, str] | None:
+    """Copy upload to path in large chunks, hashing it on the way.
+
+    Return size and SHA-256 hex digest of written file or ``None`` when
+    upload exceeds ``max_size``, in which case copying stops at the first
+    chunk over it.
+    """
+    size = 0
+    digest = hashlib.sha256()
     async with aiofiles.open(path, 'wb') as stored_file:
-        await stored_file.write(inmemory_image.getvalue())
-    return path
+        while chunk := await file.read(settings.IMAGE_UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                return None
+            digest.update(chunk)
+            await stored_file.write(chunk)
+    return size, digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Return SHA-256 hex digest of file, reading it in upload-sized chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(settings.IMAGE_UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sniff_image_format(head: bytes, formats: list[str]) -> str | None:
+    """Return which of formats has signature head starts with.
+
+    Head should have ``IMAGE_SIGNATURE_SIZE`` bytes, unless file is
+    shorter. Only signatures are checked, so image may still be invalid.
+    """
+    for img_format in formats:
+        for signature in IMAGE_SIGNATURES.get(img_format, []):
+            if all(
+                head[offset : offset + len(magic)] == magic
+                for offset, magic in signature
+            ):
+                return img_format
+    return None
+
+
+class ImageMetadata(NamedTuple):
+    format: str
+    # As displayed, after rotation by EXIF orientation.
+    width: int
+    height: int
+    placeholder: str
+
+
+def inspect_image(
+    path: Path,
+    max_pixels: int,
+    placeholder_size: int,
+) -> ImageMetadata | None:
+    """Return metadata of image stored at path, ``None`` if it is not valid.
+
+    Image with more than ``max_pixels`` pixels is not valid, its size is
+    read from header, so decompression bombs are never decoded. Image
+    is decoded once, downscaled by JPEG decoder where possible, to make
+    placeholder fitting into ``placeholder_size`` square.
+    """
+    try:
+        with Image.open(path) as img:
+            if img.width * img.height > max_pixels:
+                return None
+            img.verify()
+        with Image.open(path) as img:
+            img_format = img.format or ''
+            width, height = img.size
+            # Orientations which swap sides.
+            if img.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+                width, height = height, width
+            img.draft('RGB', (placeholder_size, placeholder_size))
+            img.thumbnail((placeholder_size, placeholder_size))
+            thumbnail = ImageOps.exif_transpose(img).convert('RGB')
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        return None
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format='jpeg', quality=50)
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode('ascii')
+    return ImageMetadata(img_format, width, height, placeholder)
+
+
+def is_format_supported(img_format: str) -> bool:
+    """Check if installed Pillow can save images in format."""
+    Image.init()
+    return img_format.upper() in Image.SAVE
+
+
+def resize_image(
+    source: Path,
+    target: Path,
+    width: int | None,
+    height: int | None,
+    fit: str,
+    img_format: str | None = None,
+    quality: int | None = None,
+):
+    """Save source image fitted into width x height box to target.
+
+    ``contain`` keeps the whole image and its proportions, missing sides
+    of the box are not limited, and never upscales. ``cover`` with both
+    sides given crops image to fill the box exactly. Image is saved in
+    ``img_format`` with ``quality`` if format is given, in source format
+    otherwise.
+    """
+    with Image.open(source) as img:
+        options: dict[str, Any] = {}
+        if img_format is None:
+            img_format = img.format
+        elif quality is not None:
+            options['quality'] = quality
+        if fit == 'cover' and width and height:
+            resized = ImageOps.fit(img, (width, height))
+        else:
+            # In place, so JPEG is decoded already downscaled.
+            img.thumbnail((width or img.width, height or img.height))
+            resized = img
+        if img_format != img.format and resized.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in resized.mode or 'transparency' in resized.info
+            resized = resized.convert('RGBA' if has_alpha else 'RGB')
+        resized.save(target, format=img_format, **options)
+
 
+def generate_image(rng: Random | None = None) -> Image.Image:
+    """Return RGB image of random noise and proportions for test data.
 
-def generate_image():
-    proportion = choice([(1, 2), (3, 4), (1, 1), (4, 3), (2, 1)])
-    width = randint(380, 640)
+    Pixels are made of one bulk of random bytes. Pass ``Random`` with a
+    fixed seed to get the same sequence of images on every run.
+    """
+    rng = rng or Random()
+    proportion = rng.choice([(1, 2), (3, 4), (1, 1), (4, 3), (2, 1)])
+    width = rng.randint(380, 640)
     height = int(width / proportion[0] * proportion[1])
-    img = Image.new('RGB', (width, height), color=(255, 255, 255))
-    for x in range(width):
-        for y in range(height):
-            r = randint(0, 255)
-            g = randint(0, 255)
-            b = randint(0, 255)
-            img.putpixel((x, y), value=(r, g, b))
-    return img
+    return Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
@@ -0,0 +1,79 @@
+"""Bounded executor for CPU-bound work which must not block event loop.
+
+Pool accepts at most ``workers + queue_size`` tasks at a time, the
+next ones fail with ``WorkerPoolBusyError`` instead of waiting, so a
+burst of uploads cannot pile up unbounded work and memory.
+"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Literal, TypeVar
+
+from app import metrics
+from app.config import settings
+from app.exception import WorkerPoolBusyError
+
+
+T = TypeVar('T')
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        kind: Literal['thread', 'process'],
+        workers: int,
+        queue_size: int,
+    ) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor: Executor | None = None
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = (
+                ProcessPoolExecutor if self.kind == 'process' else ThreadPoolExecutor
+            )
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Run picklable ``func`` in pool, fail if pool is saturated."""
+        if self.active >= self.capacity:
+            self.rejected += 1
+            raise WorkerPoolBusyError('Image processing queue is full.')
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                func,
+                *args,
+            )
+        finally:
+            self.active -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'workers': self.workers,
+            'capacity': self.capacity,
+            'active': self.active,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+
+image_pool = WorkerPool(
+    settings.IMAGE_POOL_KIND,
+    settings.IMAGE_POOL_WORKERS,
+    settings.IMAGE_POOL_QUEUE_SIZE,
+)
+metrics.register('image_pool', image_pool.stats)
@@ -0,0 +1,85 @@
+"""Synthetic image generation: per-pixel putpixel vs one bulk of bytes.
+
+Usage:
+    python -m benchmarks.image_generation [--images 20] [--seed 0]
+
+``putpixel`` is how ``app.util.generate_image`` filled images before,
+with three ``randint`` calls per pixel, ``frombytes`` is how it fills
+them now. The two draw different amounts of random numbers per image,
+so image sizes are picked up front from their own seeded ``Random``,
+and both generators fill the same sizes from a separate one. Pixels
+per second are reported too. No database is needed.
+"""
+import argparse
+import time
+from random import Random
+from typing import Callable
+
+from PIL import Image
+
+from .tools import report
+
+
+def generate_image_putpixel(size: tuple[int, int], rng: Random) -> Image.Image:
+    width, height = size
+    img = Image.new('RGB', (width, height), color=(255, 255, 255))
+    for x in range(width):
+        for y in range(height):
+            r = rng.randint(0, 255)
+            g = rng.randint(0, 255)
+            b = rng.randint(0, 255)
+            img.putpixel((x, y), value=(r, g, b))
+    return img
+
+
+def generate_image_frombytes(size: tuple[int, int], rng: Random) -> Image.Image:
+    width, height = size
+    return Image.frombytes('RGB', size, rng.randbytes(width * height * 3))
+
+
+def get_sizes(images: int, seed: int) -> list[tuple[int, int]]:
+    """Return sizes drawn the same way ``app.util.generate_image`` does."""
+    rng = Random(seed)
+    sizes = []
+    for _ in range(images):
+        proportion = rng.choice([(1, 2), (3, 4), (1, 1), (4, 3), (2, 1)])
+        width = rng.randint(380, 640)
+        sizes.append((width, int(width / proportion[0] * proportion[1])))
+    return sizes
+
+
+def measure(
+    generate: Callable[[tuple[int, int], Random], Image.Image],
+    sizes: list[tuple[int, int]],
+    seed: int,
+) -> list[float]:
+    rng = Random(seed)
+    timings = []
+    for size in sizes:
+        start = time.perf_counter()
+        generate(size, rng)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(images: int, seed: int):
+    sizes = get_sizes(images, seed)
+    pixels = sum(width * height for width, height in sizes)
+    for title, generate in (
+        ('putpixel', generate_image_putpixel),
+        ('frombytes', generate_image_frombytes),
+    ):
+        timings = measure(generate, sizes, seed)
+        report(f'generate image [{title}]', timings)
+        print(
+            f'{title}: {images / sum(timings):.1f} images/s, '
+            f'{pixels / sum(timings) / 1e6:.2f} Mpixels/s'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.images, args.seed)
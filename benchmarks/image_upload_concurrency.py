@@ -0,0 +1,143 @@
+"""GET latency while uploads are validated: event loop vs worker pool.
+
+Usage:
+    python -m benchmarks.image_upload_concurrency [--uploads 16] [--work decode]
+
+Uploads of ``--size`` MiB PNG files run through ``get_uploaded_images``,
+which inspects them with ``inspect_image`` (``--work verify`` only
+verifies images, ``--work decode`` decodes them in full size instead)
+while GET /api/v1/metrics is requested every 5 ms on the same event
+loop. ``inline`` mode validates images directly in the loop, as it was
+done before the pool. No database is needed.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator
+from unittest import mock
+
+import aiofiles
+from httpx import AsyncClient
+from PIL import Image
+
+from .tools import report
+from app.api.image.dependency import get_uploaded_images
+from app.api.image.multipart import MultipartReader
+from app.config import settings
+from app.main import app
+from app.util import ImageMetadata, inspect_image
+from app.worker_pool import image_pool, WorkerPool
+
+
+BOUNDARY = 'benchmark-boundary'
+
+
+def verify_image(path: Path, *args) -> ImageMetadata | None:
+    """Validate image without decoding it, as it was done before metadata."""
+    with Image.open(path) as img:
+        img.verify()
+        return ImageMetadata(img.format or '', img.width, img.height, '')
+
+
+def decode_image(path: Path, *args) -> ImageMetadata | None:
+    """Validate image by decoding all pixels, like resizing would do."""
+    with Image.open(path) as img:
+        img.load()
+        return ImageMetadata(img.format or '', img.width, img.height, '')
+
+
+WORK = {'inspect': inspect_image, 'verify': verify_image, 'decode': decode_image}
+
+
+async def run_inline(func, *args):
+    return func(*args)
+
+
+async def stream_upload(path: Path) -> AsyncIterator[bytes]:
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; '
+        f'filename="{path.name}"\r\n\r\n'
+    ).encode()
+    async with aiofiles.open(path, 'rb') as file:
+        while chunk := await file.read(64 * 1024):
+            yield chunk
+    yield f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+async def upload(path: Path):
+    reader = MultipartReader(
+        f'multipart/form-data; boundary={BOUNDARY}', stream_upload(path)
+    )
+    uploads = get_uploaded_images(reader)
+    await anext(uploads)
+    await uploads.aclose()
+
+
+async def measure_get_latency(aclient: AsyncClient, done: asyncio.Event) -> list[float]:
+    # Requests are due every 5 ms and latency is counted from the moment
+    # request was due, so time the loop was blocked before sending it is
+    # not hidden.
+    timings = []
+    due = time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        await aclient.get('/api/v1/metrics')
+        timings.append(time.perf_counter() - due)
+        due = max(due + 0.005, time.perf_counter())
+    return timings
+
+
+async def run_mode(
+    mode: str,
+    source: Path,
+    uploads: int,
+    work: str,
+) -> list[float]:
+    pool = WorkerPool(
+        'process' if mode == 'process' else 'thread',
+        settings.IMAGE_POOL_WORKERS,
+        uploads,
+    )
+    run = run_inline if mode == 'inline' else pool.run
+    async with AsyncClient(app=app, base_url='http://bench') as aclient:
+        with (
+            mock.patch.object(image_pool, 'run', run),
+            mock.patch(
+                'app.api.image.dependency.inspect_image',
+                WORK[work],
+            ),
+        ):
+            done = asyncio.Event()
+            latency = asyncio.create_task(measure_get_latency(aclient, done))
+            await asyncio.gather(*(upload(source) for _ in range(uploads)))
+            done.set()
+            timings = await latency
+    pool.shutdown()
+    return timings
+
+
+async def main(uploads: int, size: int, work: str):
+    with tempfile.TemporaryDirectory() as directory:
+        source = Path(directory) / 'source.png'
+        side = int((size * 1024 * 1024 / 3) ** 0.5)
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+            source, format='png', compress_level=0
+        )
+        media_path = Path(directory) / 'media'
+        media_path.mkdir()
+        with mock.patch.object(settings, 'MEDIA_PATH', media_path):
+            for mode in ('inline', 'thread', 'process'):
+                timings = await run_mode(mode, source, uploads, work)
+                report(f'GET during {uploads} uploads [{work}, {mode}]', timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--uploads', type=int, default=16)
+    parser.add_argument('--size', type=int, default=8, help='MiB per upload')
+    parser.add_argument('--work', choices=list(WORK), default='inspect')
+    args = parser.parse_args()
+    asyncio.run(main(args.uploads, args.size, args.work))
@@ -0,0 +1,64 @@
+"""Size and encode cost of WebP/AVIF variants of JPEG/PNG originals.
+
+Usage:
+    python -m benchmarks.image_variants [--images 10]
+
+Corpus is made by ``app.util.generate_image`` and saved as JPEG and
+PNG originals. Variants are encoded by ``resize_image`` as the image
+endpoint does, with ``IMAGE_VARIANT_QUALITY``. Generated images are
+random noise, the worst case for every codec, so savings on photos are
+larger. No database is needed.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from .tools import report
+from app.config import settings
+from app.util import generate_image, is_format_supported, resize_image
+
+
+def main(images: int):
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory)
+        corpus = [generate_image() for _ in range(images)]
+        for source_format in ('jpeg', 'png'):
+            sources = []
+            for i, image in enumerate(corpus):
+                sources.append(path / f'{i}.{source_format}')
+                image.save(sources[-1], format=source_format)
+            source_size = sum(source.stat().st_size for source in sources)
+            for img_format in settings.IMAGE_VARIANT_FORMATS:
+                if not is_format_supported(img_format):
+                    print(f'{source_format} -> {img_format}: not supported by Pillow')
+                    continue
+                timings = []
+                variant_size = 0
+                for source in sources:
+                    target = source.with_suffix(f'.variant.{img_format}')
+                    start = time.perf_counter()
+                    resize_image(
+                        source,
+                        target,
+                        None,
+                        None,
+                        'contain',
+                        img_format,
+                        settings.IMAGE_VARIANT_QUALITY,
+                    )
+                    timings.append(time.perf_counter() - start)
+                    variant_size += target.stat().st_size
+                report(f'{source_format} -> {img_format} encode', timings)
+                print(
+                    f'{source_format} -> {img_format}: '
+                    f'{source_size / 1024:.0f} KiB -> {variant_size / 1024:.0f} KiB, '
+                    f'{(1 - variant_size / source_size) * 100:.1f}% saved'
+                )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=10)
+    args = parser.parse_args()
+    main(args.images)
@@ -0,0 +1,51 @@
+"""Ingredient filter: SQL GROUP BY/HAVING vs in-process posting lists.
+
+Usage:
+    python -m benchmarks.ingredient_index [--recipes 100000]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from .recipe_stats import populate
+from .tools import measure, prepare_database, report
+from app.crud import recipe as crud
+from app.ingredient_index import ingredient_index
+
+
+async def main(recipes: int, repeat: int):
+    engine = await prepare_database()
+    print(f'Populating {recipes} recipes...')
+    await populate(engine, recipes, 1)
+    async_session = sessionmaker(engine, class_=AsyncSession)  # type: ignore
+    async with async_session() as session:
+        await crud.build_ingredient_index(session)
+        memory = ingredient_index.memory_usage()
+        print(
+            f'index: {len(ingredient_index._postings)} ingredients, '
+            f'{memory / 1024:.1f} KiB, {memory / recipes:.2f} bytes per recipe'
+        )
+        for names in ({'ingredient 1'}, {'ingredient 1', 'ingredient 2'}):
+
+            async def run():
+                query = crud.get_recipe_list_query(
+                    ingredient_names=names,
+                    order='duration',
+                )
+                await session.execute(query.limit(50))
+
+            report(f'{len(names)} ingredient(s) [index]', await measure(run, repeat))
+            ingredient_index.ready = False
+            report(f'{len(names)} ingredient(s) [sql]', await measure(run, repeat))
+            ingredient_index.ready = True
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.recipes, args.repeat))
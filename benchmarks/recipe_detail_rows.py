@@ -0,0 +1,98 @@
+"""Recipe detail: joinedload of both collections vs selectinload.
+
+Usage:
+    python -m benchmarks.recipe_detail_rows [--ingredients 20] [--steps 15]
+
+Reports how many rows the database returns to load one recipe and
+how long loading takes.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from .tools import measure, prepare_database, report
+from app.crud import recipe as crud
+from app.model.recipe import Recipe, RecipeIngredientAssociation
+
+
+def legacy_recipe_query():
+    return (
+        select(Recipe)
+        .options(
+            joinedload(Recipe.ingredients).joinedload(
+                RecipeIngredientAssociation.ingredient
+            )
+        )
+        .options(joinedload(Recipe.steps))
+    )
+
+
+async def populate(engine, recipes: int, ingredients: int, steps: int):
+    statements = [
+        "INSERT INTO image (id, path) VALUES (gen_random_uuid(), 'bench.jpeg')",
+        f"""
+        INSERT INTO recipe (name, description, image_id)
+        SELECT 'recipe ' || i, 'description', (SELECT id FROM image)
+        FROM generate_series(1, {recipes}) AS i
+        """,
+        f"""
+        INSERT INTO step (recipe_id, "order", description, duration, image_id)
+        SELECT recipe.id, s, repeat('step ', 40), make_interval(mins => s),
+               recipe.image_id
+        FROM recipe, generate_series(1, {steps}) AS s
+        """,
+        f"""
+        INSERT INTO ingredient (name)
+        SELECT 'ingredient ' || i FROM generate_series(1, {ingredients}) AS i
+        """,
+        """
+        INSERT INTO recipe_ingredient_association (recipe_id, ingredient_id)
+        SELECT recipe.id, ingredient.id FROM recipe, ingredient
+        """,
+    ]
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement))
+        await conn.execute(text('ANALYZE'))
+
+
+async def main(recipes: int, ingredients: int, steps: int, repeat: int):
+    engine = await prepare_database()
+    print(f'Populating {recipes} recipes, {ingredients} ingredients, {steps} steps...')
+    await populate(engine, recipes, ingredients, steps)
+    rows = []
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def count_rows(conn, cursor, statement, parameters, context, executemany):
+        rows.append(cursor.rowcount)
+
+    async_session = sessionmaker(engine, class_=AsyncSession)  # type: ignore
+    recipe_id = recipes // 2
+    for name, query in (
+        ('joinedload', legacy_recipe_query()),
+        ('selectinload', crud._get_recipe_query()),
+    ):
+
+        async def run():
+            async with async_session() as session:
+                result = await session.execute(query.filter_by(id=recipe_id))
+                result.unique().scalar_one()
+
+        rows.clear()
+        await run()
+        print(f'{name}: {len(rows)} queries, {sum(rows)} rows {rows}')
+        report(f'recipe detail [{name}]', await measure(run, repeat))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=1_000)
+    parser.add_argument('--ingredients', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.recipes, args.ingredients, args.steps, args.repeat))
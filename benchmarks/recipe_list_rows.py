@@ -0,0 +1,124 @@
+"""Recipe list page: single joined query vs ids page + ingredients query.
+
+Usage:
+    python -m benchmarks.recipe_list_rows [--recipes 10000] [--size 50]
+
+Reports how many rows and text bytes the database sends for one page
+and how many complete recipes that page contains.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager, sessionmaker
+
+from .recipe_stats import populate
+from .tools import measure, prepare_database, report
+from app.crud import recipe as crud
+from app.model.recipe import (
+    Ingredient,
+    Recipe,
+    RecipeIngredientAssociation,
+    RecipeStats,
+)
+
+
+def legacy_joined_list_query():
+    return (
+        select(
+            Recipe.id,
+            Recipe.name,
+            Recipe.description,
+            RecipeStats.total_duration,
+            RecipeStats.rating,
+            Ingredient.name,
+        )
+        .join(RecipeStats)
+        .join(Recipe.ingredients)
+        .join(RecipeIngredientAssociation.ingredient)
+        .order_by(RecipeStats.total_duration, RecipeStats.recipe_id)
+    )
+
+
+def legacy_joined_entity_query():
+    return (
+        select(Recipe, RecipeStats.total_duration, RecipeStats.rating)
+        .join(RecipeStats)
+        .join(Recipe.ingredients)
+        .join(RecipeIngredientAssociation.ingredient)
+        .options(
+            contains_eager(Recipe.ingredients)
+            .contains_eager(RecipeIngredientAssociation.ingredient)
+            .load_only(Ingredient.name)
+        )
+        .order_by(RecipeStats.total_duration, RecipeStats.recipe_id)
+    )
+
+
+def text_bytes(rows) -> int:
+    return sum(len(value) for row in rows for value in row if isinstance(value, str))
+
+
+async def main(recipes: int, size: int, repeat: int):
+    engine = await prepare_database()
+    print(f'Populating {recipes} recipes...')
+    await populate(engine, recipes, 1)
+    async_session = sessionmaker(engine, class_=AsyncSession)  # type: ignore
+    async with async_session() as session:
+        joined = (await session.execute(legacy_joined_list_query().limit(size))).all()
+        print(
+            f'joined:    {len(joined)} rows, {text_bytes(joined)} text bytes, '
+            f'{len({row.id for row in joined})} recipes (last may be partial)'
+        )
+        page = (
+            await session.execute(
+                crud.get_recipe_list_query(order='duration').limit(size)
+            )
+        ).all()
+        ingredients = (
+            await session.execute(
+                select(RecipeIngredientAssociation.recipe_id, Ingredient.name)
+                .join(RecipeIngredientAssociation.ingredient)
+                .filter(RecipeIngredientAssociation.recipe_id.in_([r.id for r in page]))
+            )
+        ).all()
+        joined_full = (
+            await session.execute(
+                legacy_joined_list_query().filter(
+                    Recipe.id.in_([row.id for row in page])
+                )
+            )
+        ).all()
+        print(
+            f'two-phase: {len(page) + len(ingredients)} rows '
+            f'({len(page)} + {len(ingredients)}), '
+            f'{text_bytes(page) + text_bytes(ingredients)} text bytes, '
+            f'{len(page)} recipes'
+        )
+        print(
+            f'joined rows needed for the same {len(page)} recipes: '
+            f'{len(joined_full)} rows, {text_bytes(joined_full)} text bytes'
+        )
+
+        async def joined_page():
+            query = legacy_joined_entity_query().limit(size)
+            (await session.execute(query)).unique().all()
+
+        async def two_phase_page():
+            query = crud.get_recipe_list_query(order='duration').limit(size)
+            rows = (await session.execute(query)).all()
+            await crud.get_recipe_list_ingredients([row.id for row in rows], session)
+
+        report('joined page (ORM)', await measure(joined_page, repeat))
+        report('two-phase page', await measure(two_phase_page, repeat))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=10_000)
+    parser.add_argument('--size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.recipes, args.size, args.repeat))
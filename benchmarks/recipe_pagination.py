@@ -0,0 +1,77 @@
+"""Recipe list: deep OFFSET pages vs keyset cursor pages.
+
+Usage:
+    python -m benchmarks.recipe_pagination [--recipes 100000]
+"""
+import argparse
+import asyncio
+
+from fastapi_pagination import Params
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from .recipe_stats import populate
+from .tools import measure, prepare_database, report
+from app.api.recipe.pagination import decode_cursor, encode_cursor, get_row_key
+from app.crud import recipe as crud
+
+
+async def main(recipes: int, repeat: int, size: int):
+    engine = await prepare_database()
+    print(f'Populating {recipes} recipes...')
+    await populate(engine, recipes, 1)
+    async_session = sessionmaker(engine, class_=AsyncSession)  # type: ignore
+    order = '-duration'
+    async with async_session() as session:
+        for page in (1, recipes // size // 10, recipes // size // 2, recipes // size):
+            params = Params(page=page, size=size)
+            last = (
+                (
+                    await session.execute(
+                        crud.get_recipe_list_query(order=order).offset(
+                            (page - 1) * size - 1
+                        )
+                    )
+                ).first()
+                if page > 1
+                else None
+            )
+            after = (
+                None
+                if last is None
+                else decode_cursor(
+                    encode_cursor(order, get_row_key(last, order), last.id),
+                    order,
+                )
+            )
+
+            async def offset_page():
+                result = await paginate(
+                    session,
+                    crud.get_recipe_list_query(order=order),
+                    params,
+                )
+                await crud.get_recipe_list_ingredients(
+                    [row.id for row in result.items], session
+                )
+
+            async def cursor_page():
+                query = crud.get_recipe_list_query(order=order, after=after)
+                rows = (await session.execute(query.limit(size + 1))).all()
+                await crud.get_recipe_list_ingredients(
+                    [row.id for row in rows[:size]], session
+                )
+
+            report(f'page {page} [offset]', await measure(offset_page, repeat))
+            report(f'page {page} [cursor]', await measure(cursor_page, repeat))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.recipes, args.repeat, args.size))
@@ -0,0 +1,151 @@
+"""Recipe responses: pydantic + jsonable_encoder vs orjson serializer.
+
+Usage:
+    python -m benchmarks.recipe_serialization [--size 100]
+
+The pydantic path repeats what FastAPI does for ``response_model``:
+validation, ``jsonable_encoder`` and ``json.dumps`` in ``JSONResponse``.
+Entities go through ``orm_mode`` with the ``GetterDict`` that used to
+extract ingredient names. No database is needed.
+"""
+import argparse
+import asyncio
+import json
+from collections import namedtuple
+from datetime import timedelta
+from typing import Any
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_pagination import Page, Params
+from pydantic.utils import GetterDict
+
+from .tools import measure, report
+from app.api.image.schema import ImageMetadata
+from app.api.recipe import serializer
+from app.api.recipe.schema import RecipeEntityResponse, RecipeListResponse, RecipeStep
+from app.model.image import Image
+from app.model.recipe import Ingredient, Recipe, RecipeIngredientAssociation, Step
+
+
+ListRow = namedtuple('ListRow', 'id name description duration rating')
+
+
+class LegacyIngredientGetter(GetterDict):
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key == 'ingredients':
+            return [
+                association.ingredient.name for association in self._obj.ingredients
+            ]
+        return super().get(key, default)
+
+
+class LegacyImageMetadata(ImageMetadata):
+    class Config:
+        orm_mode = True
+
+
+class LegacyRecipeStep(RecipeStep):
+    image: LegacyImageMetadata
+
+    class Config:
+        orm_mode = True
+
+
+class LegacyRecipeEntityResponse(RecipeEntityResponse):
+    image: LegacyImageMetadata
+    steps: list[LegacyRecipeStep]
+
+    class Config:
+        orm_mode = True
+        getter_dict = LegacyIngredientGetter
+
+
+def render(content: Any) -> bytes:
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(',', ':'),
+    ).encode()
+
+
+def make_page(size: int, ingredients: int):
+    rows = [
+        ListRow(i, f'recipe {i}', 'description ' * 10, timedelta(minutes=i), 3.5)
+        for i in range(size)
+    ]
+    names = {row.id: [f'ingredient {k}' for k in range(ingredients)] for row in rows}
+    return Page.create(rows, Params(size=size), total=size * 10), names
+
+
+def make_recipe(ingredients: int, steps: int) -> Recipe:
+    image_id = uuid4()
+    image = Image(
+        id=image_id,
+        width=640,
+        height=480,
+        byte_size=65536,
+        format='JPEG',
+        placeholder='data:image/jpeg;base64,' + 'A' * 400,
+    )
+    return Recipe(
+        id=1,
+        name='recipe',
+        description='description ' * 10,
+        image_id=image_id,
+        image=image,
+        ingredients=[
+            RecipeIngredientAssociation(ingredient=Ingredient(name=f'ingredient {k}'))
+            for k in range(ingredients)
+        ],
+        steps=[
+            Step(
+                order=order,
+                description='step ' * 20,
+                duration=timedelta(minutes=order),
+                image_id=image_id,
+                image=image,
+            )
+            for order in range(1, steps + 1)
+        ],
+    )
+
+
+async def main(size: int, ingredients: int, steps: int, repeat: int):
+    page, names = make_page(size, ingredients)
+    recipe = make_recipe(ingredients, steps)
+
+    async def list_pydantic():
+        items = [row._asdict() | {'ingredients': names[row.id]} for row in page.items]
+        render(Page[RecipeListResponse].parse_obj(page.dict() | {'items': items}))
+
+    async def list_orjson():
+        serializer.dump_recipe_list_page(page, names)
+
+    async def entity_pydantic():
+        render(LegacyRecipeEntityResponse.from_orm(recipe))
+
+    async def entity_orjson():
+        serializer.dump_recipe_batch([recipe.id], {recipe.id: recipe})
+
+    for title, func in (
+        (f'list page of {size} [pydantic]', list_pydantic),
+        (f'list page of {size} [orjson]', list_orjson),
+        ('recipe entity [pydantic]', entity_pydantic),
+        ('recipe entity [orjson, batch of 1]', entity_orjson),
+    ):
+        timings = await measure(func, repeat)
+        report(title, timings)
+        print(f'{"":<48} {len(timings) / sum(timings):9.0f} responses/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=100)
+    parser.add_argument('--ingredients', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.size, args.ingredients, args.steps, args.repeat))
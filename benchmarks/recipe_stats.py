@@ -0,0 +1,144 @@
+"""Recipe list query: aggregate subqueries vs recipe_stats table.
+
+Usage:
+    python -m benchmarks.recipe_stats [--recipes 10000] [--users 100]
+
+Ratings count equals recipes * users (1M with default parameters).
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import contains_eager, sessionmaker
+
+from .tools import measure, prepare_database, report
+from app.crud import recipe as crud
+from app.model.recipe import (
+    Ingredient,
+    Recipe,
+    RecipeIngredientAssociation,
+    RecipeRate,
+    Step,
+)
+
+
+def legacy_recipe_list_query(
+    rating__gte: float | None = None,
+    order: str | None = None,
+):
+    step_sq = (
+        select(
+            Step.recipe_id,
+            func.sum(Step.duration).label('total_duration'),
+        )
+        .group_by(Step.recipe_id)
+        .subquery()
+    )
+    rate_sq = (
+        select(
+            RecipeRate.recipe_id,
+            func.avg(RecipeRate.rate).label('rating'),
+        )
+        .group_by(RecipeRate.recipe_id)
+        .subquery()
+    )
+    total_duration_column = func.coalesce(
+        step_sq.c.total_duration,
+        timedelta(seconds=0),
+    )
+    rating_column = func.coalesce(rate_sq.c.rating, 0)
+    query = (
+        select(Recipe, total_duration_column, rating_column)
+        .join(step_sq)
+        .outerjoin(rate_sq)
+        .join(Recipe.ingredients)
+        .join(RecipeIngredientAssociation.ingredient)
+        .options(
+            contains_eager(Recipe.ingredients)
+            .contains_eager(RecipeIngredientAssociation.ingredient)
+            .load_only(Ingredient.name)
+        )
+    )
+    if rating__gte is not None:
+        query = query.filter(rating_column >= rating__gte)
+    return crud.apply_order(query, total_duration_column, rating_column, order)
+
+
+async def populate(engine: AsyncEngine, recipes: int, users: int):
+    statements = [
+        "INSERT INTO image (id, path) VALUES (gen_random_uuid(), 'bench.jpeg')",
+        f"""
+        INSERT INTO "user" (id, email, hashed_password, is_active,
+                            is_superuser, is_verified)
+        SELECT gen_random_uuid(), 'user' || i || '@bench.test', '',
+               true, false, false
+        FROM generate_series(1, {users}) AS i
+        """,
+        f"""
+        INSERT INTO recipe (name, description, image_id)
+        SELECT 'recipe ' || i, 'description', (SELECT id FROM image)
+        FROM generate_series(1, {recipes}) AS i
+        """,
+        """
+        INSERT INTO step (recipe_id, "order", description, duration, image_id)
+        SELECT recipe.id, s, 'step', make_interval(secs => 60 + random() * 3600),
+               recipe.image_id
+        FROM recipe, generate_series(1, 5) AS s
+        """,
+        """
+        INSERT INTO ingredient (name)
+        SELECT 'ingredient ' || i FROM generate_series(1, 200) AS i
+        """,
+        """
+        INSERT INTO recipe_ingredient_association (recipe_id, ingredient_id)
+        SELECT DISTINCT recipe.id, 1 + (recipe.id::bigint * k * 7919) % 200
+        FROM recipe, generate_series(1, 5) AS k
+        """,
+        """
+        INSERT INTO recipe_rate (user_id, recipe_id, rate)
+        SELECT "user".id, recipe.id, 1 + floor(random() * 5)::int
+        FROM "user", recipe
+        """,
+    ]
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement))
+    async_session = sessionmaker(engine, class_=AsyncSession)  # type: ignore
+    async with async_session() as session:
+        await crud.refresh_recipe_stats(session)
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE'))
+
+
+async def main(recipes: int, users: int, repeat: int):
+    engine = await prepare_database()
+    print(f'Populating {recipes} recipes, {recipes * users} ratings...')
+    await populate(engine, recipes, users)
+    cases = [
+        ('order by -rating', {'order': '-rating'}),
+        ('rating >= 4.5, order by duration', {'rating__gte': 4.5, 'order': 'duration'}),
+    ]
+    for title, params in cases:
+        for name, query in (
+            ('aggregate', legacy_recipe_list_query(**params)),
+            ('recipe_stats', crud.get_recipe_list_query(**params)),
+        ):
+
+            async def run():
+                async with engine.connect() as conn:
+                    await conn.execute(query.limit(50))
+
+            report(f'{title} [{name}]', await measure(run, repeat))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.recipes, args.users, args.repeat))
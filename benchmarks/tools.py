@@ -0,0 +1,49 @@
+import statistics
+import time
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy_utils import create_database, database_exists
+
+from app.config import settings
+from app.database.base import Base
+from app.model import image, recipe, user  # noqa: F401
+
+
+async def prepare_database() -> AsyncEngine:
+    """Recreate schema in the test database.
+
+    Benchmarks fill tables with synthetic data, so they never touch
+    the main database.
+    """
+    if not database_exists(settings.TEST_CONNECTION_FOR_DB_LEVEL_DDL):
+        create_database(settings.TEST_CONNECTION_FOR_DB_LEVEL_DDL)
+    engine = create_async_engine(settings.TEST_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+async def measure(
+    func: Callable[[], Awaitable[Any]],
+    repeat: int = 20,
+    warmup: int = 2,
+) -> list[float]:
+    for _ in range(warmup):
+        await func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(title: str, timings: list[float]):
+    print(
+        f'{title:<48} '
+        f'median {statistics.median(timings) * 1000:9.2f} ms  '
+        f'min {min(timings) * 1000:9.2f} ms  '
+        f'max {max(timings) * 1000:9.2f} ms'
+    )
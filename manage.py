@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+
+from app.config import settings
+from app.crud import image as image_crud
+from app.crud import recipe as recipe_crud
+from app.database.tools import async_session
+
+
+async def check_recipe_stats(fix: bool) -> int:
+    async with async_session() as session:
+        inconsistent = await recipe_crud.get_inconsistent_recipe_stats(session)
+        for row in inconsistent:
+            print(
+                f'recipe {row.recipe_id}: '
+                f'total_duration {row.stored_total_duration} != {row.total_duration}, '
+                f'rating_sum {row.stored_rating_sum} != {row.rating_sum}, '
+                f'rating_count {row.stored_rating_count} != {row.rating_count}'
+            )
+        print(f'{len(inconsistent)} recipe(s) with inconsistent stats.')
+        if fix and inconsistent:
+            await recipe_crud.refresh_recipe_stats(
+                session,
+                [row.recipe_id for row in inconsistent],
+            )
+            print('Fixed.')
+    return 1 if inconsistent and not fix else 0
+
+
+async def rebuild_recipe_documents(check: bool) -> int:
+    async with async_session() as session:
+        if check:
+            drifted = await recipe_crud.get_drifted_recipe_document_ids(session)
+            for id in drifted:
+                print(f'recipe {id}: document differs from tables')
+            print(f'{len(drifted)} recipe(s) with drifted document.')
+            return 1 if drifted else 0
+        rebuilt = await recipe_crud.rebuild_recipe_documents(session)
+        print(f'{rebuilt} recipe document(s) rebuilt.')
+    return 0
+
+
+async def dedupe_media() -> int:
+    async with async_session() as session:
+        moved, missing = await image_crud.dedupe_images(session)
+    print(f'{moved} image(s) moved to content-addressed files.')
+    if missing:
+        print(f'{missing} image(s) skipped, their files are missing.')
+    return 1 if missing else 0
+
+
+async def migrate_media_layout(batch_size: int) -> int:
+    async with async_session() as session:
+        moved, missing = await image_crud.migrate_media_layout(session, batch_size)
+    print(f'{moved} media file(s) moved to the current layout.')
+    if missing:
+        print(f'{missing} media file(s) skipped, they are missing.')
+    return 1 if missing else 0
+
+
+async def fill_image_metadata() -> int:
+    async with async_session() as session:
+        filled, failed = await image_crud.fill_image_metadata(session)
+        rebuilt = await recipe_crud.rebuild_recipe_documents(session)
+    print(f'{filled} image(s) inspected, {rebuilt} recipe document(s) rebuilt.')
+    if failed:
+        print(f'{failed} image(s) skipped, their files are missing or invalid.')
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Project maintenance commands.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stats = commands.add_parser(
+        'check-recipe-stats',
+        help='compare recipe_stats with steps and rates',
+    )
+    stats.add_argument('--fix', action='store_true', help='rewrite broken rows')
+
+    documents = commands.add_parser(
+        'rebuild-recipe-documents',
+        help='rewrite recipe documents that differ from recipe tables',
+    )
+    documents.add_argument(
+        '--check',
+        action='store_true',
+        help='only report drifted documents',
+    )
+
+    commands.add_parser(
+        'dedupe-media',
+        help='store images uploaded before deduplication by content hash',
+    )
+
+    layout = commands.add_parser(
+        'migrate-media-layout',
+        help='move media files to MEDIA_SHARD_LEVELS layout, can run online',
+    )
+    layout.add_argument(
+        '--batch-size',
+        type=int,
+        default=1000,
+        help='files moved per transaction',
+    )
+
+    commands.add_parser(
+        'fill-image-metadata',
+        help='store metadata of images uploaded before it was stored',
+    )
+
+    args = parser.parse_args()
+    if (
+        args.command in ('dedupe-media', 'migrate-media-layout')
+        and settings.STORAGE_BACKEND != 'local'
+    ):
+        parser.error(f'{args.command} works with local storage only')
+    if args.command == 'check-recipe-stats':
+        return asyncio.run(check_recipe_stats(args.fix))
+    if args.command == 'rebuild-recipe-documents':
+        return asyncio.run(rebuild_recipe_documents(args.check))
+    if args.command == 'dedupe-media':
+        return asyncio.run(dedupe_media())
+    if args.command == 'migrate-media-layout':
+        return asyncio.run(migrate_media_layout(args.batch_size))
+    if args.command == 'fill-image-metadata':
+        return asyncio.run(fill_image_metadata())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,7 +1,10 @@
+import argparse
 import asyncio
+import random
 from datetime import timedelta
+from pathlib import Path
 from random import choice, randint
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from faker import Faker
 
@@ -9,7 +12,13 @@ from app.database.tools import async_session
 from app.config import settings
 from app.crud.image import create_images
 from app.crud.recipe import create_recipe
-from app.util import generate_image as gi
+from app.storage import storage
+from app.util import (
+    generate_image as gi,
+    get_media_temp_path,
+    hash_file,
+    inspect_image,
+)
 
 
 def generate_step(fake, step, images):
@@ -21,12 +30,10 @@ def generate_step(fake, step, images):
     }
 
 
-def generate_image():
-    id = uuid4()
-    img = gi()
-    with open(settings.MEDIA_PATH / f'{id.hex}.jpeg', 'wb') as img_file:
-        img.save(img_file)
-    return id
+def generate_image(rng) -> Path:
+    path = get_media_temp_path()
+    gi(rng).save(path, format='jpeg')
+    return path
 
 
 def generate_ingredient(fake):
@@ -43,29 +50,58 @@ def generate_recipe(fake, images):
     }
 
 
-async def save_in_db(fake, images, recipes):
-    async with async_session() as session:
-        await create_images(
-            [
+async def save_in_db(fake, images: dict[UUID, Path], recipes):
+    """Store images as uploads are stored, in blobs of configured storage."""
+    hashes = {id: hash_file(path) for id, path in images.items()}
+    blob_files = {hashes[id]: path for id, path in images.items()}
+    try:
+        images_data = []
+        for id, path in images.items():
+            metadata = inspect_image(
+                path, settings.IMAGE_MAX_PIXELS, settings.IMAGE_PLACEHOLDER_SIZE
+            )
+            assert metadata is not None
+            images_data.append(
                 {
-                    'id': i,
-                    'path': (settings.MEDIA_PATH / f'{i.hex}.jpeg').as_posix(),
-                    'original_filename': fake.word() + '.png',
+                    'id': id,
+                    'path': storage.get_location(f'{hashes[id]}.{metadata.format}'),
+                    'original_filename': fake.word() + '.jpeg',
+                    'blob_hash': hashes[id],
+                    'width': metadata.width,
+                    'height': metadata.height,
+                    'byte_size': path.stat().st_size,
+                    'format': metadata.format,
+                    'placeholder': metadata.placeholder,
                 }
-                for i in images
-            ],
-            session,
-        )
-        for r in recipes:
-            await create_recipe(r, session)
-
-
-def populate():
+            )
+        async with async_session() as session:
+            await create_images(
+                images_data,
+                session,
+                blob_files,
+            )
+            for r in recipes:
+                await create_recipe(r, session)
+    finally:
+        for path in images.values():
+            path.unlink(missing_ok=True)
+        await storage.close()
+
+
+def populate(seed=None):
     fake = Faker()
-    populated_images = [generate_image() for _ in range(10)]
-    recipes = [generate_recipe(fake, populated_images) for _ in range(100)]
+    if seed is not None:
+        # Image ids stay random, contents and recipes repeat.
+        fake.seed_instance(seed)
+        random.seed(seed)
+    rng = random.Random(seed)
+    settings.MEDIA_PATH.mkdir(parents=True, exist_ok=True)
+    populated_images = {uuid4(): generate_image(rng) for _ in range(10)}
+    recipes = [generate_recipe(fake, list(populated_images)) for _ in range(100)]
     asyncio.run(save_in_db(fake, populated_images, recipes))
 
 
 if __name__ == '__main__':
-    populate()
+    parser = argparse.ArgumentParser(description='Fill database with fake recipes.')
+    parser.add_argument('--seed', type=int, help='make the same data every run')
+    populate(parser.parse_args().seed)
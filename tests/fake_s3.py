@@ -0,0 +1,99 @@
+"""In-memory stand-in of S3 API for ``S3Storage`` tests.
+
+Serves path-style requests of any bucket through ``httpx.ASGITransport``,
+checking that requests are signed and payload hashes match.
+"""
+import hashlib
+from email.utils import formatdate
+from uuid import uuid4
+from xml.etree import ElementTree
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.storage import S3Storage
+
+
+class FakeS3:
+    def __init__(self, base_path: str = '') -> None:
+        self.base_path = base_path
+        self.objects: dict[str, tuple[bytes, str]] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.requests: list[tuple[str, str]] = []
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        request = Request(scope, receive)
+        response = await self.handle(request)
+        await response(scope, receive, send)
+
+    async def handle(self, request: Request) -> Response:
+        body = await request.body()
+        assert request.headers['authorization'].startswith('AWS4-HMAC-SHA256 ')
+        assert request.headers['x-amz-content-sha256'] == (
+            hashlib.sha256(body).hexdigest()
+        )
+        path = request.url.path
+        assert path.startswith(self.base_path + '/')
+        key = path.removeprefix(self.base_path).split('/', 2)[2]
+        query = request.query_params
+        self.requests.append((request.method, key))
+        if request.method == 'POST' and 'uploads' in query:
+            upload_id = uuid4().hex
+            self.uploads[upload_id] = {}
+            return Response(
+                f'<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId>'
+                '</InitiateMultipartUploadResult>'
+            )
+        if request.method == 'PUT' and 'uploadId' in query:
+            self.uploads[query['uploadId']][int(query['partNumber'])] = body
+            return Response(headers={'etag': f'"{hashlib.md5(body).hexdigest()}"'})
+        if request.method == 'POST' and 'uploadId' in query:
+            parts = self.uploads.pop(query['uploadId'])
+            numbers = [
+                int(number.text or '')
+                for number in ElementTree.fromstring(body).iter('PartNumber')
+            ]
+            self.objects[key] = (b''.join(parts[n] for n in numbers), '')
+            return Response('<CompleteMultipartUploadResult/>')
+        if request.method == 'DELETE' and 'uploadId' in query:
+            del self.uploads[query['uploadId']]
+            return Response(status_code=204)
+        if request.method == 'PUT':
+            self.objects[key] = (body, request.headers.get('content-type', ''))
+            return Response()
+        if request.method == 'DELETE':
+            self.objects.pop(key, None)
+            return Response(status_code=204)
+        if key not in self.objects:
+            return Response(status_code=404)
+        content, content_type = self.objects[key]
+        headers = {
+            'etag': f'"{hashlib.md5(content).hexdigest()}"',
+            'last-modified': formatdate(0, usegmt=True),
+            'content-type': content_type,
+        }
+        if request.method == 'HEAD':
+            return Response(headers=headers | {'content-length': str(len(content))})
+        range_header = request.headers.get('range')
+        if range_header is None:
+            return Response(content, headers=headers)
+        first, _, last = range_header.removeprefix('bytes=').partition('-')
+        return Response(
+            content[int(first) : int(last) + 1],
+            status_code=206,
+            headers=headers,
+        )
+
+
+def create_s3_storage(fake_s3: FakeS3, **kwargs) -> S3Storage:
+    return S3Storage(
+        f'http://s3.test{fake_s3.base_path}',
+        'images',
+        'us-east-1',
+        'key-id',
+        'secret',
+        transport=httpx.ASGITransport(app=fake_s3),  # type: ignore
+        **kwargs,
+    )
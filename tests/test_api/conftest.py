@@ -1,6 +1,9 @@
+from uuid import uuid4
+
 from httpx import AsyncClient
 import pytest
 
+from app.crud import image as image_crud
 from app.main import app
 
 
@@ -8,3 +11,14 @@ from app.main import app
 async def aclient():
     async with AsyncClient(app=app, base_url='http://test') as aclient:
         yield aclient
+
+
+@pytest.fixture(scope='module')
+async def image_id(asession):
+    image_id = uuid4()
+    async with asession() as session:
+        await image_crud.create_images(
+            [{'id': image_id, 'path': 'paging.jpg', 'original_filename': None}],
+            session,
+        )
+    return image_id
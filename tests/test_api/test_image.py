@@ -1,10 +1,31 @@
+import asyncio
+import hashlib
 import io
+import os
+import tracemalloc
 from pathlib import Path
 from unittest import mock
 from uuid import UUID, uuid4
 
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy import event, select
+
+from app.api.image.dependency import get_uploaded_images
+from app.api.image.multipart import MultipartReader
+from app.cache import image_path_cache
+from app.config import settings
 from app.crud import image as crud
+from app.database.tools import engine
+from app.derivative_cache import DerivativeCache
+from app.exception import InvalidImagesError
+from app.model.image import Image, ImageBlob
 from app.util import generate_image
+from app.worker_pool import image_pool
+from tests.fake_s3 import create_s3_storage, FakeS3
+
+
+BOUNDARY = 'test-boundary'
 
 
 async def test_get_existing_image(asession, aclient, tmpdir):
@@ -30,12 +51,7 @@ async def test_get_existing_image(asession, aclient, tmpdir):
 async def test_create_images(aclient, tmpdir):
     byt_imgs = [io.BytesIO() for _ in range(3)]
     [generate_image().save(b, format='jpeg') for b in byt_imgs]
-    with mock.patch('app.api.image.dependency.save_image_to_media') as mock_save:
-        mock_save.side_effect = [
-            Path(tmpdir) / '1.jpg',
-            Path(tmpdir) / '2.jpg',
-            Path(tmpdir) / '3.jpg',
-        ]
+    with mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)):
         response = await aclient.post(
             'api/v1/images/upload',
             files=[
@@ -43,7 +59,6 @@ async def test_create_images(aclient, tmpdir):
                 for i, image in enumerate(byt_imgs)
             ],
         )
-    assert mock_save.call_count == 3
     assert response.status_code == 201
     json_response = response.json()
     assert len(json_response) == 3
@@ -53,10 +68,378 @@ async def test_create_images(aclient, tmpdir):
         except ValueError:
             assert False, 'id not uuid'
         assert item['original_filename'] == f'{i}.jpeg'
+        image = PILImage.open(byt_imgs[i])
+        assert (item['width'], item['height']) == image.size
+        assert item['byte_size'] == len(byt_imgs[i].getvalue())
+        assert item['format'] == 'JPEG'
+        assert item['placeholder'].startswith('data:image/jpeg;base64,')
+    assert sorted(path.name for path in Path(tmpdir).iterdir()) == sorted(
+        f'{hashlib.sha256(image.getvalue()).hexdigest()}.JPEG' for image in byt_imgs
+    )
+
+
+async def upload_same_image(aclient, image, count):
+    response = await aclient.post(
+        'api/v1/images/upload',
+        files=[('files', (f'{i}.png', image, 'image/png')) for i in range(count)],
+    )
+    assert response.status_code == 201
+    return [UUID(item['id']) for item in response.json()]
+
+
+async def get_image_size(aclient, id, **params):
+    response = await aclient.get(f'/api/v1/images/{id}', params=params)
+    assert response.status_code == 200
+    return PILImage.open(io.BytesIO(response.content)).size
+
+
+async def test_get_resized_image(aclient, tmpdir):
+    image = io.BytesIO()
+    PILImage.new('RGB', (400, 200)).save(image, format='png')
+    cache = DerivativeCache(Path(tmpdir) / 'derivatives', 1024 * 1024)
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch('app.api.image.route.derivative_cache', cache),
+    ):
+        [id] = await upload_same_image(aclient, image.getvalue(), 1)
+        assert await get_image_size(aclient, id) == (400, 200)
+        assert await get_image_size(aclient, id, width=128) == (128, 64)
+        assert await get_image_size(aclient, id, height=128) == (256, 128)
+        assert await get_image_size(
+            aclient, id, width=128, height=128, fit='cover'
+        ) == (128, 128)
+        assert await get_image_size(aclient, id, width=128) == (128, 64)
+        response = await aclient.get(f'/api/v1/images/{id}', params={'width': 100})
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['loc'] == ['query', 'width']
+    assert cache.stats()['hits'] == 1
+    assert len(list((Path(tmpdir) / 'derivatives').iterdir())) == 3
+
+
+async def test_get_image_variant_in_accepted_format(aclient, tmpdir):
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    cache = DerivativeCache(Path(tmpdir) / 'derivatives', 1024 * 1024)
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch('app.api.image.route.derivative_cache', cache),
+    ):
+        [id] = await upload_same_image(aclient, image.getvalue(), 1)
+        url = f'/api/v1/images/{id}'
+        accept = {'Accept': 'image/avif,image/webp,image/*;q=0.8'}
+        response = await aclient.get(url, headers=accept)
+        assert response.headers['content-type'] == 'image/png'
+        assert response.headers['cache-control'] == 'public, max-age=60'
+        assert response.headers['vary'] == 'Accept'
+        await asyncio.gather(*cache._pending.values())
+        response = await aclient.get(url, headers=accept)
+        assert response.headers['content-type'] == 'image/webp'
+        assert 'immutable' in response.headers['cache-control']
+        assert len(response.content) < len(image.getvalue())
+        response = await aclient.get(
+            url,
+            headers={'Accept': 'image/webp;q=0,image/*'},
+            params={'width': 128},
+        )
+        assert response.headers['content-type'] == 'image/png'
+        response = await aclient.get(url, headers=accept, params={'width': 128})
+        assert response.headers['content-type'] == 'image/webp'
+        assert PILImage.open(io.BytesIO(response.content)).width == 128
+
+
+async def test_get_source_image_when_variant_is_larger(aclient, tmpdir):
+    image = io.BytesIO()
+    generate_image().save(image, format='jpeg', quality=50)
+    cache = DerivativeCache(Path(tmpdir) / 'derivatives', 1024 * 1024)
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch('app.api.image.route.derivative_cache', cache),
+        mock.patch.object(settings, 'IMAGE_VARIANT_QUALITY', 100),
+    ):
+        [id] = await upload_same_image(aclient, image.getvalue(), 1)
+        url = f'/api/v1/images/{id}'
+        await aclient.get(url, headers={'Accept': 'image/webp'})
+        await asyncio.gather(*cache._pending.values())
+        response = await aclient.get(url, headers={'Accept': 'image/webp'})
+    assert response.headers['content-type'] == 'image/jpeg'
+    assert 'immutable' in response.headers['cache-control']
+    assert response.content == image.getvalue()
+
+
+async def test_get_image_conditional_and_range(aclient, tmpdir):
+    content = b'0123456789' * 10
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    with mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)):
+        [id] = await upload_same_image(aclient, image.getvalue(), 1)
+    (Path(tmpdir) / f'{hashlib.sha256(image.getvalue()).hexdigest()}.PNG').write_bytes(
+        content
+    )
+    url = f'/api/v1/images/{id}'
+    response = await aclient.get(url)
+    assert response.content == content
+    assert 'immutable' in response.headers['cache-control']
+    etag = response.headers['etag']
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    try:
+        response = await aclient.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        response = await aclient.get(
+            url,
+            headers={'If-Modified-Since': response.headers['last-modified']},
+        )
+        assert response.status_code == 304
+        response = await aclient.get(url, headers={'Range': 'bytes=10-19'})
+        assert response.status_code == 206
+        assert response.content == b'0123456789'
+        assert response.headers['content-range'] == 'bytes 10-19/100'
+        response = await aclient.get(url, headers={'Range': 'bytes=-5'})
+        assert response.content == b'56789'
+        response = await aclient.get(
+            url, headers={'Range': 'bytes=10-19', 'If-Range': '"other"'}
+        )
+        assert response.status_code == 200
+        response = await aclient.get(url, headers={'Range': 'bytes=100-'})
+        assert response.status_code == 416
+        assert response.headers['content-range'] == 'bytes */100'
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', record)
+    assert statements == []
+
+
+async def test_identical_images_share_file(aclient, asession, tmpdir):
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    digest = hashlib.sha256(image.getvalue()).hexdigest()
+    with mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)):
+        ids = await upload_same_image(aclient, image.getvalue(), 2)
+        ids += await upload_same_image(aclient, image.getvalue(), 1)
+    assert [path.name for path in Path(tmpdir).iterdir()] == [f'{digest}.PNG']
+    async with asession() as session:
+        blob = await session.get(ImageBlob, digest)
+        assert blob.ref_count == 3
+        for id in ids[:-1]:
+            await crud.delete_image(id, session)
+        assert list(Path(tmpdir).iterdir())
+        await crud.delete_image(ids[-1], session)
+        assert list(Path(tmpdir).iterdir()) == []
+        assert await session.get(ImageBlob, digest, populate_existing=True) is None
+
+
+async def test_images_in_s3_storage(aclient, asession, tmpdir):
+    fake_s3 = FakeS3()
+    storage = create_s3_storage(fake_s3)
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    key = f'{hashlib.sha256(image.getvalue()).hexdigest()}.PNG'
+    cache = DerivativeCache(Path(tmpdir) / 'derivatives', 1024 * 1024)
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch('app.api.image.dependency.storage', storage),
+        mock.patch('app.api.image.response.storage', storage),
+        mock.patch('app.api.image.route.storage', storage),
+        mock.patch('app.crud.image.storage', storage),
+        mock.patch('app.api.image.route.derivative_cache', cache),
+    ):
+        [id] = await upload_same_image(aclient, image.getvalue(), 1)
+        assert fake_s3.objects[key] == (image.getvalue(), 'image/png')
+        url = f'/api/v1/images/{id}'
+        response = await aclient.get(url)
+        assert response.content == image.getvalue()
+        response = await aclient.get(
+            url, headers={'If-None-Match': response.headers['etag']}
+        )
+        assert response.status_code == 304
+        response = await aclient.get(url, headers={'Range': 'bytes=0-7'})
+        assert response.status_code == 206
+        assert response.content == image.getvalue()[:8]
+        assert (await get_image_size(aclient, id, width=64))[0] == 64
+        image_path_cache.pop(id)
+        with (
+            mock.patch.object(storage, 'url_ttl', 60),
+            mock.patch.object(settings, 'IMAGE_PATH_REDIRECT_CACHE_TTL', 0),
+        ):
+            response = await aclient.get(url)
+            assert response.status_code == 307
+            assert response.headers['location'].startswith(
+                f'http://s3.test/images/{key}?'
+            )
+            # Deleted through another worker, which clears only its own cache.
+            with mock.patch.object(image_path_cache, 'pop'):
+                async with asession() as session:
+                    await crud.delete_image(id, session)
+            assert (await aclient.get(url)).status_code == 404
+    assert fake_s3.objects == {}
+    await storage.close()
+
+
+async def test_dedupe_images(asession, tmpdir):
+    legacy_path, media_path = Path(tmpdir) / 'legacy', Path(tmpdir) / 'media'
+    legacy_path.mkdir()
+    media_path.mkdir()
+    images = [
+        {
+            'id': uuid4(),
+            'path': str(legacy_path / f'{i}.jpg'),
+            'original_filename': None,
+        }
+        for i in range(3)
+    ]
+    for image in images[:2]:
+        Path(image['path']).write_bytes(b'same bytes')
+    async with asession() as session:
+        await crud.create_images(images, session)
+        with mock.patch.object(settings, 'MEDIA_PATH', media_path):
+            await crud.dedupe_images(session, batch_size=2)
+        result = await session.execute(
+            select(Image.path, Image.blob_hash)
+            .filter(Image.id.in_([image['id'] for image in images]))
+            .order_by(Image.path)
+            .execution_options(populate_existing=True)
+        )
+        rows = result.all()
+    digest = hashlib.sha256(b'same bytes').hexdigest()
+    assert rows[0] == (str(legacy_path / '2.jpg'), None)
+    assert rows[1:] == [(str(media_path / f'{digest}.jpg'), digest)] * 2
+    assert list(legacy_path.iterdir()) == []
+    assert (media_path / f'{digest}.jpg').read_bytes() == b'same bytes'
+
+
+async def test_create_images_over_size_limit(aclient, tmpdir):
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch.object(settings, 'IMAGE_MAX_REQUEST_SIZE', image.tell() * 2 - 1),
+    ):
+        response = await aclient.post(
+            'api/v1/images/upload',
+            files=[
+                ('files', (f'{i}.png', image.getvalue(), 'image/png')) for i in range(2)
+            ],
+        )
+    assert response.status_code == 413
+    assert response.json()['detail'][0]['loc'] == ['body', 1]
+    assert list(Path(tmpdir).iterdir()) == []
+
+
+async def test_create_images_when_pool_is_busy(aclient, tmpdir):
+    image = io.BytesIO()
+    generate_image().save(image, format='jpeg')
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch.object(image_pool, 'capacity', 0),
+    ):
+        response = await aclient.post(
+            'api/v1/images/upload',
+            files=[('files', ('0.jpeg', image.getvalue(), 'image/jpeg'))],
+        )
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert list(Path(tmpdir).iterdir()) == []
+
+
+def write_noise_png(path, size):
+    side = int((size / 3) ** 0.5)
+    image = PILImage.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    image.save(path, format='png', compress_level=0)
+
+
+async def stream_multipart(filename, chunks, read_chunks=None):
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; '
+        f'filename="{filename}"\r\nContent-Type: image/png\r\n\r\n'
+    ).encode()
+    for chunk in chunks:
+        if read_chunks is not None:
+            read_chunks.append(chunk)
+        yield chunk
+    yield f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def read_file_chunks(path):
+    with open(path, 'rb') as file:
+        while chunk := file.read(64 * 1024):
+            yield chunk
+
+
+async def get_upload_peak_memory(path):
+    reader = MultipartReader(
+        f'multipart/form-data; boundary={BOUNDARY}',
+        stream_multipart(path.name, read_file_chunks(path)),
+    )
+    uploads = get_uploaded_images(reader)
+    tracemalloc.start()
+    try:
+        await anext(uploads)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        await uploads.aclose()
+
+
+async def test_upload_memory_does_not_grow_with_file_size(tmpdir):
+    small, large = Path(tmpdir) / 'small.png', Path(tmpdir) / 'large.png'
+    write_noise_png(small, 2 * 1024 * 1024)
+    write_noise_png(large, 16 * 1024 * 1024)
+    media_path = Path(tmpdir) / 'media'
+    media_path.mkdir()
+    with mock.patch.object(settings, 'MEDIA_PATH', media_path):
+        small_peak = await get_upload_peak_memory(small)
+        large_peak = await get_upload_peak_memory(large)
+    assert large_peak < small_peak + 512 * 1024
+    assert large_peak < 3 * settings.IMAGE_UPLOAD_CHUNK_SIZE
+    assert list(media_path.iterdir()) == []
+
+
+async def test_reject_non_image_before_reading_it(tmpdir):
+    read_chunks = []
+    reader = MultipartReader(
+        f'multipart/form-data; boundary={BOUNDARY}',
+        stream_multipart('a.png', [b'not an image'] * 100, read_chunks),
+    )
+    with mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)):
+        with pytest.raises(InvalidImagesError):
+            await anext(get_uploaded_images(reader))
+    assert len(read_chunks) == 1
+    assert list(Path(tmpdir).iterdir()) == []
+
+
+async def test_reject_upload_by_content_length(aclient):
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    with mock.patch.object(settings, 'IMAGE_MAX_REQUEST_SIZE', 1024):
+        response = await aclient.post(
+            'api/v1/images/upload',
+            files=[('files', ('0.png', image.getvalue() * 100, 'image/png'))],
+        )
+    assert response.status_code == 413
+    assert response.json()['detail'][0]['loc'] == ['body']
+
+
+async def test_reject_image_with_too_many_pixels(aclient, tmpdir):
+    image = io.BytesIO()
+    PILImage.new('L', (100, 100)).save(image, format='png')
+    with (
+        mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)),
+        mock.patch.object(settings, 'IMAGE_MAX_PIXELS', 100 * 100 - 1),
+    ):
+        response = await aclient.post(
+            'api/v1/images/upload',
+            files=[('files', ('0.png', image.getvalue(), 'image/png'))],
+        )
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['type'] == 'type_error.image'
 
 
 async def test_pass_invalid_images_to_create(aclient):
-    not_images = ['corrupt'.encode() for _ in range(2)]
+    # Signature of the first one is valid, the rest of it is not.
+    not_images = [b'\x89PNG\r\n\x1a\ncorrupt', b'corrupt']
     response = await aclient.post(
         'api/v1/images/upload',
         files=[
@@ -73,3 +456,39 @@ async def test_pass_invalid_images_to_create(aclient):
         == json_response['detail'][1]['type']
         == 'type_error.image'
     )
+
+
+async def test_migrate_media_layout(aclient, asession, tmpdir):
+    image = io.BytesIO()
+    generate_image().save(image, format='png')
+    name = f'{hashlib.sha256(image.getvalue()).hexdigest()}.PNG'
+    unique_path = Path(tmpdir) / f'{uuid4().hex}.jpg'
+    unique_path.write_bytes(b'unique bytes')
+    unique_id = uuid4()
+    async with asession() as session:
+        await crud.create_images(
+            [{'id': unique_id, 'path': str(unique_path), 'original_filename': None}],
+            session,
+        )
+    with mock.patch.object(settings, 'MEDIA_PATH', Path(tmpdir)):
+        ids = await upload_same_image(aclient, image.getvalue(), 1)
+        with mock.patch.object(settings, 'MEDIA_SHARD_LEVELS', 2):
+            ids += await upload_same_image(aclient, image.getvalue(), 1)
+            async with asession() as session:
+                assert await crud.get_image_path(ids[1], session) == str(
+                    Path(tmpdir) / name
+                )
+                await crud.migrate_media_layout(session, batch_size=1)
+    sharded_path = Path(tmpdir) / name[:2] / name[2:4] / name
+    unique_sharded_path = (
+        Path(tmpdir) / unique_path.name[:2] / unique_path.name[2:4] / unique_path.name
+    )
+    async with asession() as session:
+        for id in ids:
+            assert await crud.get_image_path(id, session) == str(sharded_path)
+        assert await crud.get_image_path(unique_id, session) == str(unique_sharded_path)
+    assert not (Path(tmpdir) / name).exists()
+    assert not unique_path.exists()
+    assert unique_sharded_path.read_bytes() == b'unique bytes'
+    response = await aclient.get(f'/api/v1/images/{ids[0]}')
+    assert response.content == image.getvalue()
@@ -0,0 +1,14 @@
+from app.auth import current_superuser
+from app.main import app
+
+
+async def test_metrics_require_superuser(aclient):
+    response = await aclient.get('/api/v1/metrics')
+    assert response.status_code == 401
+    app.dependency_overrides[current_superuser] = lambda: None
+    try:
+        response = await aclient.get('/api/v1/metrics')
+    finally:
+        del app.dependency_overrides[current_superuser]
+    assert response.status_code == 200
+    assert 'image_path_cache' in response.json()
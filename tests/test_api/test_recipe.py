@@ -0,0 +1,348 @@
+import asyncio
+from datetime import timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event, literal_column, null, select, update
+
+from app.cache import recipe_entity_cache, recipe_list_cache
+from app.crud import image as image_crud
+from app.crud import recipe as crud
+from app.ingredient_index import ingredient_index
+from app.model.recipe import Ingredient, Recipe, RecipeIngredientAssociation, Step
+
+
+PAGING_INGREDIENT = 'paging test ingredient'
+PAGING_RECIPES = 7
+
+
+def get_recipe_data(image_id, i, ingredients):
+    return {
+        'name': f'paging recipe {i}',
+        'description': 'description',
+        'image_id': image_id,
+        'ingredients': ingredients,
+        'steps': [
+            {
+                'order': 1,
+                'description': 'step',
+                'duration': timedelta(minutes=i + 1),
+                'image_id': image_id,
+            }
+        ],
+    }
+
+
+@pytest.fixture(scope='module')
+async def paging_recipe_ids(asession, image_id):
+    async with asession() as session:
+        ids = []
+        for i in range(PAGING_RECIPES):
+            recipe = await crud.create_recipe(
+                get_recipe_data(
+                    image_id,
+                    i,
+                    {PAGING_INGREDIENT, f'paging {i}', f'paging {i}+'},
+                ),
+                session,
+            )
+            ids.append(recipe.id)
+    return ids
+
+
+async def test_recipe_list_page_sizes_are_exact(aclient, paging_recipe_ids):
+    seen = []
+    for page, expected_size in enumerate([3, 3, 1], start=1):
+        response = await aclient.get(
+            '/api/v1/recipe',
+            params={
+                'ingredients': [PAGING_INGREDIENT],
+                'order': 'duration',
+                'size': 3,
+                'page': page,
+            },
+        )
+        assert response.status_code == 200
+        json_response = response.json()
+        assert json_response['total'] == PAGING_RECIPES
+        assert len(json_response['items']) == expected_size
+        for item in json_response['items']:
+            assert len(item['ingredients']) == 3
+        seen += [item['id'] for item in json_response['items']]
+    assert seen == paging_recipe_ids
+
+
+async def test_recipe_list_cursor_page_sizes_are_exact(aclient, paging_recipe_ids):
+    seen, sizes, cursor = [], [], ''
+    while cursor is not None:
+        response = await aclient.get(
+            '/api/v1/recipe',
+            params={
+                'ingredients': [PAGING_INGREDIENT],
+                'order': '-duration',
+                'size': 3,
+                'cursor': cursor,
+            },
+        )
+        assert response.status_code == 200
+        json_response = response.json()
+        sizes.append(len(json_response['items']))
+        seen += [item['id'] for item in json_response['items']]
+        cursor = json_response['next_cursor']
+    assert sizes == [3, 3, 1]
+    assert seen == paging_recipe_ids[::-1]
+
+
+async def test_recipe_list_malformed_cursor(aclient):
+    response = await aclient.get('/api/v1/recipe', params={'cursor': 'not-a-cursor'})
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['loc'] == ['query', 'cursor']
+
+
+async def test_recipe_list_cursor_of_other_order(aclient, paging_recipe_ids):
+    response = await aclient.get(
+        '/api/v1/recipe',
+        params={'ingredients': [PAGING_INGREDIENT], 'size': 3, 'cursor': ''},
+    )
+    response = await aclient.get(
+        '/api/v1/recipe',
+        params={'order': 'rating', 'cursor': response.json()['next_cursor']},
+    )
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['loc'] == ['query', 'cursor']
+
+
+@pytest.fixture
+async def built_ingredient_index(asession):
+    async with asession() as session:
+        await crud.build_ingredient_index(session)
+    yield ingredient_index
+    ingredient_index.ready = False
+
+
+async def test_recipe_list_ingredient_filter_uses_index(
+    aclient,
+    paging_recipe_ids,
+    built_ingredient_index,
+):
+    params = {'ingredients': [PAGING_INGREDIENT, 'paging 2+'], 'size': 100}
+    response = await aclient.get('/api/v1/recipe', params=params)
+    assert [item['id'] for item in response.json()['items']] == [paging_recipe_ids[2]]
+    assert built_ingredient_index.lookup(set(params['ingredients'])) == [
+        paging_recipe_ids[2]
+    ]
+
+
+async def test_recipe_list_cache_is_invalidated_by_writes(aclient, asession, image_id):
+    params = {'ingredients': ['cache test ingredient']}
+    response = await aclient.get('/api/v1/recipe', params=params)
+    assert response.json()['total'] == 0
+    hits = recipe_list_cache.hits
+    response = await aclient.get('/api/v1/recipe', params=params)
+    assert recipe_list_cache.hits == hits + 1
+    async with asession() as session:
+        await crud.create_recipe(
+            get_recipe_data(image_id, 0, {'cache test ingredient'}),
+            session,
+        )
+    response = await aclient.get('/api/v1/recipe', params=params)
+    assert response.json()['total'] == 1
+
+
+async def test_get_recipe_etag(aclient, asession, image_id):
+    async with asession() as session:
+        recipe = await crud.create_recipe(
+            get_recipe_data(image_id, 0, {'etag test ingredient'}),
+            session,
+        )
+    url = f'/api/v1/recipe/{recipe.id}'
+    response = await aclient.get(url)
+    assert response.status_code == 200
+    etag = response.headers['etag']
+    response = await aclient.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+    async with asession() as session:
+        await crud.edit_recipe(
+            recipe.id,
+            get_recipe_data(image_id, 1, {'etag test ingredient'}) | {'name': 'edited'},
+            session,
+        )
+    response = await aclient.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+    assert response.json()['name'] == 'edited'
+    assert response.json()['steps'][0]['duration'] == 120
+
+
+async def test_get_recipe_batch(aclient, paging_recipe_ids):
+    missing_id = max(paging_recipe_ids) + 10_000
+    ids = [paging_recipe_ids[1], missing_id, paging_recipe_ids[0]]
+    response = await aclient.get('/api/v1/recipe/batch', params={'ids': ids})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert [item['id'] for item in json_response] == ids
+    assert json_response[0]['recipe']['name'] == 'paging recipe 1'
+    assert len(json_response[0]['recipe']['ingredients']) == 3
+    assert json_response[1] == {'id': missing_id, 'recipe': None, 'detail': 'Not Found'}
+    assert json_response[2]['recipe']['steps'][0]['order'] == 1
+
+
+async def test_get_recipe_serves_document(aclient, asession, paging_recipe_ids):
+    async with asession() as session:
+        assert not set(paging_recipe_ids) & set(
+            await crud.get_drifted_recipe_document_ids(session)
+        )
+    response = await aclient.get(f'/api/v1/recipe/{paging_recipe_ids[2]}')
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response['ingredients'] == sorted(
+        [PAGING_INGREDIENT, 'paging 2', 'paging 2+']
+    )
+    assert json_response['steps'][0]['duration'] == 180
+
+
+async def test_get_recipe_inlines_image_metadata(aclient, asession):
+    image_id = uuid4()
+    metadata = {
+        'width': 640,
+        'height': 480,
+        'byte_size': 12345,
+        'format': 'JPEG',
+        'placeholder': 'data:image/jpeg;base64,AAAA',
+    }
+    async with asession() as session:
+        await image_crud.create_images(
+            [
+                {'id': image_id, 'path': 'meta.jpg', 'original_filename': None}
+                | metadata
+            ],
+            session,
+        )
+        recipe = await crud.create_recipe(
+            get_recipe_data(image_id, 0, {'image metadata ingredient'}),
+            session,
+        )
+    response = await aclient.get(f'/api/v1/recipe/{recipe.id}')
+    assert response.json()['image'] == metadata
+    assert response.json()['steps'][0]['image'] == metadata
+    response = await aclient.get('/api/v1/recipe/batch', params={'ids': [recipe.id]})
+    assert response.json()[0]['recipe']['image'] == metadata
+    assert response.json()[0]['recipe']['steps'][0]['image'] == metadata
+
+
+async def get_row_versions(session, recipe_id):
+    steps = await session.execute(
+        select(Step.order, literal_column('step.xmin::text')).filter_by(
+            recipe_id=recipe_id
+        )
+    )
+    ingredients = await session.execute(
+        select(
+            Ingredient.name,
+            literal_column('recipe_ingredient_association.xmin::text'),
+        )
+        .select_from(RecipeIngredientAssociation)
+        .join(RecipeIngredientAssociation.ingredient)
+        .filter(RecipeIngredientAssociation.recipe_id == recipe_id)
+    )
+    return dict(steps.all()), dict(ingredients.all())
+
+
+async def test_edit_recipe_rewrites_only_changed_rows(aclient, asession, image_id):
+    data = get_recipe_data(image_id, 0, {'diff kept', 'diff removed'})
+    first_step = data['steps'][0]
+    data['steps'].append(first_step | {'order': 2})
+    new_steps = [first_step, first_step | {'order': 2, 'description': 'fixed'}]
+    async with asession() as session:
+        recipe = await crud.create_recipe(data, session)
+        steps, ingredients = await get_row_versions(session, recipe.id)
+        await crud.edit_recipe(
+            recipe.id,
+            {'steps': new_steps, 'ingredients': {'diff kept', 'diff added'}},
+            session,
+        )
+        new_steps, new_ingredients = await get_row_versions(session, recipe.id)
+    assert new_steps[1] == steps[1]
+    assert new_steps[2] != steps[2]
+    assert new_ingredients.keys() == {'diff kept', 'diff added'}
+    assert new_ingredients['diff kept'] == ingredients['diff kept']
+    response = await aclient.get(f'/api/v1/recipe/{recipe.id}')
+    json_response = response.json()
+    assert json_response['name'] == 'paging recipe 0'
+    assert [step['description'] for step in json_response['steps']] == [
+        'step',
+        'fixed',
+    ]
+    assert json_response['ingredients'] == ['diff added', 'diff kept']
+
+
+async def test_create_recipes_with_same_new_ingredients_concurrently(
+    aengine,
+    asession,
+    image_id,
+):
+    names = {'upsert race 1', 'upsert race 2'}
+
+    async def create(i):
+        async with asession() as session:
+            return await crud.create_recipe(
+                get_recipe_data(image_id, i, set(names)),
+                session,
+            )
+
+    recipes = await asyncio.gather(create(0), create(1))
+    assert recipes[0].document['ingredients'] == sorted(names)
+    assert recipes[1].document['ingredients'] == sorted(names)
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(aengine.sync_engine, 'before_cursor_execute', record)
+    try:
+        await create(2)
+    finally:
+        event.remove(aengine.sync_engine, 'before_cursor_execute', record)
+    assert not [s for s in statements if 'ingredient (' in s or 'FROM ingredient' in s]
+
+
+async def test_get_recipes_loads_collections_by_separate_queries(
+    aengine,
+    asession,
+    image_id,
+):
+    data = get_recipe_data(image_id, 0, {f'selectin {i}' for i in range(4)})
+    data['steps'] += [data['steps'][0] | {'order': order} for order in (2, 3)]
+    async with asession() as session:
+        recipe = await crud.create_recipe(data, session)
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(aengine.sync_engine, 'before_cursor_execute', record)
+    try:
+        async with asession() as session:
+            recipes = await crud.get_recipes([recipe.id], session)
+    finally:
+        event.remove(aengine.sync_engine, 'before_cursor_execute', record)
+    assert len(recipes[recipe.id].steps) == 3
+    assert len(recipes[recipe.id].ingredients) == 4
+    # Recipe with its image, ingredients and steps with their images.
+    assert len(statements) == 3
+    assert not [s for s in statements if 'JOIN step' in s and 'recipe_ingredient' in s]
+
+
+async def test_get_recipe_without_document(aclient, asession, paging_recipe_ids):
+    id = paging_recipe_ids[3]
+    response = await aclient.get(f'/api/v1/recipe/{id}')
+    async with asession() as session:
+        await session.execute(update(Recipe).filter_by(id=id).values(document=null()))
+        await session.commit()
+    recipe_entity_cache.pop(id)
+    response_without_document = await aclient.get(f'/api/v1/recipe/{id}')
+    assert response_without_document.status_code == 200
+    assert response_without_document.json() == response.json()
@@ -0,0 +1,98 @@
+import json
+from datetime import timedelta
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+
+from app.api.recipe.importer import import_ndjson, iter_lines
+from app.config import settings
+from app.crud import image as image_crud
+
+
+async def as_stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(stream):
+    return [line async for line in stream]
+
+
+async def test_iter_lines_splits_chunks_and_skips_long_lines():
+    lines = await collect(
+        iter_lines(as_stream(b'ab', b'c\nlong', b'-line\n\nde', b'f'), 5)
+    )
+    assert lines == [b'abc', None, b'', b'def']
+
+
+@pytest.fixture(scope='module')
+async def import_image_id(asession):
+    image_id = uuid4()
+    async with asession() as session:
+        await image_crud.create_images(
+            [{'id': image_id, 'path': 'import.jpg', 'original_filename': None}],
+            session,
+        )
+    return image_id
+
+
+def get_record(image_id, i):
+    return {
+        'name': f'imported recipe {i}',
+        'description': 'description',
+        'image_id': str(image_id),
+        'ingredients': ['imported ingredient', f'imported ingredient {i}'],
+        'steps': [
+            {
+                'order': order,
+                'description': 'step',
+                'duration': timedelta(minutes=order).total_seconds(),
+                'image_id': str(image_id),
+            }
+            for order in (1, 2)
+        ],
+    }
+
+
+async def test_import_recipes(aclient, asession, import_image_id):
+    lines = [json.dumps(get_record(import_image_id, i)).encode() for i in range(5)]
+    lines[1] = b'{"name": '
+    lines[3] = json.dumps(get_record(uuid4(), 3)).encode()
+    body = b'\n'.join(lines) + b'\n'
+    with mock.patch.object(settings, 'RECIPE_IMPORT_BATCH_SIZE', 2):
+        async with asession() as session:
+            report = await import_ndjson(as_stream(body[:100], body[100:]), session)
+    assert report['imported'] == 3
+    assert [error['line'] for error in report['errors']] == [2, 4]
+    assert report['errors'][1]['detail'][0]['loc'] == ['image_id']
+    assert not report['errors_truncated']
+    response = await aclient.get(
+        '/api/v1/recipe',
+        params={'ingredients': ['imported ingredient'], 'order': 'duration'},
+    )
+    items = response.json()['items']
+    assert [item['name'] for item in items] == [
+        f'imported recipe {i}' for i in (0, 2, 4)
+    ]
+    assert items[0]['duration'] == 180
+    response = await aclient.get(f'/api/v1/recipe/{items[0]["id"]}')
+    assert response.json()['ingredients'] == [
+        'imported ingredient',
+        'imported ingredient 0',
+    ]
+
+
+async def test_import_recipes_reports_rejected_records(asession, import_image_id):
+    records = [get_record(import_image_id, i) for i in range(10, 14)]
+    records[1]['name'] = 'x' * 128
+    # Valid for schema, but rejected by database.
+    records[2]['description'] = 'nul\u0000'
+    body = b'\n'.join(json.dumps(record).encode() for record in records)
+    with mock.patch.object(settings, 'RECIPE_IMPORT_BATCH_SIZE', 10):
+        async with asession() as session:
+            report = await import_ndjson(as_stream(body), session)
+    assert report['imported'] == 2
+    assert [error['line'] for error in report['errors']] == [2, 3]
+    assert report['errors'][0]['detail'][0]['loc'] == ('name',)
+    assert report['errors'][1]['detail'][0]['type'] == 'database_error'
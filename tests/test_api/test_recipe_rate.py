@@ -0,0 +1,107 @@
+import asyncio
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import NoResultFound
+
+from .test_recipe import get_recipe_data
+from app.crud import recipe as crud
+from app.model.recipe import RecipeStats
+from app.model.user import User
+from app.rating_buffer import RatingBuffer
+
+
+@pytest.fixture(scope='module')
+async def user_ids(asession):
+    users = [
+        User(id=uuid4(), email=f'rate{i}@test.com', hashed_password='')
+        for i in range(2)
+    ]
+    async with asession() as session:
+        session.add_all(users)
+        await session.commit()
+    return [user.id for user in users]
+
+
+@pytest.fixture
+async def recipe_id(asession, image_id):
+    async with asession() as session:
+        recipe = await crud.create_recipe(
+            get_recipe_data(image_id, 0, {'rate test ingredient'}),
+            session,
+        )
+    return recipe.id
+
+
+async def get_stats(asession, recipe_id):
+    async with asession() as session:
+        result = await session.execute(
+            select(RecipeStats.rating_sum, RecipeStats.rating_count).filter_by(
+                recipe_id=recipe_id
+            )
+        )
+        return tuple(result.one())
+
+
+async def test_rerating_replaces_rate(asession, user_ids, recipe_id):
+    async with asession() as session:
+        await crud.rate_recipe(recipe_id, user_ids[0], 2, session)
+        await crud.rate_recipe(recipe_id, user_ids[1], 4, session)
+        await crud.rate_recipe(recipe_id, user_ids[0], 5, session)
+    assert await get_stats(asession, recipe_id) == (9, 2)
+    async with asession() as session:
+        with pytest.raises(NoResultFound):
+            await crud.rate_recipe(recipe_id + 10_000, user_ids[0], 5, session)
+
+
+async def test_rating_buffer_coalesces_rates(asession, user_ids, recipe_id):
+    buffer = RatingBuffer(max_size=100, flush_interval=60)
+    await buffer.add(user_ids[0], recipe_id, 1)
+    await buffer.add(user_ids[1], recipe_id, 3)
+    await buffer.add(user_ids[0], recipe_id, 4)
+    await buffer.add(user_ids[0], recipe_id + 10_000, 4)
+    assert buffer.stats()['pending'] == 3
+    await buffer.stop()
+    assert buffer.stats() == {'pending': 0, 'flushed': 3, 'failures': 0}
+    assert await get_stats(asession, recipe_id) == (7, 2)
+
+
+def slow_rate_recipes(started: asyncio.Event):
+    rate_recipes = crud.rate_recipes
+
+    async def slow(rates, session):
+        started.set()
+        await asyncio.sleep(0.05)
+        await rate_recipes(rates, session)
+
+    return mock.patch('app.rating_buffer.recipe_crud.rate_recipes', slow)
+
+
+async def test_rating_buffer_stop_waits_for_running_flush(
+    asession, user_ids, recipe_id
+):
+    buffer = RatingBuffer(max_size=100, flush_interval=0.01)
+    started = asyncio.Event()
+    with slow_rate_recipes(started):
+        await buffer.add(user_ids[0], recipe_id, 2)
+        await buffer.add(user_ids[1], recipe_id, 5)
+        buffer.start()
+        await started.wait()
+        await buffer.stop()
+    assert buffer.stats() == {'pending': 0, 'flushed': 2, 'failures': 0}
+    assert await get_stats(asession, recipe_id) == (7, 2)
+
+
+async def test_rating_buffer_add_waits_for_flush_when_full(
+    asession, user_ids, recipe_id
+):
+    buffer = RatingBuffer(max_size=2, flush_interval=60)
+    with slow_rate_recipes(asyncio.Event()):
+        for offset in range(3):
+            await buffer.add(user_ids[0], recipe_id + offset * 10_000, 1)
+        assert buffer.stats()['flushed'] == 0
+        await buffer.add(user_ids[1], recipe_id, 3)
+        assert buffer.stats() == {'pending': 0, 'flushed': 4, 'failures': 0}
+    assert await get_stats(asession, recipe_id) == (4, 2)
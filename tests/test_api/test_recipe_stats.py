@@ -0,0 +1,82 @@
+from datetime import timedelta
+from uuid import uuid4
+
+from sqlalchemy import update
+
+import manage
+from .test_recipe import get_recipe_data
+from app.crud import recipe as crud
+from app.model.recipe import RecipeStats
+from app.model.user import User
+
+
+STATS_INGREDIENT = 'stats test ingredient'
+
+
+async def get_list(aclient, order):
+    response = await aclient.get(
+        '/api/v1/recipe',
+        params={'ingredients': [STATS_INGREDIENT], 'order': order},
+    )
+    return [
+        (item['id'], item['duration'], item['rating'])
+        for item in response.json()['items']
+    ]
+
+
+async def test_recipe_stats_follow_writes_and_are_repaired(
+    aclient, aengine, asession, image_id
+):
+    user = User(id=uuid4(), email='stats@test.com', hashed_password='')
+    async with asession() as session:
+        session.add(user)
+        await session.commit()
+        first, second = [
+            await crud.create_recipe(
+                get_recipe_data(image_id, i, {STATS_INGREDIENT}), session
+            )
+            for i in range(2)
+        ]
+        await crud.rate_recipe(first.id, user.id, 2, session)
+        await crud.rate_recipe(second.id, user.id, 5, session)
+    assert await get_list(aclient, '-rating') == [
+        (second.id, 120, 5),
+        (first.id, 60, 2),
+    ]
+
+    async with asession() as session:
+        await crud.edit_recipe(
+            first.id,
+            {'steps': [get_recipe_data(image_id, 2, set())['steps'][0]]},
+            session,
+        )
+    assert await get_list(aclient, 'duration') == [
+        (second.id, 120, 5),
+        (first.id, 180, 2),
+    ]
+
+    async with asession() as session:
+        await session.execute(
+            update(RecipeStats)
+            .filter_by(recipe_id=second.id)
+            .values(rating_sum=1, total_duration=timedelta(0))
+        )
+        await session.commit()
+        [row] = [
+            row
+            for row in await crud.get_inconsistent_recipe_stats(session)
+            if row.recipe_id in (first.id, second.id)
+        ]
+    assert row.recipe_id == second.id
+    assert (row.stored_rating_sum, row.rating_sum) == (1, 5)
+    assert row.total_duration == timedelta(minutes=2)
+    assert await manage.check_recipe_stats(fix=False) == 1
+    assert await manage.check_recipe_stats(fix=True) == 0
+    assert await manage.check_recipe_stats(fix=False) == 0
+
+    await crud.delete_recipe(first.id, aengine)
+    async with asession() as session:
+        assert await session.get(RecipeStats, first.id) is None
+        stats = await session.get(RecipeStats, second.id)
+        assert (stats.rating_sum, stats.rating_count) == (5, 1)
+        assert stats.total_duration == timedelta(minutes=2)
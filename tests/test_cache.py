@@ -0,0 +1,32 @@
+from unittest import mock
+
+from app.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats() == {
+        'size': 2,
+        'maxsize': 2,
+        'hits': 3,
+        'misses': 1,
+        'evictions': 1,
+    }
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(maxsize=2, ttl=10)
+    with mock.patch('app.cache.time.monotonic', return_value=100):
+        cache.set('a', 1)
+    with mock.patch('app.cache.time.monotonic', return_value=105):
+        assert cache.get('a') == 1
+    with mock.patch('app.cache.time.monotonic', return_value=111):
+        assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1
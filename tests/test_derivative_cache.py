@@ -0,0 +1,59 @@
+import asyncio
+import os
+from pathlib import Path
+
+from app.derivative_cache import DerivativeCache
+
+
+def write_bytes(size):
+    async def generate(target: Path):
+        await asyncio.sleep(0.01)
+        target.write_bytes(b'x' * size)
+
+    return generate
+
+
+async def test_derivative_cache_generates_missing_file_once(tmpdir):
+    cache = DerivativeCache(Path(tmpdir), max_size=100)
+    calls = 0
+
+    async def generate(target: Path):
+        nonlocal calls
+        calls += 1
+        await write_bytes(10)(target)
+
+    paths = await asyncio.gather(*(cache.get('a.png', generate) for _ in range(5)))
+    assert paths == [Path(tmpdir) / 'a.png'] * 5
+    assert calls == 1
+    assert await cache.get('a.png', generate) == Path(tmpdir) / 'a.png'
+    assert calls == 1
+    assert os.listdir(tmpdir) == ['a.png']
+
+
+async def test_derivative_cache_evicts_least_recently_used(tmpdir):
+    (Path(tmpdir) / 'old.png').write_bytes(b'x' * 40)
+    cache = DerivativeCache(Path(tmpdir), max_size=100)
+    await cache.get('a.png', write_bytes(40))
+    await cache.get('old.png', write_bytes(40))
+    await cache.get('b.png', write_bytes(40))
+    assert sorted(os.listdir(tmpdir)) == ['b.png', 'old.png']
+    assert cache.stats() == {
+        'files': 2,
+        'size': 80,
+        'max_size': 100,
+        'hits': 1,
+        'misses': 2,
+        'evictions': 1,
+        'failures': 0,
+    }
+
+
+async def test_derivative_cache_regenerates_removed_file(tmpdir):
+    cache = DerivativeCache(Path(tmpdir), max_size=100)
+    path = await cache.get('a.png', write_bytes(10))
+    path.unlink()
+    assert await cache.get_or_schedule('a.png', write_bytes(20)) is None
+    assert await cache.get('a.png', write_bytes(20)) == path
+    assert path.stat().st_size == 20
+    assert cache.stats()['size'] == 20
+    assert cache.stats()['misses'] == 3
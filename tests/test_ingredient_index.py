@@ -0,0 +1,38 @@
+from array import array
+
+from app.ingredient_index import IngredientIndex
+
+
+def get_index():
+    index = IngredientIndex()
+    index.build(
+        [
+            ('salt', array('I', [1, 2, 3, 5, 8])),
+            ('egg', array('I', [2, 3, 8])),
+            ('milk', array('I', [3])),
+        ]
+    )
+    return index
+
+
+def test_lookup_before_build():
+    assert IngredientIndex().lookup({'salt'}) is None
+
+
+def test_lookup_intersects_posting_lists():
+    index = get_index()
+    assert index.lookup({'salt'}) == [1, 2, 3, 5, 8]
+    assert index.lookup({'salt', 'egg'}) == [2, 3, 8]
+    assert index.lookup({'salt', 'egg', 'milk'}) == [3]
+    assert index.lookup({'salt', 'unknown'}) == []
+
+
+def test_update_patches_posting_lists():
+    index = get_index()
+    index.update(4, set(), {'salt', 'sugar'})
+    index.update(3, {'salt', 'egg', 'milk'}, {'egg', 'sugar'})
+    assert index.lookup({'salt'}) == [1, 2, 4, 5, 8]
+    assert index.lookup({'sugar'}) == [3, 4]
+    assert index.lookup({'milk'}) == []
+    index.remove(4, {'salt', 'sugar'})
+    assert index.lookup({'sugar'}) == [3]
@@ -0,0 +1,77 @@
+import json
+from collections import namedtuple
+from datetime import timedelta
+from uuid import uuid4
+
+from fastapi_pagination import Page, Params
+
+from app.api.recipe import serializer
+from app.api.recipe.schema import (
+    RecipeBatchItem,
+    RecipeListCursorPage,
+    RecipeListResponse,
+)
+from app.model.image import Image
+from app.model.recipe import Ingredient, Recipe, RecipeIngredientAssociation, Step
+
+
+ListRow = namedtuple('ListRow', 'id name description duration rating')
+
+
+def as_validated(model, content: bytes):
+    return json.loads(model.parse_raw(content).json())
+
+
+def test_recipe_list_page_matches_response_model():
+    rows = [
+        ListRow(1, 'first', 'description', timedelta(minutes=3), 4.5),
+        ListRow(2, 'second', 'description', timedelta(seconds=90), 0),
+    ]
+    ingredients = {1: ['salt', 'water'], 2: []}
+    page = Page.create(rows, Params(page=2, size=2), total=12)
+    content = serializer.dump_recipe_list_page(page, ingredients)
+    assert json.loads(content) == as_validated(Page[RecipeListResponse], content)
+    assert json.loads(content)['items'][0]['duration'] == 180
+    content = serializer.dump_recipe_list_cursor_page(rows, ingredients, 'abc')
+    assert json.loads(content) == as_validated(RecipeListCursorPage, content)
+
+
+def test_recipe_entity_matches_response_model():
+    image_id = uuid4()
+    image = Image(
+        id=image_id,
+        width=640,
+        height=480,
+        byte_size=1024,
+        format='JPEG',
+        placeholder='data:image/jpeg;base64,',
+    )
+    recipe = Recipe(
+        id=1,
+        name='recipe',
+        description='description',
+        image_id=image_id,
+        image=image,
+        ingredients=[
+            RecipeIngredientAssociation(ingredient=Ingredient(name=name))
+            for name in ('water', 'salt')
+        ],
+        steps=[
+            Step(
+                order=order,
+                description='step',
+                duration=timedelta(minutes=order),
+                image_id=image_id,
+                image=image,
+            )
+            for order in (2, 1)
+        ],
+    )
+    content = serializer.dump_recipe_batch([1, 2], {1: recipe})
+    items = json.loads(content)
+    assert items == [as_validated(RecipeBatchItem, json.dumps(item)) for item in items]
+    item = items[0]['recipe']
+    assert item['ingredients'] == ['salt', 'water']
+    assert [step['order'] for step in item['steps']] == [1, 2]
+    assert item['image']['width'] == 640
+    assert items[1] == {'id': 2, 'recipe': None, 'detail': 'Not Found'}
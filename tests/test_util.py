@@ -1,19 +1,55 @@
+import base64
+import hashlib
 import io
 from pathlib import Path
-from unittest import mock
-from uuid import uuid4
+from random import Random
+
+from fastapi import UploadFile
+from PIL import Image as PILImage
 
 from app import util
 
 
-async def test_save_image_to_media(tmpdir):
-    uuid = uuid4()
-    saving_bytes = io.BytesIO('check'.encode())
-    frmt = 'jpg'
-    with mock.patch('app.util.settings') as mock_settings:
-        media_path = mock.PropertyMock(return_value=Path(tmpdir))
-        type(mock_settings).MEDIA_PATH = media_path
-        saved_path = await util.save_image_to_media(uuid, saving_bytes, frmt)
-    assert saved_path.suffix == '.' + frmt
-    assert saved_path.stem == uuid.hex
-    assert saved_path.read_bytes().decode() == 'check'
+async def test_save_upload(tmpdir):
+    path = Path(tmpdir) / 'upload.tmp'
+    upload = UploadFile(io.BytesIO('check'.encode()))
+    assert await util.save_upload(upload, path, 5) == (
+        5,
+        hashlib.sha256(b'check').hexdigest(),
+    )
+    assert path.read_bytes().decode() == 'check'
+    assert util.hash_file(path) == hashlib.sha256(b'check').hexdigest()
+    upload = UploadFile(io.BytesIO('check'.encode()))
+    assert await util.save_upload(upload, path, 4) is None
+
+
+def test_inspect_image(tmpdir):
+    image_path, other_path = Path(tmpdir) / 'image', Path(tmpdir) / 'other'
+    image = util.generate_image()
+    image.save(image_path, format='jpeg')
+    other_path.write_bytes(b'corrupt')
+    metadata = util.inspect_image(image_path, 1024 * 1024, 16)
+    assert metadata is not None
+    assert metadata[:3] == ('JPEG', image.width, image.height)
+    placeholder = metadata.placeholder.removeprefix('data:image/jpeg;base64,')
+    assert max(PILImage.open(io.BytesIO(base64.b64decode(placeholder))).size) == 16
+    assert util.inspect_image(other_path, 1024 * 1024, 16) is None
+    # Too many pixels declared in header.
+    assert util.inspect_image(image_path, 100, 16) is None
+
+
+def test_sniff_image_format():
+    formats = ['jpeg', 'png', 'webp']
+    assert util.sniff_image_format(b'\x89PNG\r\n\x1a\n\x00\x00', formats) == 'png'
+    assert util.sniff_image_format(b'RIFF\x00\x00\x00\x00WEBPVP8 ', formats) == 'webp'
+    assert util.sniff_image_format(b'RIFF\x00\x00\x00\x00WAVEfmt ', formats) is None
+    assert util.sniff_image_format(b'GIF89a', formats) is None
+    assert util.sniff_image_format(b'\xff\xd8', formats) is None
+
+
+def test_generate_image_is_reproducible():
+    images = [util.generate_image(Random(42)) for _ in range(2)]
+    assert images[0].mode == 'RGB'
+    assert images[0].size == images[1].size
+    assert images[0].tobytes() == images[1].tobytes()
+    assert util.generate_image().tobytes() != images[0].tobytes()
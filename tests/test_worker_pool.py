@@ -0,0 +1,27 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.exception import WorkerPoolBusyError
+from app.worker_pool import WorkerPool
+
+
+async def test_worker_pool_rejects_tasks_over_capacity():
+    pool = WorkerPool('thread', workers=1, queue_size=1)
+    release = threading.Event()
+    running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(WorkerPoolBusyError):
+        await pool.run(release.wait)
+    release.set()
+    assert await asyncio.gather(*running) == [True, True]
+    assert pool.stats() == {
+        'workers': 1,
+        'capacity': 2,
+        'active': 0,
+        'completed': 2,
+        'rejected': 1,
+    }
+    assert await pool.run(sum, [1, 2]) == 3
+    pool.shutdown()